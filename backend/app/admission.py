@@ -0,0 +1,225 @@
+from __future__ import annotations
+import json
+import math
+import re
+import time
+from collections import deque
+
+import anyio
+import anyio.to_thread
+
+from .config import settings
+
+
+# 准入控制：同步接口共用 anyio 的线程池，上传请求在整个请求体接收期间占住一个线程。
+# 截止前的上传高峰若不加限制会占满线程池，登录、预览、健康检查都会超时。
+# - 重接口按通道（lane）限制同时处理的请求数，超出的按到达顺序排队，排队满或等待超时返回 503 + Retry-After；
+# - 同一客户端（令牌或 IP）在通道内的请求数另有上限，超出返回 429；
+# - 线程池总数不少于各通道上限之和 + reserved_threads，保证轻量接口始终有线程可用；
+# - 数据库连接池同样按各通道上限之和 + reserved_db_connections 设置（见 db.py），线程拿得到连接。
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = anyio.Event()
+        self.granted = False
+
+
+class Lane:
+    """一个限流通道：最多 max_in_flight 个请求同时处理，其余按 FIFO 排队。
+
+    只在事件循环线程中访问，不需要加锁。
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, queue_timeout: float, max_per_client: int = 0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_client = max_per_client
+        self.in_flight = 0
+        self._waiters: deque[_Waiter] = deque()
+        self._clients: dict[str, int] = {}
+        self._avg_seconds = 1.0  # 请求处理时长的指数移动平均，用于估算 Retry-After
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        # 排在前面的请求全部处理完所需时间的估计，限制在 1~60 秒
+        wait = (self.queued + 1) * self._avg_seconds / max(self.max_in_flight, 1)
+        return max(1, min(60, math.ceil(wait)))
+
+    async def acquire(self, client: str) -> str | None:
+        """取得处理名额；返回 None 表示已准入，否则返回拒绝原因 "client"/"busy"。"""
+        if self.max_per_client and self._clients.get(client, 0) >= self.max_per_client:
+            self.rejected += 1
+            return "client"
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                return "busy"
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+            self._clients[client] = self._clients.get(client, 0) + 1
+            try:
+                with anyio.move_on_after(self.queue_timeout):
+                    await waiter.event.wait()
+            except BaseException:
+                # 客户端断开等导致取消：已分到的名额交还，未分到的离开队列
+                self._leave(client)
+                if waiter.granted:
+                    self._hand_over()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+            self._leave(client)
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                self.rejected += 1
+                return "busy"
+        self._clients[client] = self._clients.get(client, 0) + 1
+        self.admitted += 1
+        return None
+
+    def release(self, client: str, elapsed: float) -> None:
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+        self._leave(client)
+        self._hand_over()
+
+    def _leave(self, client: str) -> None:
+        n = self._clients.get(client, 0) - 1
+        if n > 0:
+            self._clients[client] = n
+        else:
+            self._clients.pop(client, None)
+
+    def _hand_over(self) -> None:
+        # 名额直接交给队首请求（in_flight 不变），保证先到先得
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            waiter.event.set()
+        else:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "maxInFlight": self.max_in_flight,
+            "inFlight": self.in_flight,
+            "queued": self.queued,
+            "maxQueue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avgSeconds": round(self._avg_seconds, 3),
+        }
+
+
+LANES = {
+    # 学生提交：整包上传、续传分块与合并
+    "upload": Lane(
+        "upload",
+        settings.upload_max_in_flight,
+        settings.upload_queue_size,
+        settings.upload_queue_timeout_seconds,
+        settings.upload_max_per_client,
+    ),
+    # 管理员/教师的大文件上传与打包下载
+    "bulk": Lane(
+        "bulk",
+        settings.bulk_max_in_flight,
+        settings.bulk_queue_size,
+        settings.bulk_queue_timeout_seconds,
+    ),
+}
+
+ROUTES = [
+    ("POST", re.compile(r"^/api/student/teams/\d+/submissions$"), "upload"),
+    ("PUT", re.compile(r"^/api/student/teams/\d+/uploads/[^/]+$"), "upload"),
+    ("POST", re.compile(r"^/api/student/teams/\d+/uploads/finalize$"), "upload"),
+    ("POST", re.compile(r"^/api/admin/competitions/\d+/problems/upload$"), "bulk"),
+    ("POST", re.compile(r"^/api/admin/competitions/\d+/excellent/upload$"), "bulk"),
+    ("GET", re.compile(r"^/api/admin/competitions/\d+/submissions/archive$"), "bulk"),
+    ("GET", re.compile(r"^/api/teacher/competitions/\d+/review-pack$"), "bulk"),
+    ("POST", re.compile(r"^/api/teacher/competitions/\d+/scores/import$"), "bulk"),
+]
+
+REJECT_MESSAGES = {
+    "busy": (503, "服务繁忙，请稍后重试"),
+    "client": (429, "同时进行的上传过多，请等待当前上传完成后重试"),
+}
+
+
+def match_lane(method: str, path: str) -> Lane | None:
+    for route_method, pattern, lane in ROUTES:
+        if method == route_method and pattern.match(path):
+            return LANES[lane]
+    return None
+
+
+def configure_threadpool() -> None:
+    """在事件循环中调用：把线程池扩到各通道上限之和 + 预留线程数。"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    heavy = sum(lane.max_in_flight for lane in LANES.values())
+    limiter.total_tokens = max(settings.threadpool_size, heavy + settings.reserved_threads)
+
+
+def _client_key(scope) -> str:
+    for name, value in scope.get("headers") or ():
+        if name == b"authorization":
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+class AdmissionMiddleware:
+    """纯 ASGI 中间件（不缓冲请求/响应体），名额在响应发送完毕后释放。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        lane = match_lane(scope["method"], scope["path"])
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = _client_key(scope)
+        reason = await lane.acquire(client)
+        if reason:
+            await self._reject(send, lane, reason)
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release(client, time.monotonic() - started)
+
+    async def _reject(self, send, lane: Lane, reason: str) -> None:
+        status, message = REJECT_MESSAGES[reason]
+        retry_after = lane.retry_after()
+        body = json.dumps(
+            {"detail": {"code": 1008, "message": message, "retryAfter": retry_after}},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,67 @@
+from __future__ import annotations
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from .cache import get_cache
+from .config import settings
+from .http_cache import render_json
+from .models import Announcement
+
+
+# 首页公告：匿名访问量大而写入极少。
+# - 每个分页渲染好的 JSON 字节与 ETag 一起缓存，命中时不访问数据库；
+# - 管理员创建/修改/删除公告提交后调用 invalidate_announcements() 按标签失效（共享缓存时广播到所有 worker）；
+# - 进程内缓存模式下其余 worker 最迟在 announcement_cache_ttl_seconds 后刷新。
+
+TAG = "announcements"
+
+
+def invalidate_announcements() -> None:
+    get_cache().invalidate_tags(TAG)
+
+
+def _render(db: Session, page: int, page_size: int) -> tuple[bytes, str]:
+    # 置顶优先，其次按发布时间倒序；若无发布时间则按创建时间倒序
+    q = db.query(Announcement)
+    q = q.order_by(
+        Announcement.pinned.desc(),
+        case((Announcement.published_at == None, 1), else_=0).asc(),
+        Announcement.published_at.desc(),
+        Announcement.created_at.desc(),
+    )
+    total = q.count()
+    items = (
+        q.offset((page - 1) * page_size)
+         .limit(page_size)
+         .all()
+    )
+    content = {
+        "code": 0,
+        "message": "ok",
+        "data": {
+            "page": page,
+            "pageSize": page_size,
+            "total": total,
+            "rows": [
+                {
+                    "id": a.id,
+                    "title": a.title,
+                    "content": a.content,
+                    "publishedAt": a.published_at,
+                    "pinned": a.pinned,
+                }
+                for a in items
+            ],
+        },
+    }
+    return render_json(content)
+
+
+def announcement_page(db: Session, page: int, page_size: int) -> tuple[bytes, str]:
+    """返回公告分页的 JSON 字节与 ETag。"""
+    return get_cache().get_or_load(
+        f"announcements:{page}:{page_size}",
+        lambda: _render(db, page, page_size),
+        ttl=settings.announcement_cache_ttl_seconds,
+        tags=(TAG,),
+    )
@@ -0,0 +1,109 @@
+from __future__ import annotations
+import io
+import itertools
+import zipfile
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+
+from .storage_backend import get_storage
+
+
+# 流式 ZIP 打包：边读文件边输出压缩包字节，不生成临时文件，内存占用与文件大小无关。
+# 条目以 ZIP_STORED 存储（PDF/ZIP/RAR 已是压缩格式，不再重复压缩），并强制 zip64，
+# 单个条目与整个压缩包都可以超过 4GB。
+# 打包前不逐个检查文件是否存在：读取失败且存储中确实没有该对象时跳过该条目，
+# 缺失的条目名交给 trailer 生成最后一个条目（如清单），清单因此写在压缩包末尾。
+
+
+class _ZipSink(io.RawIOBase):
+    """zipfile 的输出目标：只支持追加写入，写入的数据由 drain() 取走后交给响应。
+
+    不支持 seek，zipfile 会改用数据描述符（data descriptor）在条目末尾记录大小与 CRC。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipEntry:
+    """压缩包中的一个条目：key 为存储键（文件记录的 path），data 为内存中的小文件（如清单），二选一。"""
+
+    def __init__(self, name: str, key: str | None = None, data: bytes | None = None, mtime: datetime | None = None):
+        self.name = name
+        self.key = key
+        self.data = data
+        self.mtime = mtime or datetime.now()
+
+
+def _open(storage, key: str) -> Iterator | None:
+    """开始读取对象并取到第一块；对象不存在返回 None，其他读取错误照常抛出。"""
+    chunks = iter(storage.read_range(key))
+    try:
+        first = next(chunks, None)
+    except Exception:
+        if storage.stat(key) is None:
+            return None
+        raise
+    return itertools.chain((first,), chunks) if first is not None else iter(())
+
+
+def _write(zf: zipfile.ZipFile, sink: _ZipSink, entry: ZipEntry, chunks: Iterable) -> Iterator[bytes]:
+    info = zipfile.ZipInfo(entry.name, date_time=entry.mtime.timetuple()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    with zf.open(info, mode="w", force_zip64=True) as dst:
+        for chunk in chunks:
+            dst.write(chunk)
+            yield from _flush(sink)
+    yield from _flush(sink)
+
+
+def stream_zip(
+    entries: Iterable[ZipEntry],
+    trailer: Callable[[set[str]], ZipEntry] | None = None,
+) -> Iterator[bytes]:
+    """按顺序把条目写入 ZIP 并逐块产出字节，可直接作为 StreamingResponse 的内容。
+
+    存储中不存在的条目不写入；trailer 以这些条目名的集合调用，返回的条目最后写入。
+    """
+    sink = _ZipSink()
+    storage = get_storage()
+    missing: set[str] = set()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for entry in entries:
+            if entry.data is not None:
+                yield from _write(zf, sink, entry, (entry.data,))
+                continue
+            chunks = _open(storage, entry.key) if entry.key else None
+            if chunks is None:
+                missing.add(entry.name)
+                continue
+            yield from _write(zf, sink, entry, chunks)
+        if trailer is not None:
+            last = trailer(missing)
+            yield from _write(zf, sink, last, (last.data,))
+    # 中央目录在 close 时写出
+    yield from _flush(sink)
+
+
+def _flush(sink: _ZipSink) -> Iterator[bytes]:
+    data = sink.drain()
+    if data:
+        yield data
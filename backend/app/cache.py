@@ -0,0 +1,505 @@
+from __future__ import annotations
+import base64
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable
+
+from .config import settings
+
+
+# 应用缓存：路由与各模块通过 get_cache() 取得同一个缓存实例，按 settings.cache_backend 选择驱动。
+# - memory：进程内 LRU，多 worker 部署时各进程各自缓存，写入只使本进程失效；
+# - redis：Redis 协议的共享缓存（Redis/Valkey/KeyDB 均可，需 pip install redis），
+#   每个进程前面保留一层短时本地缓存，删除与标签失效通过发布/订阅广播，各进程收到后立即丢弃本地条目；
+#   Redis 不可用时退化为进程内缓存。
+# 标签失效按版本号实现：条目记录写入时各标签的版本，标签失效即换一个新版本，旧条目在读取时视为未命中。
+# get_or_load 在调用 loader 之前记下标签版本，加载期间发生的失效不会被写回的旧结果覆盖。
+# 共享缓存中的值以带类型标记的 JSON 保存（见 _dumps），不使用 pickle：能写 Redis 的一方也无法借缓存在各进程中执行代码。
+
+_MISSING = object()
+
+
+# ---- 共享缓存的值编码 ----
+# JSON 原生类型之外支持 tuple、bytes、datetime/date、Decimal 与非字符串键的 dict，
+# 编码为 {"__t": 类型, "v": 值}；其他类型（如赛季快照）由所属模块用 register_type 登记。
+
+_TYPES: dict[type, tuple[str, Callable[[Any], Any]]] = {}
+_DECODERS: dict[str, Callable[[Any], Any]] = {
+    "tuple": tuple,
+    "map": lambda v: {k: item for k, item in v},
+    "bytes": base64.b64decode,
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "decimal": Decimal,
+}
+
+
+def register_type(cls: type, name: str, encode: Callable[[Any], Any], decode: Callable[[Any], Any]) -> None:
+    """登记可放入共享缓存的类型：encode 把对象转换为可编码的值，decode 由该值还原对象。"""
+    _TYPES[cls] = (name, encode)
+    _DECODERS[name] = decode
+
+
+def _encode(obj: Any) -> Any:
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return obj
+    if isinstance(obj, list):
+        return [_encode(v) for v in obj]
+    if isinstance(obj, dict):
+        if "__t" not in obj and all(isinstance(k, str) for k in obj):
+            return {k: _encode(v) for k, v in obj.items()}
+        return {"__t": "map", "v": [[_encode(k), _encode(v)] for k, v in obj.items()]}
+    if isinstance(obj, tuple):
+        return {"__t": "tuple", "v": [_encode(v) for v in obj]}
+    if isinstance(obj, bytes):
+        return {"__t": "bytes", "v": base64.b64encode(obj).decode("ascii")}
+    if isinstance(obj, datetime):
+        return {"__t": "datetime", "v": obj.isoformat()}
+    if isinstance(obj, date):
+        return {"__t": "date", "v": obj.isoformat()}
+    if isinstance(obj, Decimal):
+        return {"__t": "decimal", "v": str(obj)}
+    if type(obj) in _TYPES:
+        name, encode = _TYPES[type(obj)]
+        return {"__t": name, "v": _encode(encode(obj))}
+    raise TypeError(f"共享缓存不支持的值类型：{type(obj).__name__}")
+
+
+def _decode_object(obj: dict) -> Any:
+    if "__t" not in obj:
+        return obj
+    decode = _DECODERS.get(obj["__t"])
+    if decode is None:
+        raise ValueError(f"未知的缓存值类型：{obj['__t']}")
+    return decode(obj["v"])
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(_encode(value), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    # 解析失败（旧格式或损坏的条目）抛出 ValueError，调用方按未命中处理
+    try:
+        return json.loads(raw, object_hook=_decode_object)
+    except (TypeError, KeyError) as exc:
+        raise ValueError("无法解析的缓存条目") from exc
+
+
+def _resolve_ttl(ttl, value) -> float | None:
+    # ttl 可以是按加载结果计算秒数的函数（如到下一个时间边界为止）
+    return ttl(value) if callable(ttl) else ttl
+
+
+class CacheBackend:
+    """缓存接口。键为字符串；redis 驱动的值需能由 _dumps 编码（JSON 类型及 register_type 登记的类型）。"""
+
+    name = ""
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float | None = None, tags: tuple[str, ...] = ()) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def invalidate_tags(self, *tags: str) -> None:
+        """使带有任一标签的条目全部失效。"""
+        raise NotImplementedError
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: float | Callable[[Any], float] | None = None,
+        tags: tuple[str, ...] = (),
+    ) -> Any:
+        """命中则返回缓存值，否则调用 loader 并写入。loader 在锁外执行，并发未命中时可能重复加载。
+
+        ttl 为函数时以加载结果调用，返回有效秒数。
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class MemoryCache(CacheBackend):
+    """线程安全的进程内缓存：条目在 ttl 秒后过期，超过 maxsize 时淘汰最久未使用的条目。"""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int | None = None, ttl: float | None = None):
+        self.maxsize = maxsize or settings.cache_memory_maxsize
+        self.ttl = settings.cache_default_ttl_seconds if ttl is None else ttl
+        self._data: OrderedDict[str, tuple[float, Any, tuple]] = OrderedDict()
+        # 标签版本：只保留仍被条目引用的标签，超过 _tag_limit 时清理（见 _prune_tags）。
+        # 不在表中的标签版本视为 _tag_floor；清理时把 _tag_floor 提到被删标签的最大版本，版本号因此单调不回退，
+        # 清理前取得的旧版本戳不会与清理后的默认版本碰巧相等
+        self._tags: dict[str, int] = {}
+        self._tag_floor = 0
+        self._tag_limit = 2 * self.maxsize
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp(self, tags: tuple[str, ...]) -> tuple:
+        with self._lock:
+            # 取版本戳时即把标签登记进表：加载中的条目引用的标签同样受清理规则约束
+            stamp = tuple((t, self._tags.setdefault(t, self._tag_floor)) for t in tags)
+            if len(self._tags) > self._tag_limit:
+                self._prune_tags()
+            return stamp
+
+    def _fresh(self, stamp: tuple) -> bool:
+        return all(self._tags.get(t, self._tag_floor) == v for t, v in stamp)
+
+    def _prune_tags(self) -> None:
+        """（持有锁时调用）淘汰过期或已失效的条目，删除不再被任何条目引用的标签。"""
+        now = time.monotonic()
+        for key in [k for k, (expires, _, stamp) in self._data.items() if expires <= now or not self._fresh(stamp)]:
+            del self._data[key]
+        live = {t for _, _, stamp in self._data.values() for t, _ in stamp}
+        for t in [t for t in self._tags if t not in live]:
+            self._tag_floor = max(self._tag_floor, self._tags.pop(t))
+        # 仍被引用的标签过多时放宽上限，避免每次调用都全量扫描
+        self._tag_limit = max(2 * self.maxsize, 2 * len(self._tags))
+
+    def _put(self, key: str, value: Any, ttl: float | None, stamp: tuple) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value, stamp)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value, stamp = item
+                if expires > time.monotonic() and self._fresh(stamp):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value: Any, ttl: float | None = None, tags: tuple[str, ...] = ()) -> None:
+        self._put(key, value, ttl, self._stamp(tags))
+
+    def get_or_load(self, key, loader, ttl=None, tags=()):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            stamp = self._stamp(tags)
+            value = loader()
+            self._put(key, value, _resolve_ttl(ttl, value), stamp)
+        return value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_tags(self, *tags: str) -> None:
+        with self._lock:
+            for t in tags:
+                self._tags[t] = self._tags.get(t, self._tag_floor) + 1
+            if len(self._tags) > self._tag_limit:
+                self._prune_tags()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "entries": len(self._data), "tags": len(self._tags), "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache(CacheBackend):
+    """Redis 协议的共享缓存，前面带一层进程内缓存；需要安装 redis。"""
+
+    name = "redis"
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("使用 redis 缓存需要安装 redis：pip install redis") from exc
+        self._errors = (redis.RedisError, OSError)
+        timeout = settings.cache_redis_timeout_seconds
+        self._redis = redis.Redis.from_url(settings.cache_redis_url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._redis.ping()
+        # 订阅连接单独建立：阻塞等待消息时不受读超时限制
+        self._pubsub_client = redis.Redis.from_url(settings.cache_redis_url, socket_connect_timeout=timeout, health_check_interval=30)
+        self._prefix = settings.cache_key_prefix
+        self._channel = f"{self._prefix}invalidate"
+        self._origin = secrets.token_hex(8)
+        self._local = MemoryCache(ttl=settings.cache_local_ttl_seconds)
+        self.remote_hits = 0
+        self.remote_errors = 0
+        self.encode_errors = 0
+        self.broadcasts_received = 0
+        self._stop = threading.Event()
+        self._subscribed = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+        self._thread.start()
+        self._subscribed.wait(timeout)
+
+    # ---- 键 ----
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self._prefix}tag:{tag}"
+
+    def _local_ttl(self, ttl: float | None) -> float:
+        return min(settings.cache_local_ttl_seconds, ttl) if ttl is not None else settings.cache_local_ttl_seconds
+
+    def _tag_versions(self, tags, raw=None) -> dict[str, str | None]:
+        if not tags:
+            return {}
+        if raw is None:
+            raw = self._redis.mget([self._tag_key(t) for t in tags])
+        return {t: v.decode() if v is not None else None for t, v in zip(tags, raw)}
+
+    def _current_versions(self, tags, versions: dict | None = None) -> dict[str, str] | None:
+        """返回写入条目时要记下的标签版本；尚无版本键（从未失效或已过期）的标签先写入一个新版本。
+
+        版本是随机值而非计数：版本键过期后重建不会与更早条目记下的版本相同，旧条目不会因此重新生效。
+        """
+        versions = self._tag_versions(tags) if versions is None else dict(versions)
+        missing = [t for t, v in versions.items() if v is None]
+        if missing:
+            pipe = self._redis.pipeline(transaction=False)
+            for t in missing:
+                pipe.set(self._tag_key(t), secrets.token_hex(8), nx=True, ex=settings.cache_tag_ttl_seconds)
+            pipe.mget([self._tag_key(t) for t in missing])
+            versions.update(self._tag_versions(missing, pipe.execute()[-1]))
+        return None if None in versions.values() else versions
+
+    def _store(self, key: str, stamp: dict, tags, value: Any, ttl: float) -> None:
+        try:
+            data = _dumps([stamp, list(tags), value])
+        except TypeError:
+            # 未登记的值类型只写本地层
+            self.encode_errors += 1
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.set(self._key(key), data, px=max(1, int(ttl * 1000)))
+        for t in tags:
+            # 仍在写入的标签续期；过期的版本键只会让带该标签的条目重新加载
+            pipe.expire(self._tag_key(t), settings.cache_tag_ttl_seconds)
+        pipe.execute()
+
+    # ---- 读写 ----
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        try:
+            raw = self._redis.get(self._key(key))
+            if raw is None:
+                return default
+            stamp, tags, value = _loads(raw)
+            # 本地标签版本要在读取远端版本之前记下：之后到达的失效广播会使本地条目过期
+            local_stamp = self._local._stamp(tuple(tags))
+            if self._tag_versions(tags) != stamp:
+                return default
+        except self._errors:
+            self.remote_errors += 1
+            return default
+        except ValueError:
+            return default
+        self.remote_hits += 1
+        self._local._put(key, value, self._local_ttl(None), local_stamp)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None, tags: tuple[str, ...] = ()) -> None:
+        ttl = settings.cache_default_ttl_seconds if ttl is None else ttl
+        local_stamp = self._local._stamp(tags)
+        try:
+            stamp = self._current_versions(tags)
+            if stamp is not None:
+                self._store(key, stamp, tags, value, ttl)
+        except self._errors:
+            self.remote_errors += 1
+        self._local._put(key, value, self._local_ttl(ttl), local_stamp)
+
+    def get_or_load(self, key, loader, ttl=None, tags=()):
+        value = self._local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if ttl is None:
+            ttl = settings.cache_default_ttl_seconds
+        local_stamp = self._local._stamp(tags)
+        stamp = None
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.get(self._key(key))
+            if tags:
+                pipe.mget([self._tag_key(t) for t in tags])
+            results = pipe.execute()
+            versions = self._tag_versions(tags, results[1]) if tags else {}
+            try:
+                cached_stamp, _tags, cached = _loads(results[0]) if results[0] is not None else (None, None, _MISSING)
+            except ValueError:
+                cached_stamp, cached = None, _MISSING
+            if cached is not _MISSING and cached_stamp == versions:
+                self.remote_hits += 1
+                self._local._put(key, cached, self._local_ttl(_resolve_ttl(ttl, cached)), local_stamp)
+                return cached
+            stamp = self._current_versions(tags, versions)
+        except self._errors:
+            self.remote_errors += 1
+
+        value = loader()
+        ttl = _resolve_ttl(ttl, value)
+        if stamp is not None:
+            # 写入加载前读到的标签版本：加载期间标签被失效时，这个结果在下次读取时即视为过期
+            try:
+                self._store(key, stamp, tags, value, ttl)
+            except self._errors:
+                self.remote_errors += 1
+        self._local._put(key, value, self._local_ttl(ttl), local_stamp)
+        return value
+
+    # ---- 失效与广播 ----
+
+    def _publish(self, message: dict) -> None:
+        message["origin"] = self._origin
+        try:
+            self._redis.publish(self._channel, json.dumps(message))
+        except self._errors:
+            self.remote_errors += 1
+
+    def delete(self, key: str) -> None:
+        self._local.delete(key)
+        try:
+            self._redis.delete(self._key(key))
+        except self._errors:
+            self.remote_errors += 1
+        self._publish({"keys": [key]})
+
+    def invalidate_tags(self, *tags: str) -> None:
+        self._local.invalidate_tags(*tags)
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for t in tags:
+                pipe.set(self._tag_key(t), secrets.token_hex(8), ex=settings.cache_tag_ttl_seconds)
+            pipe.execute()
+        except self._errors:
+            self.remote_errors += 1
+        self._publish({"tags": list(tags)})
+
+    def clear(self) -> None:
+        self._local.clear()
+        try:
+            keys = [k for k in self._redis.scan_iter(match=f"{self._prefix}*") if not k.decode().startswith(self._tag_key(""))]
+            for i in range(0, len(keys), 500):
+                self._redis.delete(*keys[i:i + 500])
+        except self._errors:
+            self.remote_errors += 1
+        self._publish({"clear": True})
+
+    def _apply(self, message: dict) -> None:
+        if message.get("origin") == self._origin:
+            return
+        self.broadcasts_received += 1
+        if message.get("clear"):
+            self._local.clear()
+        for key in message.get("keys") or ():
+            self._local.delete(key)
+        if message.get("tags"):
+            self._local.invalidate_tags(*message["tags"])
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self._pubsub_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                # 断线期间可能错过广播：重新订阅后清空本地层
+                self._local.clear()
+                self._subscribed.set()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        try:
+                            self._apply(json.loads(message["data"]))
+                        except (ValueError, TypeError):
+                            pass
+            except self._errors:
+                self._subscribed.clear()
+                self._local.clear()
+                self._stop.wait(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except self._errors:
+                        pass
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        local = self._local.stats()
+        return {
+            "backend": self.name,
+            "localEntries": local["entries"],
+            "localHits": local["hits"],
+            "remoteHits": self.remote_hits,
+            "remoteErrors": self.remote_errors,
+            "encodeErrors": self.encode_errors,
+            "broadcastsReceived": self.broadcasts_received,
+            "subscribed": self._subscribed.is_set(),
+        }
+
+
+BACKENDS = {
+    "memory": MemoryCache,
+    "redis": RedisCache,
+}
+
+_cache: CacheBackend | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """按 settings.cache_backend 创建（并复用）缓存；共享缓存不可用时退化为进程内缓存。"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cls = BACKENDS.get(settings.cache_backend)
+                if cls is None:
+                    raise RuntimeError(f"未知的缓存后端：{settings.cache_backend}")
+                try:
+                    _cache = cls()
+                except Exception:
+                    if cls is MemoryCache:
+                        raise
+                    _cache = MemoryCache()
+    return _cache
+
+
+def close_cache() -> None:
+    """关闭时停止共享缓存的订阅线程；尚未创建过缓存时什么也不做。"""
+    if _cache is not None:
+        _cache.close()
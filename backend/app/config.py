@@ -15,6 +15,102 @@ class Settings(BaseModel):
     problems_dir: str = "uploads/problems"
     excellent_dir: str = "uploads/excellent"
     submissions_dir: str = "uploads/submissions"
+    # 存储后端：local（本地目录/共享挂载）或 s3（S3 API 兼容的对象存储，需安装 boto3）
+    storage_backend: str = "local"
+    s3_endpoint_url: str = ""
+    # 浏览器访问预签名地址所用的地址（为空时与 s3_endpoint_url 相同）
+    s3_public_endpoint_url: str = ""
+    s3_bucket: str = "math-competition"
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    s3_region: str = "us-east-1"
+    # 内容寻址存储目录：上传文件按 sha256 去重保存
+    blobs_dir: str = "uploads/blobs"
+    # 流式上传的临时文件目录（需与 blobs_dir 同一文件系统，收尾时直接 rename）
+    upload_tmp_dir: str = "uploads/blobs/tmp"
+    # 上传 I/O 线程数下限与每个文件的待写队列长度（按接收块计）。每个正在接收的文件独占一个线程，
+    # 实际线程数取 max(upload_io_workers, 2 * upload_max_in_flight + bulk_max_in_flight)（见 uploads.io_workers）
+    upload_io_workers: int = 8
+    upload_io_queue_chunks: int = 64
+    # 断点续传：临时文件目录、单块上限与会话有效期
+    upload_sessions_dir: str = "uploads/sessions"
+    upload_chunk_max_bytes: int = 16 * 1024 * 1024
+    upload_session_ttl_hours: int = 24
+    # 上传大小上限：单个文件按类型限制；每支队伍在一个赛季内累计提交的文件总量另有配额
+    max_thesis_bytes: int = 50 * 1024 * 1024
+    max_materials_bytes: int = 500 * 1024 * 1024
+    max_problem_zip_bytes: int = 500 * 1024 * 1024
+    max_excellent_bytes: int = 500 * 1024 * 1024
+    team_season_quota_bytes: int = 2 * 1024 * 1024 * 1024
+    # 准入控制：学生上传类接口最多同时处理 upload_max_in_flight 个请求，超出的按到达顺序排队
+    # （最多 upload_queue_size 个、最长等待 upload_queue_timeout_seconds 秒），再超出返回 503 + Retry-After；
+    # 同一客户端最多 upload_max_per_client 个（含排队），超出返回 429。bulk_* 为管理员/教师的大文件上传与打包下载
+    upload_max_in_flight: int = 16
+    upload_queue_size: int = 64
+    upload_queue_timeout_seconds: float = 15.0
+    upload_max_per_client: int = 4
+    bulk_max_in_flight: int = 4
+    bulk_queue_size: int = 8
+    bulk_queue_timeout_seconds: float = 30.0
+    # 同步接口的线程池大小；各通道上限之外至少保留 reserved_threads 个线程给登录、预览等轻量接口
+    threadpool_size: int = 64
+    reserved_threads: int = 16
+    # 数据库连接池：常驻连接数不少于各通道上限之和 + reserved_db_connections（通道内的请求各可能占用一个连接），
+    # 另可临时溢出 db_max_overflow 个；多 worker 部署时注意 MySQL 的 max_connections
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    reserved_db_connections: int = 10
+    # 幂等键保留时长，以及处理中（pending）的键在多久之后视为中断、允许重试接管
+    idempotency_ttl_hours: int = 24
+    idempotency_pending_timeout_seconds: int = 900
+    # 存储回收任务：运行间隔、宽限期（更新时间早于此的无引用对象才回收）、批大小与每秒删除上限；
+    # gc_dry_run 为真时后台任务只统计不删除
+    gc_enabled: bool = True
+    gc_interval_seconds: int = 600
+    gc_grace_seconds: int = 24 * 3600
+    gc_batch_size: int = 200
+    gc_max_deletes_per_second: float = 20.0
+    gc_dry_run: bool = False
+    # 存储校验任务：并行进程数（0 表示按 CPU 核数，最多 8）、总读取带宽上限（字节/秒，0 不限）、
+    # 每批文件记录数、进程优先级调整（nice）与租约时长（超过此时间无心跳的运行中任务可被接管）
+    scrub_workers: int = 0
+    scrub_max_bytes_per_second: int = 40 * 1024 * 1024
+    scrub_batch_size: int = 64
+    scrub_nice: int = 10
+    scrub_lease_seconds: int = 300
+    # 赛题 ZIP 分发：开赛前 problem_prewarm_lead_seconds 秒起预热，开赛后保持 problem_cache_hold_seconds 秒；
+    # 不超过 problem_cache_max_bytes 的文件放入内存输出，更大的文件预读进页缓存
+    problem_prewarm_lead_seconds: int = 600
+    problem_cache_hold_seconds: int = 6 * 3600
+    problem_cache_max_bytes: int = 256 * 1024 * 1024
+    problem_prewarm_interval_seconds: int = 30
+    # 应用缓存：memory（进程内）或 redis（多 worker 共享，需安装 redis；连接失败时退化为进程内缓存）；
+    # redis 模式下每个进程另有一层 cache_local_ttl_seconds 秒的本地缓存，失效通过发布/订阅广播
+    cache_backend: str = "memory"
+    cache_redis_url: str = "redis://localhost:6379/0"
+    cache_key_prefix: str = "mm:"
+    cache_redis_timeout_seconds: float = 0.5
+    cache_local_ttl_seconds: int = 30
+    cache_memory_maxsize: int = 4096
+    cache_default_ttl_seconds: int = 60
+    # redis 模式下标签版本键的有效期（每次写入带该标签的条目时续期）；过期只会让带该标签的条目重新加载
+    cache_tag_ttl_seconds: int = 86400
+    # JSON 列表响应体达到此字节数时按 Accept-Encoding 压缩（br 需安装 brotli，否则 gzip）
+    response_compress_min_bytes: int = 1024
+    # 首页公告分页缓存的兜底有效期（写入时本进程立即失效；多进程部署时其余进程最迟在此时间后刷新）
+    announcement_cache_ttl_seconds: int = 300
+    # 学生端队伍视图（成员、加入记录、令牌）缓存的兜底有效期（成员或令牌变化时立即失效）
+    team_view_cache_ttl_seconds: int = 60
+    # 学生端队伍提交记录分页缓存的兜底有效期（队伍有新提交时立即失效）
+    submission_history_cache_ttl_seconds: int = 300
+    # 优秀作品公开列表缓存的兜底有效期（上传或删除时本进程立即失效）
+    excellent_cache_ttl_seconds: int = 300
+    # 赛季登记表缓存的兜底有效期（窗口边界到来或本进程写入时立即失效）
+    season_cache_ttl_seconds: int = 60
+    # 签名下载链接：签名密钥（为空时使用 jwt_secret）与有效期；文件元数据缓存时长
+    download_url_secret: str = ""
+    signed_url_ttl_seconds: int = 600
+    file_meta_cache_ttl_seconds: int = 300
 
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import hashlib
+
+from fastapi import Request
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import DataVersion
+
+
+# 数据版本：按表记录的单调递增计数，用于廉价地生成列表接口的弱 ETag。
+# - 会话 flush（ORM 增删改）与批量 update/delete 语句时记下本事务写过的受跟踪表；
+# - 提交前（before_commit）先 flush，再在同一事务、同一连接上把这些表的版本各加一：业务数据与版本一起提交或一起回滚，
+#   不占用第二个连接，也不会出现数据已提交而版本未变、列表一直返回 304 的情况；
+# - 版本行在提交前才更新并按名称顺序加锁，行锁只持有到本事务提交，并发提交不会互相死锁；
+# - 列表接口先读取相关表的版本（一次主键查询）再决定是否查询数据：版本未变即返回 304，不查询也不序列化；
+# - 版本存放在数据库中，多进程、多节点部署时各 worker 生成的 ETag 一致。
+
+TRACKED = frozenset({
+    "teams",
+    "team_members",
+    "submissions",
+    "submission_files",
+    "reviews",
+    "audit_logs",
+})
+
+_PENDING = "data_versions.pending"
+
+
+def _mark(session: Session, table_name: str | None) -> None:
+    if table_name in TRACKED:
+        session.info.setdefault(_PENDING, set()).add(table_name)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__table__", None)
+        _mark(session, table.name if table is not None else None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(state) -> None:
+    if state.is_update or state.is_delete or state.is_insert:
+        table = getattr(state.statement, "table", None)
+        _mark(state.session, getattr(table, "name", None))
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session: Session) -> None:
+    # commit() 在 before_commit 之后才做最后一次 flush，这里先 flush，保证本事务的写入都已记下
+    session.flush()
+    tables = session.info.pop(_PENDING, None)
+    if tables:
+        bump(session.connection(), tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def ensure_version_rows(bind) -> None:
+    """启动时为受跟踪的表补齐版本行，业务事务中只需 UPDATE，不会因并发插入同名行而提交失败。"""
+    with bind.begin() as conn:
+        existing = set(conn.scalars(select(DataVersion.name)))
+        for name in sorted(TRACKED - existing):
+            conn.execute(insert(DataVersion).values(name=name, version=0))
+
+
+def bump(conn, tables) -> None:
+    """在调用方的事务中把各表版本加一；失败时异常向上抛出，随业务事务一起回滚。"""
+    names = sorted(tables)
+    result = conn.execute(
+        update(DataVersion).where(DataVersion.name.in_(names)).values(version=DataVersion.version + 1)
+    )
+    if result.rowcount < len(names):
+        existing = set(conn.scalars(select(DataVersion.name).where(DataVersion.name.in_(names))))
+        for name in names:
+            if name not in existing:
+                conn.execute(insert(DataVersion).values(name=name, version=1))
+
+
+def read_versions(db: Session, tables) -> dict[str, int]:
+    rows = db.execute(select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(list(tables))))
+    return {name: version for name, version in rows}
+
+
+def version_etag(db: Session, request: Request, tables: tuple[str, ...], *scope) -> str:
+    """由相关表的版本、请求路径与查询参数以及调用方范围（如教师ID）计算弱 ETag。"""
+    versions = read_versions(db, tables)
+    parts = [request.url.path, request.url.query, *map(str, scope), *(f"{t}={versions.get(t, 0)}" for t in tables)]
+    return f'W/"{hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()}"'
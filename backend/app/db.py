@@ -15,7 +15,18 @@ def get_db_url() -> str:
     )
 
 
-engine = create_engine(get_db_url(), pool_pre_ping=True)
+def pool_size() -> int:
+    # 上传/打包通道（见 admission.py）里的请求各可能占用一个连接，在此之外保留连接给登录等轻量接口
+    heavy = settings.upload_max_in_flight + settings.bulk_max_in_flight
+    return max(settings.db_pool_size, heavy + settings.reserved_db_connections)
+
+
+engine = create_engine(
+    get_db_url(),
+    pool_pre_ping=True,
+    pool_size=pool_size(),
+    max_overflow=settings.db_max_overflow,
+)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 
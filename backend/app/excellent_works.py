@@ -0,0 +1,160 @@
+from __future__ import annotations
+import base64
+import json
+import math
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from .cache import get_cache
+from .config import settings
+from .http_cache import render_json
+from .models import ExcellentWork, ExcellentWorkFile
+
+
+# 历年优秀作品目录（公开）：按 created_at 或 score 排序的游标分页。
+# - 游标为上一页最后一条的 (排序值, id)，下一页按复合条件继续，走 (season_id, created_at)/(season_id, score) 索引，
+#   不使用 OFFSET；
+# - 一页作品先在派生表中选出，再与文件表连接，一条语句取回作品与文件（只取需要的列，不构造 ORM 对象）；
+# - 渲染结果（JSON 字节与 ETag）按查询参数缓存，管理员上传优秀作品或删除赛季后按标签失效。
+
+SORTS = {"created_at": ExcellentWork.created_at, "score": ExcellentWork.score}
+MAX_LIMIT = 100
+TAG = "excellent_works"
+
+
+def invalidate_excellent_works() -> None:
+    get_cache().invalidate_tags(TAG)
+
+
+def _bad_request(message: str) -> HTTPException:
+    return HTTPException(status_code=400, detail={"code": 1001, "message": f"参数校验失败：{message}"})
+
+
+def _encode_cursor(sort: str, value, work_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, work_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _score_param(value) -> Decimal:
+    # 按十进制绑定分数：与 DECIMAL 列精确比较，不经二进制浮点转换
+    value = Decimal(str(value))
+    if not value.is_finite():
+        raise ValueError
+    return value
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, work_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError
+        value = datetime.fromisoformat(value) if sort == "created_at" else _score_param(value)
+        return value, int(work_id)
+    except (ValueError, TypeError, InvalidOperation):
+        raise _bad_request("cursor 无效")
+
+
+def _render(
+    db: Session,
+    season_id: int | None,
+    sort: str,
+    order: str,
+    min_score: float | None,
+    cursor: str | None,
+    limit: int,
+) -> tuple[bytes, str]:
+    column = SORTS[sort]
+    desc = order == "desc"
+    page = select(ExcellentWork.id)
+    if season_id:
+        page = page.where(ExcellentWork.season_id == season_id)
+    if min_score is not None:
+        page = page.where(ExcellentWork.score >= _score_param(min_score))
+    if sort == "score":
+        # 按分数排序时只列出已评分的作品（NULL 无法参与游标比较）
+        page = page.where(ExcellentWork.score.isnot(None))
+    if cursor:
+        value, last_id = _decode_cursor(cursor, sort)
+        if desc:
+            page = page.where(or_(column < value, and_(column == value, ExcellentWork.id < last_id)))
+        else:
+            page = page.where(or_(column > value, and_(column == value, ExcellentWork.id > last_id)))
+    ordering = (column.desc(), ExcellentWork.id.desc()) if desc else (column.asc(), ExcellentWork.id.asc())
+    # 多取一条用于判断是否还有下一页
+    page = page.order_by(*ordering).limit(limit + 1).subquery()
+
+    rows = db.execute(
+        select(
+            ExcellentWork.id, ExcellentWork.season_id, ExcellentWork.summary, ExcellentWork.score,
+            ExcellentWork.allow_download, ExcellentWork.created_at,
+            ExcellentWorkFile.id, ExcellentWorkFile.filename, ExcellentWorkFile.size, ExcellentWorkFile.hash,
+        )
+        .join(page, page.c.id == ExcellentWork.id)
+        .outerjoin(ExcellentWorkFile, ExcellentWorkFile.work_id == ExcellentWork.id)
+        .order_by(*ordering, ExcellentWorkFile.id.asc())
+    )
+
+    works: dict[int, dict] = {}
+    for work_id, season, summary, score, allow_download, created_at, file_id, filename, size, file_hash in rows:
+        work = works.get(work_id)
+        if work is None:
+            work = works[work_id] = {
+                "id": work_id,
+                "season_id": season,
+                "summary": summary,
+                "score": score,
+                "allow_download": allow_download,
+                "created_at": created_at,
+                "files": [],
+            }
+        if file_id is not None:
+            work["files"].append({
+                "id": file_id,
+                "filename": filename,
+                "size": size,
+                "hash": file_hash,
+                # 仅当 allow_download 为真时提供下载链接
+                "downloadUrl": f"/api/public/excellent-works/{work_id}/files/{file_id}/download" if allow_download else None,
+            })
+
+    data = list(works.values())
+    next_cursor = None
+    if len(data) > limit:
+        data = data[:limit]
+        last = data[-1]
+        next_cursor = _encode_cursor(sort, last[sort], last["id"])
+
+    content = {"code": 0, "message": "ok", "data": data, "nextCursor": next_cursor}
+    return render_json(content)
+
+
+def works_page(
+    db: Session,
+    season_id: int | None,
+    sort: str,
+    order: str,
+    min_score: float | None,
+    cursor: str | None,
+    limit: int,
+) -> tuple[bytes, str]:
+    """返回一页优秀作品的 JSON 字节与 ETag。"""
+    if sort not in SORTS:
+        raise _bad_request("sort 仅支持 created_at 或 score")
+    if order not in ("asc", "desc"):
+        raise _bad_request("order 仅支持 asc 或 desc")
+    if min_score is not None and not math.isfinite(min_score):
+        raise _bad_request("min_score 无效")
+    limit = max(1, min(limit, MAX_LIMIT))
+    return get_cache().get_or_load(
+        f"excellent_works:{season_id}:{sort}:{order}:{min_score}:{cursor}:{limit}",
+        lambda: _render(db, season_id, sort, order, min_score, cursor, limit),
+        ttl=settings.excellent_cache_ttl_seconds,
+        tags=(TAG,),
+    )
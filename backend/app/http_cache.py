@@ -0,0 +1,112 @@
+from __future__ import annotations
+import gzip
+import hashlib
+from typing import Any, Callable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .cache import MemoryCache
+from .config import settings
+from .responses import dumps
+
+try:
+    import brotli
+except ImportError:  # 可选依赖：未安装时只协商 gzip
+    brotli = None
+
+
+# 可缓存的 JSON 响应：渲染一次得到字节与 ETag，之后按 If-None-Match 返回 200 或 304。
+# - 公开的列表接口把 render_json 的结果放进应用缓存，命中时既不查询也不重新序列化；
+# - 需要登录的轮询接口用数据版本生成弱 ETag（见 data_versions.py），未变化时不构造响应体；
+# - 超过 response_compress_min_bytes 的响应体按 Accept-Encoding 协商 br（需安装 brotli）或 gzip。
+
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+# 共享响应体（强 ETag）的压缩结果按 ETag 复用，不必每次命中都重新压缩
+_compressed = MemoryCache(maxsize=256)
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 弱比较：W/"x" 与 "x" 视为同一个
+    return _opaque(etag) in (_opaque(t.strip()) for t in if_none_match.split(","))
+
+
+def render_json(content) -> tuple[bytes, str]:
+    """序列化为与默认响应类相同的字节，并按内容计算 ETag。"""
+    body = dumps(content)
+    return body, f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def _negotiate(request: Request) -> str | None:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        try:
+            q = float(params.strip()[2:]) if params.strip().startswith("q=") else 1.0
+        except ValueError:
+            q = 1.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _send(request: Request, body: bytes, headers: dict, etag: str, shared: bool) -> Response:
+    encoding = _negotiate(request) if len(body) >= settings.response_compress_min_bytes else None
+    if encoding:
+        if shared:
+            body = _compressed.get_or_load(f"{encoding}:{etag}", lambda: _compress(body, encoding))
+        else:
+            body = _compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        # 不同编码的字节不同：压缩后的表示只声明弱 ETag
+        if not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _headers(etag: str, cache_control: str) -> dict:
+    # 304 与 200 携带相同的 ETag/Cache-Control/Vary，缓存按同一组请求头匹配表示；
+    # private 响应的内容随登录身份不同，Vary 同时包含 Authorization
+    vary = "Accept-Encoding, Authorization" if cache_control.startswith("private") else "Accept-Encoding"
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": vary}
+
+
+def cached_json_response(request: Request, body: bytes, etag: str, cache_control: str = "public, no-cache") -> Response:
+    headers = _headers(etag, cache_control)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return _send(request, body, headers, etag, shared=True)
+
+
+def versioned_json_response(
+    request: Request,
+    etag: str,
+    build: Callable[[], Any],
+    cache_control: str = "private, no-cache",
+) -> Response:
+    """ETag 命中时直接返回 304；否则调用 build() 构造内容并按需压缩。"""
+    headers = _headers(etag, cache_control)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body, _ = render_json(build())
+    return _send(request, body, headers, etag, shared=False)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import IdempotencyKey
+
+
+# 幂等键：客户端在写请求上携带 Idempotency-Key 头，超时后用同一个键重试时直接返回首次的响应，
+# 不再读取请求体、不再写入文件或数据。
+# - 键按调用者（角色 + id）隔离，并记录接口与请求指纹；同一个键用于不同请求时拒绝；
+# - 处理开始时先提交一条 pending 记录占住键，处理中的重复请求返回 409；
+# - 响应与业务数据在同一事务中提交；处理失败（或未产生响应）时删除 pending 记录，可用同一键重试。
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 128
+
+
+def body_fingerprint(body) -> str:
+    """JSON 请求体的指纹（键排序后的 SHA-256）。"""
+    data = json.dumps(jsonable_encoder(body), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class Idempotency:
+    """用法：
+
+        with Idempotency(db, request, f"student:{student.id}") as idem:
+            if idem.replay is not None:
+                return idem.replay
+            ...  # 业务写入（不提交）
+            idem.stage(response)
+            db.commit()
+
+    请求未携带 Idempotency-Key 时不做任何处理。
+    """
+
+    def __init__(self, db: Session, request: Request, actor: str, fingerprint: str = ""):
+        self.db = db
+        self.key = request.headers.get(HEADER)
+        self.actor = actor
+        self.endpoint = f"{request.method} {request.url.path}"[:255]
+        self.fingerprint = fingerprint
+        self.replay: JSONResponse | None = None
+        self._row_id: int | None = None
+        self._staged = False
+
+    def __enter__(self) -> "Idempotency":
+        if self.key is not None:
+            self._begin()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._row_id is not None and (exc_type is not None or not self._staged):
+            self._release()
+        return False
+
+    def stage(self, body: dict) -> None:
+        """写入响应（不提交事务），随业务数据一起提交。"""
+        if self._row_id is None:
+            return
+        (
+            self.db.query(IdempotencyKey)
+            .filter(IdempotencyKey.id == self._row_id)
+            .update(
+                {
+                    IdempotencyKey.status: "done",
+                    IdempotencyKey.response: json.dumps(jsonable_encoder(body), ensure_ascii=False),
+                },
+                synchronize_session=False,
+            )
+        )
+        self._staged = True
+
+    def _begin(self) -> None:
+        key = self.key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": f"{HEADER} 无效：长度应为 1~{MAX_KEY_LENGTH} 个字符"})
+        self.key = key
+        now = datetime.now()
+        expires_at = now + timedelta(hours=settings.idempotency_ttl_hours)
+        row = IdempotencyKey(
+            actor=self.actor,
+            key=key,
+            endpoint=self.endpoint,
+            fingerprint=self.fingerprint,
+            status="pending",
+            created_at=now,
+            expires_at=expires_at,
+        )
+        try:
+            self.db.add(row)
+            self.db.commit()
+            self._row_id = row.id
+            return
+        except IntegrityError:
+            self.db.rollback()
+
+        existing = (
+            self.db.query(IdempotencyKey)
+            .filter(IdempotencyKey.actor == self.actor, IdempotencyKey.key == key)
+            .first()
+        )
+        if existing is None:
+            # 记录恰好被清理：按新请求处理
+            return self._begin()
+        if existing.expires_at >= now:
+            if existing.endpoint != self.endpoint or existing.fingerprint != self.fingerprint:
+                raise HTTPException(status_code=422, detail={"code": 1009, "message": f"{HEADER} 已用于其他请求"})
+            if existing.status == "done":
+                self.replay = JSONResponse(json.loads(existing.response), headers={"Idempotent-Replayed": "true"})
+                return
+            if existing.created_at > now - timedelta(seconds=settings.idempotency_pending_timeout_seconds):
+                raise HTTPException(
+                    status_code=409,
+                    detail={"code": 1006, "message": "相同的请求正在处理，请稍后重试"},
+                    headers={"Retry-After": "5"},
+                )
+
+        # 已过期，或 pending 已超时（处理进程中途退出）：条件更新接管，并发接管只有一个成功
+        taken = (
+            self.db.query(IdempotencyKey)
+            .filter(IdempotencyKey.id == existing.id, IdempotencyKey.created_at == existing.created_at)
+            .update(
+                {
+                    IdempotencyKey.endpoint: self.endpoint,
+                    IdempotencyKey.fingerprint: self.fingerprint,
+                    IdempotencyKey.status: "pending",
+                    IdempotencyKey.response: None,
+                    IdempotencyKey.created_at: now,
+                    IdempotencyKey.expires_at: expires_at,
+                },
+                synchronize_session=False,
+            )
+        )
+        self.db.commit()
+        if not taken:
+            raise HTTPException(
+                status_code=409,
+                detail={"code": 1006, "message": "相同的请求正在处理，请稍后重试"},
+                headers={"Retry-After": "5"},
+            )
+        self._row_id = existing.id
+
+    def _release(self) -> None:
+        try:
+            self.db.rollback()
+            (
+                self.db.query(IdempotencyKey)
+                .filter(IdempotencyKey.id == self._row_id, IdempotencyKey.status == "pending")
+                .delete(synchronize_session=False)
+            )
+            self.db.commit()
+        except Exception:
+            pass
@@ -10,10 +10,21 @@ from .routers.admin import router as admin_router
 from .routers.public import router as public_router
 from .routers.student import router as student_router
 from .routers.teacher import router as teacher_router
+from .routers.files import router as files_router
 from .config import settings
+from .responses import FastJSONResponse
+from .reclaim import reclaimer
+from .scrub import scrubber
+from .problem_cache import problem_cache
+from .cache import close_cache
+from .admission import AdmissionMiddleware, configure_threadpool
+from .data_versions import ensure_version_rows
 import os
 
-app = FastAPI(title="数学建模校赛 API")
+app = FastAPI(title="数学建模校赛 API", default_response_class=FastJSONResponse)
+
+# 上传/打包等重接口的并发限制与排队（加在 CORS 之前，使 503/429 响应同样带有 CORS 头）
+app.add_middleware(AdmissionMiddleware)
 
 # 允许前端开发环境跨域访问（直接请求 http://localhost:8080/api）
 app.add_middleware(
@@ -25,6 +36,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 
@@ -33,12 +45,20 @@ async def health():
     return {"status": "ok"}
 
 
+@app.on_event("startup")
+async def on_startup_threadpool():
+    # 需在事件循环中设置 anyio 默认线程池的容量
+    configure_threadpool()
+
+
 @app.on_event("startup")
 def on_startup():
     # 确保数据库存在
     ensure_database_exists()
     # 创建表
     Base.metadata.create_all(bind=engine)
+    # 数据版本行（列表接口弱 ETag 使用）
+    ensure_version_rows(engine)
     # 简易迁移：为 seasons 增加 allow_signup 列（若不存在）
     try:
         with engine.connect() as conn:
@@ -110,8 +130,127 @@ def on_startup():
     except Exception:
         # 迁移失败不阻断启动，建议后续用 Alembic 正式迁移
         pass
+
+    # 简易迁移：文件记录的 path 列加索引（回收任务按 path 判断 blob 是否仍被引用）
+    for table, index in (
+        ("submission_files", "ix_submission_files_path"),
+        ("problem_files", "ix_problem_files_path"),
+        ("excellent_work_files", "ix_excellent_work_files_path"),
+    ):
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(text("""
+                    SELECT COUNT(*) AS cnt
+                    FROM INFORMATION_SCHEMA.STATISTICS
+                    WHERE TABLE_SCHEMA = :schema
+                      AND TABLE_NAME = :table
+                      AND INDEX_NAME = :index
+                """), {"schema": settings.mysql_db, "table": table, "index": index})
+                if (result.scalar() or 0) == 0:
+                    conn.execute(text(f"ALTER TABLE {table} ADD INDEX {index} (path)"))
+                    conn.commit()
+        except Exception:
+            pass
+    # 简易迁移：优秀作品公开目录的复合索引
+    for index, columns in (
+        ("ix_excellent_works_season_created", "season_id, created_at"),
+        ("ix_excellent_works_season_score", "season_id, score"),
+    ):
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(text("""
+                    SELECT COUNT(*) AS cnt
+                    FROM INFORMATION_SCHEMA.STATISTICS
+                    WHERE TABLE_SCHEMA = :schema
+                      AND TABLE_NAME = 'excellent_works'
+                      AND INDEX_NAME = :index
+                """), {"schema": settings.mysql_db, "index": index})
+                if (result.scalar() or 0) == 0:
+                    conn.execute(text(f"ALTER TABLE excellent_works ADD INDEX {index} ({columns})"))
+                    conn.commit()
+        except Exception:
+            pass
+    # 简易迁移：优秀作品分数由单精度 FLOAT 改为 DECIMAL(6,2)，游标分页按分数精确比较
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT DATA_TYPE
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = :schema
+                  AND TABLE_NAME = 'excellent_works'
+                  AND COLUMN_NAME = 'score'
+            """), {"schema": settings.mysql_db})
+            if (result.scalar() or "").lower() in ("float", "double"):
+                conn.execute(text("ALTER TABLE excellent_works MODIFY COLUMN score DECIMAL(6,2) NULL"))
+                conn.commit()
+    except Exception:
+        pass
+    # 简易迁移：公告与优秀作品摘要的全文索引（ngram 分词，需 MySQL 5.7.6+）
+    for table, index, columns in (
+        ("announcements", "ft_announcements_title_content", "title, content"),
+        ("excellent_works", "ft_excellent_works_summary", "summary"),
+    ):
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(text("""
+                    SELECT COUNT(*) AS cnt
+                    FROM INFORMATION_SCHEMA.STATISTICS
+                    WHERE TABLE_SCHEMA = :schema
+                      AND TABLE_NAME = :table
+                      AND INDEX_NAME = :index
+                """), {"schema": settings.mysql_db, "table": table, "index": index})
+                if (result.scalar() or 0) == 0:
+                    conn.execute(text(f"ALTER TABLE {table} ADD FULLTEXT INDEX {index} ({columns}) WITH PARSER ngram"))
+                    conn.commit()
+        except Exception:
+            pass
+    # 简易迁移：提交版本号唯一（team_id, version）与队伍提交计数 teams.submission_seq
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) AS cnt
+                FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = :schema
+                  AND TABLE_NAME = 'submissions'
+                  AND INDEX_NAME = 'uq_submission_team_version'
+            """), {"schema": settings.mysql_db})
+            if (result.scalar() or 0) == 0:
+                # 历史并发上传可能产生重复版本号：按 id 顺序为这些队伍重新编号后再加唯一索引
+                dup_teams = [row[0] for row in conn.execute(text("""
+                    SELECT DISTINCT team_id FROM submissions
+                    GROUP BY team_id, version HAVING COUNT(*) > 1
+                """))]
+                for team_id in dup_teams:
+                    ids = [row[0] for row in conn.execute(
+                        text("SELECT id FROM submissions WHERE team_id = :tid ORDER BY id"), {"tid": team_id}
+                    )]
+                    for ver, sid in enumerate(ids, start=1):
+                        conn.execute(text("UPDATE submissions SET version = :v WHERE id = :id"), {"v": ver, "id": sid})
+                conn.execute(text("ALTER TABLE submissions ADD UNIQUE INDEX uq_submission_team_version (team_id, version)"))
+                conn.commit()
+    except Exception:
+        pass
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) AS cnt
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = :schema
+                  AND TABLE_NAME = 'teams'
+                  AND COLUMN_NAME = 'submission_seq'
+            """), {"schema": settings.mysql_db})
+            if (result.scalar() or 0) == 0:
+                conn.execute(text("ALTER TABLE teams ADD COLUMN submission_seq INT NOT NULL DEFAULT 0"))
+                # 计数从现有最大版本号继续
+                conn.execute(text("""
+                    UPDATE teams t
+                    SET submission_seq = (SELECT COALESCE(MAX(s.version), 0) FROM submissions s WHERE s.team_id = t.id)
+                """))
+                conn.commit()
+    except Exception:
+        pass
     # 确保上传目录存在
-    for d in [settings.upload_base_dir, settings.problems_dir, settings.excellent_dir, settings.submissions_dir]:
+    for d in [settings.upload_base_dir, settings.problems_dir, settings.excellent_dir, settings.submissions_dir, settings.blobs_dir, settings.upload_tmp_dir, settings.upload_sessions_dir]:
         try:
             os.makedirs(d, exist_ok=True)
         except Exception:
@@ -152,10 +291,30 @@ def on_startup():
 
         db.commit()
 
+    # 后台存储回收任务
+    if settings.gc_enabled:
+        reclaimer.start()
+    # 赛题 ZIP 开赛前预热
+    problem_cache.start()
+    # 继续因重启中断的存储校验任务
+    try:
+        scrubber.resume_interrupted()
+    except Exception:
+        pass
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    reclaimer.stop()
+    scrubber.stop()
+    problem_cache.stop()
+    close_cache()
+
 
 # 挂载认证与管理员路由
 app.include_router(auth_router)
 app.include_router(admin_router)
 app.include_router(public_router)
 app.include_router(student_router)
-app.include_router(teacher_router)
\ No newline at end of file
+app.include_router(teacher_router)
+app.include_router(files_router)
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, Boolean, DateTime, ForeignKey, Text, Float, UniqueConstraint
+from sqlalchemy import String, Integer, BigInteger, Boolean, DateTime, ForeignKey, Text, Float, Numeric, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from .db import Base
@@ -66,6 +66,7 @@ class Team(Base):
     captain_id: Mapped[int] = mapped_column(ForeignKey("students.id"), index=True)
     status: Mapped[str] = mapped_column(String(16), default="pending", index=True)  # pending/approved/locked
     locked: Mapped[bool] = mapped_column(Boolean, default=False)
+    submission_seq: Mapped[int] = mapped_column(Integer, default=0)  # 已分配的最大提交版本号（原子自增）
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
 
@@ -103,6 +104,19 @@ class TeamJoinRequest(Base):
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
 
+# 内容寻址存储的文件实体：相同内容只保存一份，按引用计数回收
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    hash: Mapped[str] = mapped_column(String(64), unique=True, index=True)  # sha256 十六进制
+    size: Mapped[int] = mapped_column(BigInteger)
+    path: Mapped[str] = mapped_column(String(512), index=True)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class ProblemFile(Base):
     __tablename__ = "problem_files"
 
@@ -111,13 +125,16 @@ class ProblemFile(Base):
     filename: Mapped[str] = mapped_column(String(256))
     size: Mapped[int] = mapped_column(Integer)
     hash: Mapped[str] = mapped_column(String(128))
-    path: Mapped[str] = mapped_column(String(512))
+    path: Mapped[str] = mapped_column(String(512), index=True)
     visible_after_start: Mapped[bool] = mapped_column(Boolean, default=True)
     uploaded_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
 
 class Submission(Base):
     __tablename__ = "submissions"
+    __table_args__ = (
+        UniqueConstraint("team_id", "version", name="uq_submission_team_version"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     team_id: Mapped[int] = mapped_column(ForeignKey("teams.id"), index=True)
@@ -137,10 +154,82 @@ class SubmissionFile(Base):
     filename: Mapped[str] = mapped_column(String(256))
     size: Mapped[int] = mapped_column(Integer)
     hash: Mapped[str] = mapped_column(String(128))
-    path: Mapped[str] = mapped_column(String(512))
+    path: Mapped[str] = mapped_column(String(512), index=True)
     uploaded_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
 
+# 断点续传会话：文件块写入 uploads/sessions/<id>.part，状态落库以便进程重启后继续
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id"), index=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), index=True)
+    type: Mapped[str] = mapped_column(String(16))  # thesis | materials
+    filename: Mapped[str] = mapped_column(String(256))
+    size: Mapped[int] = mapped_column(BigInteger)
+    sha256: Mapped[str | None] = mapped_column(String(64), nullable=True)  # 客户端声明的整文件哈希（可选）
+    temp_path: Mapped[str] = mapped_column(String(512))
+    status: Mapped[str] = mapped_column(String(16), default="uploading", index=True)  # uploading/finished
+    expires_at: Mapped[DateTime] = mapped_column(DateTime)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+    __table_args__ = (
+        UniqueConstraint("session_id", "offset", name="uq_upload_chunk_offset"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(ForeignKey("upload_sessions.id"), index=True)
+    offset: Mapped[int] = mapped_column(BigInteger)
+    length: Mapped[int] = mapped_column(Integer)
+    hash: Mapped[str] = mapped_column(String(64))
+    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+
+
+# 存储校验任务：按文件类型、记录 id 顺序重新计算哈希；检查点（phase + last_id）随每批结果落库，
+# 中断后从断点继续。worker/heartbeat_at 为租约，避免多个进程同时执行同一任务
+class ScrubRun(Base):
+    __tablename__ = "scrub_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    season_id: Mapped[int | None] = mapped_column(ForeignKey("seasons.id"), index=True, nullable=True)  # 为空表示全部文件
+    status: Mapped[str] = mapped_column(String(16), default="running", index=True)  # running/paused/finished/failed
+    phase: Mapped[str] = mapped_column(String(16), default="problem")  # problem/submission/excellent
+    last_id: Mapped[int] = mapped_column(Integer, default=0)
+    files_checked: Mapped[int] = mapped_column(Integer, default=0)
+    bytes_checked: Mapped[int] = mapped_column(BigInteger, default=0)
+    missing_count: Mapped[int] = mapped_column(Integer, default=0)
+    corrupted_count: Mapped[int] = mapped_column(Integer, default=0)
+    error_count: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    worker: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    heartbeat_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    started_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    finished_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class ScrubFinding(Base):
+    __tablename__ = "scrub_findings"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_id: Mapped[int] = mapped_column(ForeignKey("scrub_runs.id"), index=True)
+    kind: Mapped[str] = mapped_column(String(16))  # problem/submission/excellent
+    file_id: Mapped[int] = mapped_column(Integer)
+    path: Mapped[str] = mapped_column(String(512))
+    status: Mapped[str] = mapped_column(String(16), index=True)  # missing/corrupted/error
+    expected_hash: Mapped[str] = mapped_column(String(128))
+    actual_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    expected_size: Mapped[int] = mapped_column(BigInteger)
+    actual_size: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    detail: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+
+
 class ReviewDimension(Base):
     __tablename__ = "review_dimensions"
 
@@ -189,6 +278,31 @@ class ReviewScore(Base):
     score: Mapped[float] = mapped_column(Float)
 
 
+# 幂等键：同一调用者用同一 Idempotency-Key 重试写请求时返回首次的响应
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("actor", "key", name="uq_idempotency_actor_key"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    actor: Mapped[str] = mapped_column(String(64))  # student:<id> / teacher:<id>
+    key: Mapped[str] = mapped_column(String(128))
+    endpoint: Mapped[str] = mapped_column(String(255))  # 方法 + 路径
+    fingerprint: Mapped[str] = mapped_column(String(64), default="")  # JSON 请求体哈希；上传接口不读取请求体，为空
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending/done
+    response: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    expires_at: Mapped[DateTime] = mapped_column(DateTime, index=True)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)  # 表名
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
@@ -228,6 +342,13 @@ class Enrollment(Base):
 
 class ExcellentWork(Base):
     __tablename__ = "excellent_works"
+    # 公开目录按赛季筛选、按创建时间或分数排序的游标分页
+    __table_args__ = (
+        Index("ix_excellent_works_season_created", "season_id", "created_at"),
+        Index("ix_excellent_works_season_score", "season_id", "score"),
+        # 摘要全文检索（ngram 分词，支持中文）
+        Index("ft_excellent_works_summary", "summary", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     season_id: Mapped[int] = mapped_column(ForeignKey("seasons.id"), index=True)
@@ -235,7 +356,8 @@ class ExcellentWork(Base):
     team_id: Mapped[int | None] = mapped_column(ForeignKey("teams.id"), index=True, nullable=True)
     submission_id: Mapped[int | None] = mapped_column(ForeignKey("submissions.id"), index=True, nullable=True)
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
-    score: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # 定点小数：游标与 min_score 按存储值精确比较（单精度 FLOAT 存不下 87.3 之类的值，相等比较会失败）
+    score: Mapped[float | None] = mapped_column(Numeric(6, 2, asdecimal=False), nullable=True)
     allow_download: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
@@ -248,12 +370,16 @@ class ExcellentWorkFile(Base):
     filename: Mapped[str] = mapped_column(String(256))
     size: Mapped[int] = mapped_column(Integer)
     hash: Mapped[str] = mapped_column(String(128))
-    path: Mapped[str] = mapped_column(String(512))
+    path: Mapped[str] = mapped_column(String(512), index=True)
     uploaded_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
 
 class Announcement(Base):
     __tablename__ = "announcements"
+    # 标题与正文全文检索（ngram 分词，支持中文）
+    __table_args__ = (
+        Index("ft_announcements_title_content", "title", "content", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(256))
@@ -0,0 +1,239 @@
+from __future__ import annotations
+import os
+import threading
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session
+
+from .cache import get_cache
+from .config import settings
+from .db import SessionLocal
+from .models import ProblemFile, Season
+from .storage_backend import content_disposition, get_storage
+
+
+# 赛题 ZIP 分发：开赛瞬间大量学生同时下载同一个文件。
+# - 后台线程在开赛前把文件读入内存（不超过 problem_cache_max_bytes；更大的本地文件预读进页缓存），
+#   开赛 problem_cache_hold_seconds 秒后释放；
+# - 内存中的文件按 memoryview 分块输出：不读磁盘、不占线程池、不复制，支持 ETag/304 与单区间 Range；
+# - 赛题按内容寻址保存，新上传的 ZIP 完整写入新 blob 后才切换记录的 path，进行中的下载读的仍是旧文件。
+
+SEND_CHUNK = 256 * 1024
+
+# 赛季赛题与开赛时间（每次下载都要用到，短时缓存；上传或删除赛季时失效）
+META_TTL_SECONDS = 30
+
+
+def problem_meta(db: Session, season_id: int) -> dict | None:
+    def load() -> dict | None:
+        row = (
+            db.query(ProblemFile, Season.start_time)
+            .join(Season, Season.id == ProblemFile.season_id)
+            .filter(ProblemFile.season_id == season_id)
+            .first()
+        )
+        if not row:
+            return None
+        pf, start_time = row
+        return {
+            "season_id": season_id,
+            "start_time": start_time,
+            "visible_after_start": pf.visible_after_start,
+            "filename": pf.filename,
+            "size": pf.size,
+            "hash": pf.hash,
+            "path": pf.path,
+        }
+
+    return get_cache().get_or_load(f"problem_meta:{season_id}", load, ttl=META_TTL_SECONDS)
+
+
+def invalidate_problem_meta(season_id: int) -> None:
+    get_cache().delete(f"problem_meta:{season_id}")
+
+
+def _in_window(start_time: datetime | None, now: datetime) -> bool:
+    if start_time is None:
+        return False
+    lead = timedelta(seconds=settings.problem_prewarm_lead_seconds)
+    hold = timedelta(seconds=settings.problem_cache_hold_seconds)
+    return start_time - lead <= now <= start_time + hold
+
+
+class ProblemCache:
+    def __init__(self):
+        self._data: dict[str, bytes] = {}  # blob 哈希 -> 文件内容
+        self._loading: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ---- 后台预热 ----
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="problem-prewarm", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def trigger(self) -> None:
+        """立即检查一次（例如上传新的赛题之后）。"""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.warm()
+            except Exception:
+                pass
+            self._wake.wait(settings.problem_prewarm_interval_seconds)
+            self._wake.clear()
+
+    def warm(self) -> None:
+        """加载即将开赛或刚开赛的赛题，释放窗口外的缓存。"""
+        now = datetime.now()
+        lead = timedelta(seconds=settings.problem_prewarm_lead_seconds)
+        hold = timedelta(seconds=settings.problem_cache_hold_seconds)
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(ProblemFile.hash, ProblemFile.path, ProblemFile.size)
+                .join(Season, Season.id == ProblemFile.season_id)
+                .filter(Season.start_time >= now - hold, Season.start_time <= now + lead)
+                .all()
+            )
+        finally:
+            db.close()
+
+        keep = set()
+        for digest, path, size in rows:
+            try:
+                if size <= settings.problem_cache_max_bytes:
+                    keep.add(digest)
+                    self._ensure(digest, path)
+                else:
+                    self._warm_page_cache(path)
+            except Exception:
+                # 单个文件读取失败（如存储中缺失）不影响其他赛季
+                pass
+        with self._lock:
+            for digest in [d for d in self._data if d not in keep]:
+                del self._data[digest]
+
+    def _warm_page_cache(self, key: str) -> None:
+        local = get_storage().local_path(key)
+        fadvise = getattr(os, "posix_fadvise", None)
+        if local is None or fadvise is None:
+            return
+        try:
+            fd = os.open(local, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            # 内核异步预读，不阻塞本线程
+            fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+    def _ensure(self, digest: str, key: str) -> bytes | None:
+        data = self._data.get(digest)
+        if data is not None:
+            return data
+        with self._lock:
+            lock = self._loading.setdefault(digest, threading.Lock())
+        # 同一文件并发未命中时只读取一次，其余请求等待结果
+        with lock:
+            data = self._data.get(digest)
+            if data is None:
+                buf = bytearray()
+                for chunk in get_storage().read_range(key):
+                    buf += chunk
+                data = bytes(buf)
+                with self._lock:
+                    self._data[digest] = data
+        with self._lock:
+            self._loading.pop(digest, None)
+        return data
+
+    # ---- 读取 ----
+
+    def get(self, meta: dict) -> bytes | None:
+        """返回内存中的赛题内容；在预热窗口内但尚未加载时同步加载，窗口外或文件过大返回 None。"""
+        data = self._data.get(meta["hash"])
+        if data is not None:
+            return data
+        if meta["size"] > settings.problem_cache_max_bytes or not _in_window(meta["start_time"], datetime.now()):
+            return None
+        try:
+            return self._ensure(meta["hash"], meta["path"])
+        except Exception:
+            # 读取失败时交给文件输出（不存在时返回 404）
+            return None
+
+
+problem_cache = ProblemCache()
+
+
+def _byte_range(value: str, size: int) -> tuple[int, int] | None:
+    """解析单区间 Range 头，返回 [start, end)；多区间等不支持的写法返回 None（按整个文件输出）。"""
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+        else:
+            start, end = max(size - int(last), 0), size
+    except ValueError:
+        return None
+    end = min(end, size)
+    if start >= end:
+        raise HTTPException(
+            status_code=416,
+            detail={"code": 1001, "message": "请求的区间超出文件范围"},
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+async def _iter_memory(view: memoryview):
+    for i in range(0, len(view), SEND_CHUNK):
+        yield view[i:i + SEND_CHUNK]
+
+
+def memory_response(request: Request, data: bytes, filename: str, media_type: str, headers: dict) -> Response:
+    """输出内存中的文件，支持单区间 Range 与 If-Range。"""
+    size = len(data)
+    headers = {
+        **headers,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition("attachment", filename),
+    }
+    status_code, start, end = 200, 0, size
+    http_range = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if http_range and (if_range is None or if_range == headers.get("ETag")):
+        byte_range = _byte_range(http_range, size)
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        _iter_memory(memoryview(data)[start:end]),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
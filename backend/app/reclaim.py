@@ -0,0 +1,348 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import SessionLocal
+from .models import (
+    Blob, Season, Team, TeamMember, TeamJoinToken, TeamJoinRequest, Enrollment, Submission, SubmissionFile,
+    Review, ReviewScore, ReviewDimension, ReviewConfig, ProblemFile, ExcellentWork, ExcellentWorkFile,
+    UploadSession, UploadChunk, ScrubRun, ScrubFinding, IdempotencyKey,
+)
+from .storage_backend import get_storage
+
+
+# ------------------------
+# 级联删除：以固定条数的集合语句删除队伍/赛季及其关联数据（与数据量无关），
+# 在同一事务内完成；文件本身不在请求中删除，由下方的回收任务在宽限期后清理。
+# ------------------------
+
+# 引用 blob 的文件记录表（path 字段即 blob 的存储键）
+FILE_MODELS = (SubmissionFile, ProblemFile, ExcellentWorkFile)
+
+
+def release_file_refs(db: Session, model, condition) -> None:
+    """即将删除满足 condition 的文件记录：按引用次数批量减少对应 blob 的引用计数。"""
+    refs = (
+        select(func.count())
+        .select_from(model)
+        .where(model.path == Blob.path, condition)
+        .scalar_subquery()
+    )
+    (
+        db.query(Blob)
+        .filter(Blob.path.in_(select(model.path).where(condition)))
+        .update({Blob.ref_count: Blob.ref_count - refs, Blob.updated_at: func.now()}, synchronize_session=False)
+    )
+
+
+def _purge_teams(db: Session, team_condition) -> None:
+    team_ids = select(Team.id).where(team_condition)
+    sub_ids = select(Submission.id).where(Submission.team_id.in_(team_ids))
+    review_ids = select(Review.id).where(Review.submission_id.in_(sub_ids))
+    session_ids = select(UploadSession.id).where(UploadSession.team_id.in_(team_ids))
+
+    release_file_refs(db, SubmissionFile, SubmissionFile.submission_id.in_(sub_ids))
+    # 优秀作品是独立整理的内容，保留作品，仅解除与队伍/提交的关联
+    (
+        db.query(ExcellentWork)
+        .filter(ExcellentWork.team_id.in_(team_ids) | ExcellentWork.submission_id.in_(sub_ids))
+        .update({ExcellentWork.team_id: None, ExcellentWork.submission_id: None}, synchronize_session=False)
+    )
+    db.query(ReviewScore).filter(ReviewScore.review_id.in_(review_ids)).delete(synchronize_session=False)
+    db.query(Review).filter(Review.submission_id.in_(sub_ids)).delete(synchronize_session=False)
+    db.query(SubmissionFile).filter(SubmissionFile.submission_id.in_(sub_ids)).delete(synchronize_session=False)
+    db.query(Submission).filter(Submission.team_id.in_(team_ids)).delete(synchronize_session=False)
+    # 续传会话的临时文件由回收任务按“无对应会话”清理
+    db.query(UploadChunk).filter(UploadChunk.session_id.in_(session_ids)).delete(synchronize_session=False)
+    db.query(UploadSession).filter(UploadSession.team_id.in_(team_ids)).delete(synchronize_session=False)
+    db.query(TeamMember).filter(TeamMember.team_id.in_(team_ids)).delete(synchronize_session=False)
+    db.query(TeamJoinToken).filter(TeamJoinToken.team_id.in_(team_ids)).delete(synchronize_session=False)
+    db.query(TeamJoinRequest).filter(TeamJoinRequest.team_id.in_(team_ids)).delete(synchronize_session=False)
+    db.query(Team).filter(team_condition).delete(synchronize_session=False)
+
+
+def delete_team_cascade(db: Session, team_id: int) -> None:
+    """删除队伍及其成员、令牌、提交、文件记录与评审（不提交事务）。"""
+    _purge_teams(db, Team.id == team_id)
+
+
+def delete_season_cascade(db: Session, season_id: int) -> None:
+    """删除赛季及其全部队伍、赛题、优秀作品、评审配置、报名与校验任务记录（不提交事务）。"""
+    work_ids = select(ExcellentWork.id).where(ExcellentWork.season_id == season_id)
+    release_file_refs(db, ExcellentWorkFile, ExcellentWorkFile.work_id.in_(work_ids))
+    db.query(ExcellentWorkFile).filter(ExcellentWorkFile.work_id.in_(work_ids)).delete(synchronize_session=False)
+    db.query(ExcellentWork).filter(ExcellentWork.season_id == season_id).delete(synchronize_session=False)
+    release_file_refs(db, ProblemFile, ProblemFile.season_id == season_id)
+    db.query(ProblemFile).filter(ProblemFile.season_id == season_id).delete(synchronize_session=False)
+    db.query(ReviewDimension).filter(ReviewDimension.season_id == season_id).delete(synchronize_session=False)
+    db.query(ReviewConfig).filter(ReviewConfig.season_id == season_id).delete(synchronize_session=False)
+    db.query(Enrollment).filter(Enrollment.season_id == season_id).delete(synchronize_session=False)
+    _purge_teams(db, Team.season_id == season_id)
+    run_ids = select(ScrubRun.id).where(ScrubRun.season_id == season_id)
+    db.query(ScrubFinding).filter(ScrubFinding.run_id.in_(run_ids)).delete(synchronize_session=False)
+    db.query(ScrubRun).filter(ScrubRun.season_id == season_id).delete(synchronize_session=False)
+    db.query(Season).filter(Season.id == season_id).delete(synchronize_session=False)
+
+
+# ------------------------
+# 回收任务：后台线程定期清理无引用的 blob、孤立记录与残留临时文件。
+# 只回收超过宽限期的对象；按批处理并限速；dry_run 只统计不删除。
+# ------------------------
+
+_SAMPLE_SIZE = 20
+
+
+def _unreferenced():
+    # 以文件记录是否仍指向该 blob 为准（引用计数可能因历史数据不准，不作为删除依据）
+    condition = None
+    for model in FILE_MODELS:
+        clause = ~exists().where(model.path == Blob.path)
+        condition = clause if condition is None else condition & clause
+    return condition
+
+
+class _RateLimiter:
+    """限制每秒删除次数，避免回收任务占满磁盘/对象存储的 I/O。"""
+
+    def __init__(self, per_second: float):
+        self._interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next = time.monotonic()
+
+    def wait(self) -> None:
+        if not self._interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + self._interval
+
+
+class Reclaimer:
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.last_report: dict | None = None
+
+    # ---- 后台线程 ----
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="storage-reclaimer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def trigger(self) -> None:
+        """立即执行一轮回收（例如删除队伍/赛季之后）。"""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(settings.gc_interval_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.run_once(dry_run=settings.gc_dry_run)
+            except Exception:
+                # 单轮失败不影响后续运行
+                pass
+
+    # ---- 单轮回收 ----
+
+    def run_once(self, dry_run: bool = False) -> dict:
+        with self._run_lock:
+            report = {
+                "dryRun": dry_run,
+                "startedAt": datetime.now().isoformat(),
+                "graceSeconds": settings.gc_grace_seconds,
+            }
+            limiter = _RateLimiter(settings.gc_max_deletes_per_second)
+            cutoff = datetime.now() - timedelta(seconds=settings.gc_grace_seconds)
+            db = SessionLocal()
+            try:
+                report["orphanRows"] = self._orphan_rows(db, dry_run)
+                report["uploadSessions"] = self._expired_sessions(db, cutoff, dry_run, limiter)
+                report["idempotencyKeys"] = self._delete_in_batches(
+                    db, IdempotencyKey, IdempotencyKey.expires_at < datetime.now(), dry_run
+                )
+                report["blobs"] = self._blobs(db, cutoff, dry_run, limiter)
+                report["tmpFiles"] = self._stale_files(settings.upload_tmp_dir, cutoff, dry_run, limiter)
+                report["sessionFiles"] = self._session_files(db, cutoff, dry_run, limiter)
+                report["strayBlobFiles"] = self._stray_blob_files(db, cutoff, dry_run, limiter)
+            finally:
+                db.close()
+            report["finishedAt"] = datetime.now().isoformat()
+            if not dry_run:
+                self.last_report = report
+            return report
+
+    def _delete_in_batches(self, db: Session, model, condition, dry_run: bool, before_delete=None) -> int:
+        total = db.query(func.count(model.id)).filter(condition).scalar() or 0
+        if dry_run or not total:
+            return total
+        while True:
+            ids = [row[0] for row in db.query(model.id).filter(condition).limit(settings.gc_batch_size).all()]
+            if not ids:
+                break
+            if before_delete:
+                before_delete(model.id.in_(ids))
+            db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        return total
+
+    def _orphan_rows(self, db: Session, dry_run: bool) -> dict:
+        # 历史上删除队伍只删了 Submission，遗留的文件记录与评审在这里补删
+        return {
+            "submissionFiles": self._delete_in_batches(
+                db, SubmissionFile, ~exists().where(Submission.id == SubmissionFile.submission_id), dry_run,
+                before_delete=lambda cond: release_file_refs(db, SubmissionFile, cond),
+            ),
+            "reviewScores": self._delete_in_batches(db, ReviewScore, ~exists().where(Review.id == ReviewScore.review_id), dry_run),
+            "reviews": self._delete_in_batches(db, Review, ~exists().where(Submission.id == Review.submission_id), dry_run),
+            "uploadChunks": self._delete_in_batches(db, UploadChunk, ~exists().where(UploadSession.id == UploadChunk.session_id), dry_run),
+        }
+
+    def _expired_sessions(self, db: Session, cutoff: datetime, dry_run: bool, limiter: _RateLimiter) -> dict:
+        # 过期未完成的会话（连同临时文件），以及完成超过宽限期的会话记录
+        condition = (
+            ((UploadSession.status == "uploading") & (UploadSession.expires_at < datetime.now()))
+            | ((UploadSession.status == "finished") & (UploadSession.updated_at < cutoff))
+        )
+        rows = db.query(UploadSession.id, UploadSession.temp_path).filter(condition).limit(settings.gc_batch_size).all()
+        total = db.query(func.count(UploadSession.id)).filter(condition).scalar() or 0
+        report = {"count": total, "sample": [r[0] for r in rows[:_SAMPLE_SIZE]]}
+        if dry_run:
+            return report
+        while rows:
+            ids = [r[0] for r in rows]
+            db.query(UploadChunk).filter(UploadChunk.session_id.in_(ids)).delete(synchronize_session=False)
+            db.query(UploadSession).filter(UploadSession.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            for _, temp_path in rows:
+                if temp_path and os.path.exists(temp_path):
+                    limiter.wait()
+                    os.remove(temp_path)
+            rows = db.query(UploadSession.id, UploadSession.temp_path).filter(condition).limit(settings.gc_batch_size).all()
+        return report
+
+    def _blobs(self, db: Session, cutoff: datetime, dry_run: bool, limiter: _RateLimiter) -> dict:
+        condition = _unreferenced() & (Blob.updated_at < cutoff)
+        count, size = db.query(func.count(Blob.id), func.coalesce(func.sum(Blob.size), 0)).filter(condition).one()
+        sample = [row[0] for row in db.query(Blob.hash).filter(condition).order_by(Blob.id.asc()).limit(_SAMPLE_SIZE).all()]
+        report = {"count": int(count or 0), "bytes": int(size or 0), "sample": sample, "deleted": 0}
+        if dry_run or not count:
+            return report
+
+        storage = get_storage()
+        last_id = 0
+        while True:
+            ids = [
+                row[0]
+                for row in db.query(Blob.id)
+                .filter(condition, Blob.id > last_id)
+                .order_by(Blob.id.asc())
+                .limit(settings.gc_batch_size)
+                .all()
+            ]
+            if not ids:
+                break
+            last_id = ids[-1]
+            for blob_id in ids:
+                limiter.wait()
+                # 行锁内复核条件，再删文件、删记录：并发上传对该 blob 的引用（自增引用计数）
+                # 会等待本事务结束，随后发现记录已不存在而重新写入文件
+                blob = db.query(Blob).filter(Blob.id == blob_id, condition).with_for_update().first()
+                if blob is None:
+                    db.rollback()
+                    continue
+                storage.delete(blob.path)
+                db.delete(blob)
+                db.commit()
+                report["deleted"] += 1
+        return report
+
+    def _stale_files(self, directory: str, cutoff: datetime, dry_run: bool, limiter: _RateLimiter, keep: set[str] | None = None) -> dict:
+        report = {"count": 0, "bytes": 0, "sample": []}
+        if not os.path.isdir(directory):
+            return report
+        threshold = cutoff.timestamp()
+        for entry in os.scandir(directory):
+            if not entry.is_file() or (keep and entry.name in keep):
+                continue
+            st = entry.stat()
+            if st.st_mtime >= threshold:
+                continue
+            report["count"] += 1
+            report["bytes"] += st.st_size
+            if len(report["sample"]) < _SAMPLE_SIZE:
+                report["sample"].append(entry.name)
+            if not dry_run:
+                limiter.wait()
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return report
+
+    def _session_files(self, db: Session, cutoff: datetime, dry_run: bool, limiter: _RateLimiter) -> dict:
+        # 没有对应会话记录的 .part 文件（会话随队伍删除或记录已清理），以及进程中途退出遗留的 .chunk/.commit 临时文件
+        live = {f"{row[0]}.part" for row in db.query(UploadSession.id).all()}
+        return self._stale_files(settings.upload_sessions_dir, cutoff, dry_run, limiter, keep=live)
+
+    def _stray_blob_files(self, db: Session, cutoff: datetime, dry_run: bool, limiter: _RateLimiter) -> dict:
+        # 仅本地存储：blob 目录中没有对应记录的文件（如删除记录前进程退出）
+        report = {"count": 0, "bytes": 0, "sample": []}
+        if get_storage().local_path(settings.blobs_dir) is None or not os.path.isdir(settings.blobs_dir):
+            return report
+        threshold = cutoff.timestamp()
+        tmp_dir = os.path.abspath(settings.upload_tmp_dir)
+        batch: dict[str, tuple[str, int]] = {}
+
+        def flush() -> None:
+            known = {row[0] for row in db.query(Blob.hash).filter(Blob.hash.in_(list(batch))).all()}
+            for name, (path, size) in batch.items():
+                if name in known:
+                    continue
+                report["count"] += 1
+                report["bytes"] += size
+                if len(report["sample"]) < _SAMPLE_SIZE:
+                    report["sample"].append(name)
+                if not dry_run:
+                    limiter.wait()
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            batch.clear()
+
+        for root, dirs, files in os.walk(settings.blobs_dir):
+            # 上传临时目录位于 blob 目录之下，单独按 tmpFiles 处理
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != tmp_dir]
+            for name in files:
+                if len(name) != 64:
+                    continue
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                if st.st_mtime < threshold:
+                    batch[name] = (path, st.st_size)
+                    if len(batch) >= settings.gc_batch_size:
+                        flush()
+        if batch:
+            flush()
+        return report
+
+
+reclaimer = Reclaimer()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 未安装时退化为标准库 json，输出相同
+    orjson = None
+
+
+# JSON 序列化：全应用默认响应类与各处预渲染（ETag 缓存、数据版本响应）共用同一个 dumps。
+# - 有 orjson 时直接序列化 dict/list/datetime，速度约为标准库的数倍；
+# - datetime 原生输出为 ISO 8601（与 .isoformat() 相同），路由里不必逐个转换；
+# - 列表接口直接返回 FastJSONResponse：跳过 FastAPI 对返回值的 jsonable_encoder 遍历，只编码一次。
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    # 其余类型（Pydantic 模型、集合等）按 FastAPI 的规则转换
+    return jsonable_encoder(obj)
+
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
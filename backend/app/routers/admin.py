@@ -1,20 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from urllib.parse import quote
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from sqlalchemy import case
+from sqlalchemy import case, func, select
 
-from ..db import get_db
-from ..models import Teacher, Season, ProblemFile, ExcellentWork, ExcellentWorkFile, Team, TeamMember, TeamJoinToken, TeamJoinRequest, Submission, Review, ReviewScore, AuditLog, Announcement
+from ..db import engine, get_db
+from ..models import Teacher, Season, ProblemFile, ExcellentWork, ExcellentWorkFile, Team, TeamMember, TeamJoinToken, TeamJoinRequest, Submission, SubmissionFile, Review, ReviewScore, AuditLog, Announcement, ScrubRun, ScrubFinding
 from ..security import require_admin, hash_password, verify_password
 from ..audit import write_audit_log, resolve_actor
+import anyio.to_thread
 import csv
 import io
-import os
-import hashlib
 from datetime import datetime
 import json
+from ..storage import put_file, release_path
+from ..uploads import FileRule, parse_multipart, multipart_openapi, restore_extension
+from ..archive import ZipEntry, stream_zip
+from ..reclaim import delete_season_cascade, delete_team_cascade, reclaimer
+from ..scrub import scrubber, serialize_run
+from ..announcements import invalidate_announcements
+from ..excellent_works import invalidate_excellent_works
+from ..problem_cache import invalidate_problem_meta, problem_cache
+from ..seasons import invalidate_seasons
+from ..team_view import invalidate_team_view
+from ..admission import LANES
+from ..cache import get_cache
+from ..data_versions import version_etag
+from ..http_cache import versioned_json_response
 from ..config import settings
 
 
@@ -155,6 +168,7 @@ def create_announcement(body: CreateAnnouncementBody, db: Session = Depends(get_
     db.add(ann)
     db.commit()
     db.refresh(ann)
+    invalidate_announcements()
 
     # 审计日志
     write_audit_log(
@@ -268,6 +282,7 @@ def update_announcement(
 
     db.commit()
     db.refresh(ann)
+    invalidate_announcements()
 
     # 审计日志
     actor_type, actor_id, _ = resolve_actor(db, _)
@@ -304,6 +319,7 @@ def delete_announcement(announcement_id: int, db: Session = Depends(get_db), _:
 
     db.delete(ann)
     db.commit()
+    invalidate_announcements()
 
     # 审计日志
     actor_type, actor_id, _ = resolve_actor(db, _)
@@ -455,6 +471,7 @@ def create_competition(body: CreateCompetitionBody, db: Session = Depends(get_db
     db.add(season)
     db.commit()
     db.refresh(season)
+    invalidate_seasons()
 
     # 审计：创建竞赛
     try:
@@ -512,6 +529,7 @@ def toggle_competition_signup(
     db.add(season)
     db.commit()
     db.refresh(season)
+    invalidate_seasons()
 
     # 审计：切换报名开关
     try:
@@ -533,6 +551,42 @@ def toggle_competition_signup(
         "data": {"season_id": season.id, "allow_signup": season.allow_signup},
     }
 
+@router.post("/competitions/{season_id}/delete")
+def delete_competition(season_id: int, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    season = db.query(Season).filter(Season.id == season_id).first()
+    if not season:
+        raise HTTPException(status_code=404, detail={
+            "code": 1005,
+            "message": "指定的竞赛不存在",
+        })
+    name = season.name
+    team_count = db.query(Team).filter(Team.season_id == season_id).count()
+
+    # 级联删除赛季下的队伍、提交、评审、赛题与优秀作品（集合语句，单事务）；文件由回收任务在宽限期后清理
+    delete_season_cascade(db, season_id)
+    db.commit()
+    invalidate_problem_meta(season_id)
+    invalidate_seasons()
+    invalidate_excellent_works()
+    reclaimer.trigger()
+
+    # 审计：删除赛季
+    try:
+        actor_type, actor_id, _account = resolve_actor(db, _)
+        write_audit_log(
+            db,
+            actor_type=actor_type,
+            actor_id=actor_id,
+            action="competition.delete",
+            object_type="season",
+            object_id=season_id,
+            details={"name": name, "team_count": team_count},
+        )
+    except Exception:
+        pass
+    return {"code": 0, "message": "ok", "data": {"season_id": season_id, "deleted": True}}
+
+
 @router.get("/competitions")
 def list_competitions(db: Session = Depends(get_db), _: dict = Depends(require_admin)):
     seasons = db.query(Season).order_by(Season.created_at.desc()).all()
@@ -553,10 +607,13 @@ def list_competitions(db: Session = Depends(get_db), _: dict = Depends(require_a
     }
 
 
-@router.post("/competitions/{season_id}/problems/upload")
+PROBLEM_ZIP_RULE = FileRule((".zip",), settings.max_problem_zip_bytes, "problems.zip", 1001, "文件类型错误：仅支持 .zip")
+
+
+@router.post("/competitions/{season_id}/problems/upload", openapi_extra=multipart_openapi({"file": "ZIP 压缩包"}))
 def upload_competition_zip(
     season_id: int,
-    file: UploadFile = File(..., description="ZIP 压缩包"),
+    request: Request,
     db: Session = Depends(get_db),
     _: dict = Depends(require_admin),
 ):
@@ -568,55 +625,48 @@ def upload_competition_zip(
             "message": "指定的竞赛不存在",
         })
 
-    # 仅允许 zip 文件
-    filename = file.filename or "problems.zip"
-    if not filename.lower().endswith(".zip"):
-        raise HTTPException(status_code=400, detail={
-            "code": 1001,
-            "message": "文件类型错误：仅支持 .zip",
-        })
-
-    # 目标文件路径（覆盖保存）
-    target_rel = os.path.join(settings.problems_dir, f"season_{season_id}.zip")
-    target_rel_dir = os.path.dirname(target_rel)
+    # 流式接收：文件直接写入存储目录并同时计算哈希；仅允许 zip 文件，类型与大小在接收中校验
+    form = parse_multipart(request, {"file": PROBLEM_ZIP_RULE})
     try:
-        os.makedirs(target_rel_dir, exist_ok=True)
-    except Exception:
-        pass
+        file = form.files.get("file")
+        if not file:
+            raise HTTPException(status_code=400, detail={
+                "code": 1001,
+                "message": "参数校验失败：缺少文件",
+            })
+        filename = file.filename
 
-    # 保存并计算哈希与大小
-    hasher = hashlib.sha256()
-    size = 0
-    with open(target_rel, "wb") as out:
-        while True:
-            chunk = file.file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
-            hasher.update(chunk)
-            size += len(chunk)
-    file.file.close()
+        # 按内容寻址保存；重复上传相同 ZIP 只增加引用
+        blob = put_file(db, file.path, file.sha256, file.size)
+    finally:
+        form.cleanup()
+    size = blob.size
 
     # 更新或创建记录
     pf = db.query(ProblemFile).filter(ProblemFile.season_id == season_id).first()
     existed = bool(pf)
     if pf:
+        # 旧文件不再被该记录引用
+        release_path(db, pf.path)
         pf.filename = filename
         pf.size = size
-        pf.hash = hasher.hexdigest()
-        pf.path = target_rel
+        pf.hash = blob.hash
+        pf.path = blob.path
         # visible_after_start 保持默认不变
     else:
         pf = ProblemFile(
             season_id=season_id,
             filename=filename,
             size=size,
-            hash=hasher.hexdigest(),
-            path=target_rel,
+            hash=blob.hash,
+            path=blob.path,
             visible_after_start=True,
         )
         db.add(pf)
     db.commit()
+    # 记录已指向新 blob：刷新下载用的元数据，临近开赛时立即预热新文件
+    invalidate_problem_meta(season_id)
+    problem_cache.trigger()
 
     # 审计：上传题目ZIP
     try:
@@ -657,15 +707,22 @@ def upload_competition_zip(
 # 历年优秀作品：管理员上传文件与元数据
 # ------------------------
 
-@router.post("/competitions/{season_id}/excellent/upload")
+EXCELLENT_FILE_RULE = FileRule((".zip", ".pdf"), settings.max_excellent_bytes, "excellent.zip", 1001, "文件类型错误：仅支持 .zip 或 .pdf")
+
+
+@router.post("/competitions/{season_id}/excellent/upload", openapi_extra=multipart_openapi(
+    {"file": "优秀作品文件（ZIP/PDF）"},
+    {
+        "summary": "作品摘要（可选）",
+        "score": "评分（可选）",
+        "allow_download": "是否允许下载",
+        "team_id": "关联队伍ID（可选）",
+        "submission_id": "关联提交ID（可选）",
+    },
+))
 def upload_excellent_work(
     season_id: int,
-    file: UploadFile = File(..., description="优秀作品文件（ZIP/PDF）"),
-    summary: str | None = Form(default=None, description="作品摘要（可选）"),
-    score: float | None = Form(default=None, description="评分（可选）"),
-    allow_download: bool = Form(default=False, description="是否允许下载"),
-    team_id: int | None = Form(default=None, description="关联队伍ID（可选）"),
-    submission_id: int | None = Form(default=None, description="关联提交ID（可选）"),
+    request: Request,
     db: Session = Depends(get_db),
     _: dict = Depends(require_admin),
 ):
@@ -677,148 +734,141 @@ def upload_excellent_work(
             "message": "指定的竞赛不存在",
         })
 
-    # 限制文件类型（允许 zip/pdf）
-    filename = file.filename or "excellent.zip"
-    lower = filename.lower()
-    if not (lower.endswith(".zip") or lower.endswith(".pdf")):
-        raise HTTPException(status_code=400, detail={
-            "code": 1001,
-            "message": "文件类型错误：仅支持 .zip 或 .pdf",
-        })
+    # 流式接收：文件直接写入存储目录并同时计算哈希；限制文件类型（允许 zip/pdf），类型与大小在接收中校验
+    form = parse_multipart(request, {"file": EXCELLENT_FILE_RULE})
+    try:
+        file = form.files.get("file")
+        if not file:
+            raise HTTPException(status_code=400, detail={
+                "code": 1001,
+                "message": "参数校验失败：缺少文件",
+            })
+        filename = file.filename
+
+        summary = form.get_str("summary")
+        score = form.get_float("score")
+        allow_download = form.get_bool("allow_download")
+        team_id = form.get_int("team_id")
+        submission_id = form.get_int("submission_id")
+
+        # 查找或创建 ExcellentWork（若提供 team_id 或 submission_id 则尝试复用）
+        work = None
+        if team_id or submission_id:
+            q = db.query(ExcellentWork).filter(ExcellentWork.season_id == season_id)
+            if team_id:
+                q = q.filter(ExcellentWork.team_id == team_id)
+            if submission_id:
+                q = q.filter(ExcellentWork.submission_id == submission_id)
+            work = q.first()
+
+        if not work:
+            work = ExcellentWork(
+                season_id=season_id,
+                team_id=team_id,
+                submission_id=submission_id,
+                summary=summary,
+                score=score,
+                allow_download=allow_download or False,
+            )
+            db.add(work)
+            db.commit()
+            db.refresh(work)
+            # 审计：创建优秀作品条目
+            try:
+                actor_type, actor_id, _account = resolve_actor(db, _)
+                write_audit_log(
+                    db,
+                    actor_type=actor_type,
+                    actor_id=actor_id,
+                    action="excellent_work.upsert",
+                    object_type="excellent_work",
+                    object_id=work.id,
+                    details={
+                        "op": "create",
+                        "season_id": season_id,
+                        "team_id": team_id,
+                        "submission_id": submission_id,
+                        "summary": summary,
+                        "score": score,
+                        "allow_download": bool(allow_download),
+                    },
+                )
+            except Exception:
+                pass
+        else:
+            # 更新元信息（若传入）
+            if summary is not None:
+                work.summary = summary
+            if score is not None:
+                work.score = score
+            work.allow_download = bool(allow_download)
+            if team_id:
+                work.team_id = team_id
+            if submission_id:
+                work.submission_id = submission_id
+            db.commit()
+            # 审计：更新优秀作品条目
+            try:
+                actor_type, actor_id, _account = resolve_actor(db, _)
+                write_audit_log(
+                    db,
+                    actor_type=actor_type,
+                    actor_id=actor_id,
+                    action="excellent_work.upsert",
+                    object_type="excellent_work",
+                    object_id=work.id,
+                    details={
+                        "op": "update",
+                        "season_id": season_id,
+                        "team_id": team_id,
+                        "submission_id": submission_id,
+                        "summary": work.summary,
+                        "score": work.score,
+                        "allow_download": bool(work.allow_download),
+                    },
+                )
+            except Exception:
+                pass
 
-    # 查找或创建 ExcellentWork（若提供 team_id 或 submission_id 则尝试复用）
-    work = None
-    if team_id or submission_id:
-        q = db.query(ExcellentWork).filter(ExcellentWork.season_id == season_id)
-        if team_id:
-            q = q.filter(ExcellentWork.team_id == team_id)
-        if submission_id:
-            q = q.filter(ExcellentWork.submission_id == submission_id)
-        work = q.first()
-
-    if not work:
-        work = ExcellentWork(
-            season_id=season_id,
-            team_id=team_id,
-            submission_id=submission_id,
-            summary=summary,
-            score=score,
-            allow_download=allow_download or False,
+        # 按内容寻址保存文件
+        blob = put_file(db, file.path, file.sha256, file.size)
+        size = blob.size
+
+        # 记录文件元数据
+        wf = ExcellentWorkFile(
+            work_id=work.id,
+            filename=filename,
+            size=size,
+            hash=blob.hash,
+            path=blob.path,
         )
-        db.add(work)
-        db.commit()
-        db.refresh(work)
-        # 审计：创建优秀作品条目
-        try:
-            actor_type, actor_id, _account = resolve_actor(db, _)
-            write_audit_log(
-                db,
-                actor_type=actor_type,
-                actor_id=actor_id,
-                action="excellent_work.upsert",
-                object_type="excellent_work",
-                object_id=work.id,
-                details={
-                    "op": "create",
-                    "season_id": season_id,
-                    "team_id": team_id,
-                    "submission_id": submission_id,
-                    "summary": summary,
-                    "score": score,
-                    "allow_download": bool(allow_download),
-                },
-            )
-        except Exception:
-            pass
-    else:
-        # 更新元信息（若传入）
-        if summary is not None:
-            work.summary = summary
-        if score is not None:
-            work.score = score
-        work.allow_download = bool(allow_download)
-        if team_id:
-            work.team_id = team_id
-        if submission_id:
-            work.submission_id = submission_id
+        db.add(wf)
         db.commit()
-        # 审计：更新优秀作品条目
+        db.refresh(wf)
+        invalidate_excellent_works()
+
+        # 审计：上传优秀作品文件
         try:
             actor_type, actor_id, _account = resolve_actor(db, _)
             write_audit_log(
                 db,
                 actor_type=actor_type,
                 actor_id=actor_id,
-                action="excellent_work.upsert",
-                object_type="excellent_work",
-                object_id=work.id,
+                action="excellent_work.file_upload",
+                object_type="excellent_work_file",
+                object_id=wf.id,
                 details={
-                    "op": "update",
-                    "season_id": season_id,
-                    "team_id": team_id,
-                    "submission_id": submission_id,
-                    "summary": work.summary,
-                    "score": work.score,
-                    "allow_download": bool(work.allow_download),
+                    "work_id": work.id,
+                    "filename": filename,
+                    "size": size,
+                    "hash": wf.hash,
+                    "path": wf.path,
                 },
             )
         except Exception:
             pass
-
-    # 准备目录：uploads/excellent/season_{season_id}/work_{work.id}/
-    dir_rel = os.path.join(settings.excellent_dir, f"season_{season_id}", f"work_{work.id}")
-    try:
-        os.makedirs(dir_rel, exist_ok=True)
-    except Exception:
-        pass
-
-    target_rel = os.path.join(dir_rel, filename)
-
-    # 保存文件并计算哈希与大小
-    hasher = hashlib.sha256()
-    size = 0
-    with open(target_rel, "wb") as out:
-        while True:
-            chunk = file.file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
-            hasher.update(chunk)
-            size += len(chunk)
-    file.file.close()
-
-    # 记录文件元数据
-    wf = ExcellentWorkFile(
-        work_id=work.id,
-        filename=filename,
-        size=size,
-        hash=hasher.hexdigest(),
-        path=target_rel,
-    )
-    db.add(wf)
-    db.commit()
-    db.refresh(wf)
-
-    # 审计：上传优秀作品文件
-    try:
-        actor_type, actor_id, _account = resolve_actor(db, _)
-        write_audit_log(
-            db,
-            actor_type=actor_type,
-            actor_id=actor_id,
-            action="excellent_work.file_upload",
-            object_type="excellent_work_file",
-            object_id=wf.id,
-            details={
-                "work_id": work.id,
-                "filename": filename,
-                "size": size,
-                "hash": wf.hash,
-                "path": wf.path,
-            },
-        )
-    except Exception:
-        pass
+    finally:
+        form.cleanup()
 
     return {
         "code": 0,
@@ -1011,6 +1061,102 @@ def export_current_scores(
         pass
     return StreamingResponse(buf, media_type="text/csv", headers=headers)
 
+
+# ------------------------
+# 管理员：按赛季打包下载各队伍最新提交（流式 ZIP）
+# ------------------------
+
+@router.get("/competitions/{season_id}/submissions/archive")
+def download_submissions_archive(
+    season_id: int,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_admin),
+):
+    """
+    打包下载赛季内每支队伍最新版本的论文与支撑材料：
+    目录结构为 <队伍编码>/<文件名>，根目录附 manifest.csv（队伍编码、版本、文件哈希等，写在压缩包末尾）。
+    压缩包边读边发，不生成临时文件。
+    """
+    season = db.query(Season).filter(Season.id == season_id).first()
+    if not season:
+        raise HTTPException(status_code=404, detail={
+            "code": 1005,
+            "message": "指定的竞赛不存在",
+        })
+
+    # 每队最新版本的提交及其文件明细（一次查询）
+    latest = (
+        db.query(Submission.team_id, func.max(Submission.version).label("version"))
+        .join(Team, Team.id == Submission.team_id)
+        .filter(Team.season_id == season_id)
+        .group_by(Submission.team_id)
+        .subquery()
+    )
+    rows = (
+        db.query(Team, Submission, SubmissionFile)
+        .join(latest, latest.c.team_id == Team.id)
+        .join(Submission, (Submission.team_id == latest.c.team_id) & (Submission.version == latest.c.version))
+        .join(SubmissionFile, SubmissionFile.submission_id == Submission.id)
+        .order_by(Team.team_code.asc(), SubmissionFile.id.asc())
+        .all()
+    )
+
+    # 条目在返回响应前确定，流式输出过程中不再访问数据库；
+    # 文件是否存在在打包时才知道，清单作为最后一个条目写出，缺失的文件标记为 missing
+    entries: list[ZipEntry] = []
+    listed: list[tuple] = []
+    total_size = 0
+    for team, sub, f in rows:
+        name = f"{team.team_code}/{restore_extension(f.filename)}"
+        listed.append((
+            team.team_code,
+            team.name or "",
+            sub.version,
+            f.type,
+            name,
+            f.size,
+            f.hash,
+            f.uploaded_at.isoformat() if f.uploaded_at else "",
+        ))
+        entries.append(ZipEntry(name, key=f.path or None, mtime=f.uploaded_at))
+        total_size += f.size or 0
+
+    def manifest_entry(missing: set[str]) -> ZipEntry:
+        manifest = io.StringIO()
+        manifest.write("\ufeff")
+        writer = csv.writer(manifest)
+        writer.writerow(["队伍编码", "队伍名称", "版本", "类型", "文件", "大小", "SHA256", "上传时间", "状态"])
+        for row in listed:
+            writer.writerow([*row, "missing" if row[4] in missing else "ok"])
+        return ZipEntry("manifest.csv", data=manifest.getvalue().encode("utf-8"))
+
+    # 审计：打包下载赛季作品
+    try:
+        actor_type, actor_id, _account = resolve_actor(db, _)
+        write_audit_log(
+            db,
+            actor_type=actor_type,
+            actor_id=actor_id,
+            action="submissions.archive",
+            object_type="season",
+            object_id=season_id,
+            details={
+                "team_count": len({team.id for team, _s, _f in rows}),
+                "file_count": len(entries),
+                "total_size": total_size,
+            },
+        )
+    except Exception:
+        pass
+
+    fname = f"season-{season_id}-submissions.zip"
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(fname)}",
+        "Cache-Control": "no-store",
+    }
+    return StreamingResponse(stream_zip(entries, manifest_entry), media_type="application/zip", headers=headers)
+
+
 # ------------------------
 # 管理员：统计还未完成评分的教师（按赛季）
 # ------------------------
@@ -1085,36 +1231,35 @@ class ListTeamsQuery(BaseModel):
 
 @router.get("/teams")
 def list_teams(
+    request: Request,
     season_id: int | None = None,
     status: str | None = None,
     locked: bool | None = None,
     db: Session = Depends(get_db),
     _: dict = Depends(require_admin),
 ):
-    q = db.query(Team)
-    if season_id is not None:
-        q = q.filter(Team.season_id == season_id)
-    if status:
-        q = q.filter(Team.status == status)
-    if locked is not None:
-        q = q.filter(Team.locked == locked)
-    teams = q.order_by(Team.created_at.desc()).all()
+    etag = version_etag(db, request, ("teams", "team_members"))
 
-    def team_info(t: Team):
-        member_count = db.query(TeamMember).filter(TeamMember.team_id == t.id).count()
-        return {
-            "id": t.id,
-            "season_id": t.season_id,
-            "team_code": t.team_code,
-            "name": t.name,
-            "captain_id": t.captain_id,
-            "status": t.status,
-            "locked": t.locked,
-            "member_count": member_count,
-            "created_at": t.created_at,
-        }
+    def build():
+        # 成员数用相关子查询随队伍一起取回（走 team_members.team_id 索引），只取需要的列
+        member_count = (
+            select(func.count(TeamMember.id)).where(TeamMember.team_id == Team.id).correlate(Team).scalar_subquery()
+        )
+        q = select(
+            Team.id, Team.season_id, Team.team_code, Team.name, Team.captain_id,
+            Team.status, Team.locked, member_count, Team.created_at,
+        )
+        if season_id is not None:
+            q = q.where(Team.season_id == season_id)
+        if status:
+            q = q.where(Team.status == status)
+        if locked is not None:
+            q = q.where(Team.locked == locked)
+        rows = db.execute(q.order_by(Team.created_at.desc()))
+        keys = ("id", "season_id", "team_code", "name", "captain_id", "status", "locked", "member_count", "created_at")
+        return {"code": 0, "message": "ok", "data": [dict(zip(keys, row)) for row in rows]}
 
-    return {"code": 0, "message": "ok", "data": [team_info(t) for t in teams]}
+    return versioned_json_response(request, etag, build)
 
 
 @router.post("/teams/{team_id}/lock")
@@ -1128,6 +1273,7 @@ def lock_team(team_id: int, db: Session = Depends(get_db), _: dict = Depends(req
     db.add(team)
     db.commit()
     db.refresh(team)
+    invalidate_team_view(team.id)
     # 审计：锁定队伍
     try:
         actor_type, actor_id, _account = resolve_actor(db, _)
@@ -1156,6 +1302,7 @@ def unlock_team(team_id: int, db: Session = Depends(get_db), _: dict = Depends(r
     db.add(team)
     db.commit()
     db.refresh(team)
+    invalidate_team_view(team.id)
     # 审计：解锁队伍
     try:
         actor_type, actor_id, _account = resolve_actor(db, _)
@@ -1179,13 +1326,12 @@ def delete_team(team_id: int, db: Session = Depends(get_db), _: dict = Depends(r
     if not team:
         raise HTTPException(status_code=404, detail={"code": 1006, "message": "队伍不存在"})
 
-    db.query(TeamMember).filter(TeamMember.team_id == team_id).delete(synchronize_session=False)
-    db.query(TeamJoinToken).filter(TeamJoinToken.team_id == team_id).delete(synchronize_session=False)
-    db.query(TeamJoinRequest).filter(TeamJoinRequest.team_id == team_id).delete(synchronize_session=False)
-    db.query(Submission).filter(Submission.team_id == team_id).delete(synchronize_session=False)
-
-    db.delete(team)
+    # 级联删除成员、令牌、提交、文件记录与评审（集合语句，单事务）；文件由回收任务在宽限期后清理
+    team_info = {"name": team.name, "team_code": team.team_code, "season_id": team.season_id}
+    delete_team_cascade(db, team_id)
     db.commit()
+    invalidate_team_view(team_id)
+    reclaimer.trigger()
     # 审计：删除队伍
     try:
         actor_type, actor_id, _account = resolve_actor(db, _)
@@ -1196,11 +1342,7 @@ def delete_team(team_id: int, db: Session = Depends(get_db), _: dict = Depends(r
             action="team.delete",
             object_type="team",
             object_id=team_id,
-            details={
-                "name": team.name,
-                "team_code": team.team_code,
-                "season_id": team.season_id,
-            },
+            details=team_info,
         )
     except Exception:
         pass
@@ -1233,6 +1375,7 @@ def transfer_captain(team_id: int, body: TransferCaptainBody, db: Session = Depe
     db.add(team)
     db.commit()
     db.refresh(team)
+    invalidate_team_view(team.id)
 
     # 审计：转移队长
     try:
@@ -1271,6 +1414,7 @@ def remove_member(team_id: int, body: RemoveMemberBody, db: Session = Depends(ge
 
     db.delete(member)
     db.commit()
+    invalidate_team_view(team_id)
     # 审计：移除队员
     try:
         actor_type, actor_id, _account = resolve_actor(db, _)
@@ -1293,6 +1437,7 @@ def remove_member(team_id: int, body: RemoveMemberBody, db: Session = Depends(ge
 
 @router.get("/audit/logs")
 def list_audit_logs(
+    request: Request,
     actor_type: str | None = None,
     actor_id: int | None = None,
     action: str | None = None,
@@ -1305,52 +1450,58 @@ def list_audit_logs(
     db: Session = Depends(get_db),
     _: dict = Depends(require_admin),
 ):
-    q = db.query(AuditLog)
-    if actor_type:
-        q = q.filter(AuditLog.actor_type == actor_type)
-    if actor_id is not None:
-        q = q.filter(AuditLog.actor_id == actor_id)
-    if action:
-        q = q.filter(AuditLog.action == action)
-    if object_type:
-        q = q.filter(AuditLog.object_type == object_type)
-    if object_id is not None:
-        q = q.filter(AuditLog.object_id == object_id)
-    if start_time is not None:
-        q = q.filter(AuditLog.created_at >= start_time)
-    if end_time is not None:
-        q = q.filter(AuditLog.created_at <= end_time)
-
-    total = q.count()
-    q = q.order_by(AuditLog.created_at.desc())
-    items = q.offset(max(0, (page - 1) * page_size)).limit(page_size).all()
+    # 审计日志只追加：没有新日志时直接返回 304，不做计数与分页查询
+    etag = version_etag(db, request, ("audit_logs",))
+
+    def build():
+        q = db.query(AuditLog)
+        if actor_type:
+            q = q.filter(AuditLog.actor_type == actor_type)
+        if actor_id is not None:
+            q = q.filter(AuditLog.actor_id == actor_id)
+        if action:
+            q = q.filter(AuditLog.action == action)
+        if object_type:
+            q = q.filter(AuditLog.object_type == object_type)
+        if object_id is not None:
+            q = q.filter(AuditLog.object_id == object_id)
+        if start_time is not None:
+            q = q.filter(AuditLog.created_at >= start_time)
+        if end_time is not None:
+            q = q.filter(AuditLog.created_at <= end_time)
+
+        total = q.count()
+        q = q.order_by(AuditLog.created_at.desc())
+        items = q.offset(max(0, (page - 1) * page_size)).limit(page_size).all()
+
+        def to_dict(row: AuditLog):
+            try:
+                details = json.loads(row.details or "{}")
+            except Exception:
+                details = {}
+            return {
+                "id": row.id,
+                "actor_type": row.actor_type,
+                "actor_id": row.actor_id,
+                "action": row.action,
+                "object_type": row.object_type,
+                "object_id": row.object_id,
+                "details": details,
+                "created_at": row.created_at,
+            }
 
-    def to_dict(row: AuditLog):
-        try:
-            details = json.loads(row.details or "{}")
-        except Exception:
-            details = {}
         return {
-            "id": row.id,
-            "actor_type": row.actor_type,
-            "actor_id": row.actor_id,
-            "action": row.action,
-            "object_type": row.object_type,
-            "object_id": row.object_id,
-            "details": details,
-            "created_at": row.created_at.isoformat() if getattr(row, "created_at", None) else None,
+            "code": 0,
+            "message": "ok",
+            "data": {
+                "page": page,
+                "page_size": page_size,
+                "total": total,
+                "items": [to_dict(x) for x in items],
+            },
         }
 
-    return {
-        "code": 0,
-        "message": "ok",
-        "data": {
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "items": [to_dict(x) for x in items],
-        },
-    }
+    return versioned_json_response(request, etag, build)
 
 
 @router.get("/audit/logs/export")
@@ -1403,4 +1554,208 @@ def export_audit_logs(
         "Content-Disposition": "attachment; filename=audit-logs.csv",
         "Cache-Control": "no-store",
     }
-    return StreamingResponse(buf, media_type="text/csv", headers=headers)
\ No newline at end of file
+    return StreamingResponse(buf, media_type="text/csv", headers=headers)
+
+
+# ------------------------
+# 存储回收：预览（dry-run）与手动触发
+# ------------------------
+
+@router.get("/storage/gc/report")
+def storage_gc_report(db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    """只统计不删除：列出当前可回收的孤立记录、无引用 blob 与残留临时文件，并返回上一轮实际回收的结果。"""
+    report = reclaimer.run_once(dry_run=True)
+    return {"code": 0, "message": "ok", "data": {"preview": report, "lastRun": reclaimer.last_report}}
+
+
+@router.post("/storage/gc/run")
+def storage_gc_run(db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    """唤醒后台回收任务立即执行一轮（异步，不阻塞请求）。"""
+    reclaimer.trigger()
+    try:
+        actor_type, actor_id, _account = resolve_actor(db, _)
+        write_audit_log(
+            db,
+            actor_type=actor_type,
+            actor_id=actor_id,
+            action="storage.gc_run",
+            object_type="storage",
+            object_id=None,
+            details={"dry_run": settings.gc_dry_run},
+        )
+    except Exception:
+        pass
+    return {"code": 0, "message": "ok", "data": {"triggered": True, "enabled": settings.gc_enabled}}
+
+
+# ------------------------
+# 存储校验：重新计算已存文件的哈希，报告缺失或损坏的文件
+# ------------------------
+
+class StartScrubBody(BaseModel):
+    season_id: int | None = Field(default=None, description="只校验该赛季的文件；为空时校验全部文件")
+
+
+def _get_scrub_run(db: Session, run_id: int) -> ScrubRun:
+    run = db.query(ScrubRun).filter(ScrubRun.id == run_id).first()
+    if not run:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "校验任务不存在"})
+    return run
+
+
+def _audit_scrub(db: Session, auth: dict, action: str, run: ScrubRun) -> None:
+    try:
+        actor_type, actor_id, _account = resolve_actor(db, auth)
+        write_audit_log(
+            db,
+            actor_type=actor_type,
+            actor_id=actor_id,
+            action=action,
+            object_type="scrub_run",
+            object_id=run.id,
+            details={"season_id": run.season_id},
+        )
+    except Exception:
+        pass
+
+
+@router.post("/storage/scrub/runs")
+def start_scrub(body: StartScrubBody, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    """新建校验任务并在本进程后台执行；同一时间只允许一个任务运行。"""
+    if body.season_id is not None and not db.query(Season.id).filter(Season.id == body.season_id).first():
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "指定的竞赛不存在"})
+    if (scrubber.running and not scrubber.stopping) or db.query(ScrubRun.id).filter(ScrubRun.status == "running").first():
+        raise HTTPException(status_code=409, detail={"code": 1006, "message": "已有校验任务在运行"})
+    run = ScrubRun(season_id=body.season_id, status="paused", phase="problem", last_id=0)
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    if not scrubber.launch(db, run.id):
+        db.delete(run)
+        db.commit()
+        raise HTTPException(status_code=409, detail={"code": 1006, "message": "已有校验任务在运行"})
+    db.refresh(run)
+    _audit_scrub(db, _, "storage.scrub_start", run)
+    return {"code": 0, "message": "ok", "data": serialize_run(run)}
+
+
+@router.get("/storage/scrub/runs")
+def list_scrub_runs(page: int = 1, page_size: int = 20, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    if page < 1:
+        page = 1
+    page_size = max(1, min(page_size, 100))
+    q = db.query(ScrubRun).order_by(ScrubRun.id.desc())
+    total = q.count()
+    runs = q.offset((page - 1) * page_size).limit(page_size).all()
+    return {
+        "code": 0,
+        "message": "ok",
+        "data": {"page": page, "pageSize": page_size, "total": total, "rows": [serialize_run(r) for r in runs]},
+    }
+
+
+@router.get("/storage/scrub/runs/{run_id}")
+def get_scrub_run(run_id: int, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    run = _get_scrub_run(db, run_id)
+    return {"code": 0, "message": "ok", "data": serialize_run(run)}
+
+
+@router.get("/storage/scrub/runs/{run_id}/findings")
+def list_scrub_findings(
+    run_id: int,
+    status: str | None = None,
+    page: int = 1,
+    page_size: int = 50,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_admin),
+):
+    """列出校验发现的问题文件；status 可选 missing/corrupted/error。"""
+    _get_scrub_run(db, run_id)
+    if page < 1:
+        page = 1
+    page_size = max(1, min(page_size, 200))
+    q = db.query(ScrubFinding).filter(ScrubFinding.run_id == run_id)
+    if status:
+        q = q.filter(ScrubFinding.status == status)
+    total = q.count()
+    rows = q.order_by(ScrubFinding.id.asc()).offset((page - 1) * page_size).limit(page_size).all()
+    return {
+        "code": 0,
+        "message": "ok",
+        "data": {
+            "page": page,
+            "pageSize": page_size,
+            "total": total,
+            "rows": [
+                {
+                    "id": f.id,
+                    "kind": f.kind,
+                    "fileId": f.file_id,
+                    "path": f.path,
+                    "status": f.status,
+                    "expectedHash": f.expected_hash,
+                    "actualHash": f.actual_hash,
+                    "expectedSize": f.expected_size,
+                    "actualSize": f.actual_size,
+                    "detail": f.detail,
+                    "createdAt": f.created_at.isoformat() if f.created_at else None,
+                }
+                for f in rows
+            ],
+        },
+    }
+
+
+@router.post("/storage/scrub/runs/{run_id}/pause")
+def pause_scrub(run_id: int, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    """暂停任务：执行中的进程在当前批次结束时发现状态变化并退出，检查点保留。"""
+    run = _get_scrub_run(db, run_id)
+    if run.status != "running":
+        raise HTTPException(status_code=409, detail={"code": 1006, "message": "任务未在运行"})
+    run.status = "paused"
+    run.worker = None
+    db.commit()
+    if scrubber.current_run_id == run_id:
+        scrubber.stop()
+    _audit_scrub(db, _, "storage.scrub_pause", run)
+    return {"code": 0, "message": "ok", "data": serialize_run(run)}
+
+
+@router.post("/storage/scrub/runs/{run_id}/resume")
+def resume_scrub(run_id: int, db: Session = Depends(get_db), _: dict = Depends(require_admin)):
+    """从检查点继续已暂停、失败或中断（租约已过期）的任务。"""
+    run = _get_scrub_run(db, run_id)
+    if run.status == "finished":
+        raise HTTPException(status_code=409, detail={"code": 1006, "message": "任务已完成"})
+    if run.status == "failed":
+        run.status = "paused"
+        run.worker = None
+        db.commit()
+    if not scrubber.launch(db, run_id):
+        raise HTTPException(status_code=409, detail={"code": 1006, "message": "任务正在其他进程中执行，或本进程有任务尚未停止"})
+    db.refresh(run)
+    _audit_scrub(db, _, "storage.scrub_resume", run)
+    return {"code": 0, "message": "ok", "data": serialize_run(run)}
+
+
+# ------------------------
+# 准入控制：各通道的并发、排队与拒绝统计（当前进程）
+# ------------------------
+
+@router.get("/system/admission")
+async def admission_stats(_: dict = Depends(require_admin)):
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "code": 0,
+        "message": "ok",
+        "data": {
+            "lanes": [lane.stats() for lane in LANES.values()],
+            "threadpool": {"total": limiter.total_tokens, "busy": limiter.borrowed_tokens},
+            "dbPool": {"size": engine.pool.size(), "checkedOut": engine.pool.checkedout(), "overflow": engine.pool.overflow()},
+        },
+    }
+
+
+@router.get("/system/cache")
+def cache_stats(_: dict = Depends(require_admin)):
+    return {"code": 0, "message": "ok", "data": get_cache().stats()}
@@ -0,0 +1,115 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, RedirectResponse
+from sqlalchemy.orm import Session
+from urllib.parse import urlencode
+import os
+
+from ..db import get_db
+from ..models import SubmissionFile, ExcellentWork, ExcellentWorkFile
+from ..security import sign_file, verify_file_signature
+from ..cache import get_cache
+from ..storage_backend import get_storage
+from ..uploads import restore_extension
+from ..config import settings
+
+
+router = APIRouter(prefix="/api/files", tags=["files"])
+
+
+# 各类文件允许的签名角色与响应方式
+FILE_KINDS = {
+    # 提交的论文：教师评审预览（浏览器内联显示，PDF 阅读器按 Range 分段读取）
+    "submission": {"roles": ("teacher",), "disposition": "inline"},
+    # 历年优秀作品：公开下载
+    "excellent": {"roles": ("public",), "disposition": "attachment"},
+}
+
+MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".zip": "application/zip",
+}
+
+
+def _load_meta(db: Session, kind: str, file_id: int) -> dict | None:
+    if kind == "submission":
+        f = db.query(SubmissionFile).filter(SubmissionFile.id == file_id).first()
+        if not f or f.type != "thesis":
+            return None
+        return {"path": f.path, "filename": restore_extension(f.filename), "media_type": "application/pdf"}
+    if kind == "excellent":
+        row = (
+            db.query(ExcellentWorkFile, ExcellentWork)
+            .join(ExcellentWork, ExcellentWork.id == ExcellentWorkFile.work_id)
+            .filter(ExcellentWorkFile.id == file_id)
+            .first()
+        )
+        if not row or not row[1].allow_download:
+            return None
+        f = row[0]
+        ext = os.path.splitext(f.filename.lower())[1]
+        return {"path": f.path, "filename": f.filename, "media_type": MEDIA_TYPES.get(ext, "application/octet-stream")}
+    return None
+
+
+def file_meta(db: Session, kind: str, file_id: int) -> dict | None:
+    # 签名链接的每次请求（含 Range 分段）只查一次缓存；优秀作品的下载开关随作品上传失效
+    return get_cache().get_or_load(
+        f"file_meta:{kind}:{file_id}",
+        lambda: _load_meta(db, kind, file_id),
+        ttl=settings.file_meta_cache_ttl_seconds,
+        tags=("excellent_works",) if kind == "excellent" else (),
+    )
+
+
+def invalidate_file_meta(kind: str, file_id: int) -> None:
+    get_cache().delete(f"file_meta:{kind}:{file_id}")
+
+
+def file_response(key: str, filename: str, media_type: str, disposition: str, headers: dict | None = None):
+    """输出存储中的文件：本地存储用 FileResponse（支持 Range），对象存储跳转到预签名地址，文件不经过 Python。"""
+    storage = get_storage()
+    local = storage.local_path(key)
+    if local is None:
+        url = storage.presign(key, filename, media_type, disposition, settings.signed_url_ttl_seconds)
+        return RedirectResponse(url, status_code=302, headers={"Cache-Control": "no-store"})
+    if not os.path.exists(local):
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在或已删除"})
+    # FileResponse 支持 Range/If-Range，并按 RFC 5987 编码非 ASCII 文件名
+    return FileResponse(
+        local,
+        media_type=media_type,
+        filename=filename,
+        content_disposition_type=disposition,
+        headers=headers,
+    )
+
+
+def signed_file_url(kind: str, file_id: int, role: str, ttl_seconds: int | None = None) -> dict:
+    """生成签名下载链接，返回 {url, expiresAt}。"""
+    expires, sig = sign_file(kind, file_id, role, ttl_seconds)
+    query = urlencode({"role": role, "exp": expires, "sig": sig})
+    return {"url": f"/api/files/{kind}/{file_id}?{query}", "expiresAt": expires}
+
+
+@router.get("/{kind}/{file_id}")
+def serve_signed_file(
+    kind: str,
+    file_id: int,
+    role: str,
+    exp: int,
+    sig: str,
+    db: Session = Depends(get_db),
+):
+    spec = FILE_KINDS.get(kind)
+    if not spec or role not in spec["roles"]:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在"})
+    verify_file_signature(kind, file_id, role, exp, sig)
+
+    meta = file_meta(db, kind, file_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在"})
+    try:
+        return file_response(meta["path"], meta["filename"], meta["media_type"], spec["disposition"], {"Cache-Control": "private, no-store"})
+    except HTTPException:
+        invalidate_file_meta(kind, file_id)
+        raise
@@ -1,70 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import case
-from datetime import datetime
-import os
 
 from ..db import get_db
-from ..models import Season, ExcellentWork, ExcellentWorkFile, Announcement
+from ..models import ExcellentWork, ExcellentWorkFile
+from ..announcements import announcement_page
+from ..excellent_works import works_page
+from ..seasons import open_seasons
+from ..search import parse_terms, search_announcements, search_excellent_works
+from ..http_cache import cached_json_response
+from .files import signed_file_url
+from ..storage_backend import get_storage
 
 router = APIRouter(prefix="/api/public", tags=["public"])
 
 
 @router.get("/excellent-works")
-def list_excellent_works(season_id: int | None = None, limit: int | None = None, db: Session = Depends(get_db)):
-    q = db.query(ExcellentWork)
-    if season_id:
-        q = q.filter(ExcellentWork.season_id == season_id)
-    q = q.order_by(ExcellentWork.created_at.desc())
-    if limit and limit > 0:
-        q = q.limit(limit)
-    works = q.all()
-
-    # 批量查询文件列表
-    file_map: dict[int, list[ExcellentWorkFile]] = {}
-    if works:
-        work_ids = [w.id for w in works]
-        files = db.query(ExcellentWorkFile).filter(ExcellentWorkFile.work_id.in_(work_ids)).all()
-        for f in files:
-            file_map.setdefault(f.work_id, []).append(f)
-
-    def to_file_dto(w: ExcellentWork):
-        items = []
-        for f in file_map.get(w.id, []):
-            # 仅当 allow_download 为真时提供下载链接
-            download_path = None
-            if w.allow_download:
-                download_path = f"/api/public/excellent-works/{w.id}/files/{f.id}/download"
-            items.append({
-                "id": f.id,
-                "filename": f.filename,
-                "size": f.size,
-                "hash": f.hash,
-                "downloadUrl": download_path,
-            })
-        return items
-
-    return {
-        "code": 0,
-        "message": "ok",
-        "data": [
-            {
-                "id": w.id,
-                "season_id": w.season_id,
-                "summary": w.summary,
-                "score": w.score,
-                "allow_download": w.allow_download,
-                "created_at": (w.created_at.isoformat() if w.created_at else None),
-                "files": to_file_dto(w),
-            }
-            for w in works
-        ],
-    }
-
-
-@router.get("/excellent-works/{work_id}/files/{file_id}/download")
-def download_excellent_file(work_id: int, file_id: int, db: Session = Depends(get_db)):
+def list_excellent_works(
+    request: Request,
+    season_id: int | None = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    min_score: float | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    # 游标分页：响应的 nextCursor 非空时，带上它请求下一页；结果按参数缓存，支持 ETag/304
+    body, etag = works_page(db, season_id, sort, order, min_score, cursor, limit)
+    return cached_json_response(request, body, etag)
+
+
+def _excellent_file_url(db: Session, work_id: int, file_id: int) -> dict:
     work = db.query(ExcellentWork).filter(ExcellentWork.id == work_id).first()
     if not work:
         raise HTTPException(status_code=404, detail={"code": 1005, "message": "优秀作品不存在"})
@@ -73,27 +40,26 @@ def download_excellent_file(work_id: int, file_id: int, db: Session = Depends(ge
     file = db.query(ExcellentWorkFile).filter(ExcellentWorkFile.id == file_id, ExcellentWorkFile.work_id == work_id).first()
     if not file:
         raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在"})
-    if not os.path.exists(file.path):
+    if get_storage().stat(file.path) is None:
         raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在或已删除"})
+    return signed_file_url("excellent", file.id, "public")
 
-    headers = {
-        "Content-Disposition": f"attachment; filename={file.filename}",
-        "Cache-Control": "no-store",
-    }
-    return StreamingResponse(open(file.path, "rb"), media_type="application/octet-stream", headers=headers)
+
+@router.get("/excellent-works/{work_id}/files/{file_id}/signed-url")
+def get_excellent_file_url(work_id: int, file_id: int, db: Session = Depends(get_db)):
+    return {"code": 0, "message": "ok", "data": _excellent_file_url(db, work_id, file_id)}
+
+
+@router.get("/excellent-works/{work_id}/files/{file_id}/download")
+def download_excellent_file(work_id: int, file_id: int, db: Session = Depends(get_db)):
+    # 兼容旧链接：跳转到签名下载链接，文件由 /api/files 提供（支持 Range 断点续传）
+    return RedirectResponse(_excellent_file_url(db, work_id, file_id)["url"], status_code=307)
 
 
 @router.get("/open-competitions")
 def list_open_competitions(db: Session = Depends(get_db)):
-    now = datetime.now()
-    seasons = (
-        db.query(Season)
-        .filter(
-            (Season.signup_start <= now) & (Season.signup_end >= now) | (Season.allow_signup == True)
-        )
-        .order_by(Season.signup_start.asc())
-        .all()
-    )
+    # 开放判断在缓存的赛季快照上完成，快照在下一个报名/比赛时间边界失效
+    seasons = open_seasons(db)
     return {
         "code": 0,
         "message": "ok",
@@ -113,43 +79,27 @@ def list_open_competitions(db: Session = Depends(get_db)):
 
 
 @router.get("/announcements")
-def list_announcements(page: int = 1, page_size: int = 3, db: Session = Depends(get_db)):
+def list_announcements(request: Request, page: int = 1, page_size: int = 3, db: Session = Depends(get_db)):
     # 保护页码与页大小
     if page < 1:
         page = 1
     page_size = max(1, min(page_size, 50))
 
-    # 置顶优先，其次按发布时间倒序；若无发布时间则按创建时间倒序
-    q = db.query(Announcement)
-    q = q.order_by(
-        Announcement.pinned.desc(),
-        case((Announcement.published_at == None, 1), else_=0).asc(),
-        Announcement.published_at.desc(),
-        Announcement.created_at.desc(),
-    )
-    total = q.count()
-    items = (
-        q.offset((page - 1) * page_size)
-         .limit(page_size)
-         .all()
-    )
-
-    return {
-        "code": 0,
-        "message": "ok",
-        "data": {
-            "page": page,
-            "pageSize": page_size,
-            "total": total,
-            "rows": [
-                {
-                    "id": a.id,
-                    "title": a.title,
-                    "content": a.content,
-                    "publishedAt": a.published_at.isoformat() if a.published_at else None,
-                    "pinned": a.pinned,
-                }
-                for a in items
-            ],
-        },
-    }
\ No newline at end of file
+    # 渲染结果按分页缓存，公告写入后失效；客户端带 If-None-Match 且未变化时返回 304
+    body, etag = announcement_page(db, page, page_size)
+    return cached_json_response(request, body, etag)
+
+
+@router.get("/search")
+def search(q: str, type: str = "all", season_id: int | None = None, limit: int = 10, db: Session = Depends(get_db)):
+    # 全文检索公告与优秀作品摘要：多个关键词用空格分隔，需全部命中；结果按相关度排序并带高亮片段
+    if type not in ("all", "announcements", "works"):
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": "参数校验失败：type 仅支持 all/announcements/works"})
+    terms = parse_terms(q)
+    limit = max(1, min(limit, 50))
+    data = {"terms": terms}
+    if type in ("all", "announcements"):
+        data["announcements"] = search_announcements(db, terms, limit)
+    if type in ("all", "works"):
+        data["works"] = search_excellent_works(db, terms, limit, season_id)
+    return {"code": 0, "message": "ok", "data": data}
@@ -1,13 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-import secrets
-import os
 import hashlib
+import math
+import os
+import secrets
+import shutil
 
 from ..db import get_db
-from ..models import Student, Season, Enrollment, Team, TeamMember, TeamJoinToken, TeamJoinRequest, Submission, SubmissionFile
+from ..models import Student, Enrollment, Team, TeamMember, TeamJoinToken, TeamJoinRequest, Submission, SubmissionFile, Blob, UploadSession, UploadChunk
 from ..security import bearer_scheme, _decode_jwt
+from ..storage import put_file, hash_path
+from ..uploads import (
+    FileRule, SNIFF_BYTES, iter_body, merge_ranges, missing_ranges, parse_multipart, multipart_openapi,
+    quota_exceeded, submit_io,
+)
+from ..idempotency import Idempotency, body_fingerprint
+from ..seasons import SeasonInfo, get_season, signup_open, submit_open
+from ..problem_cache import problem_meta, problem_cache, memory_response
+from ..http_cache import cached_json_response, etag_matches
+from ..submissions import history_page, invalidate_submission_history
+from ..team_view import invalidate_team_view, load_team_view, team_view
+from .files import file_response
 from ..config import settings
 
 
@@ -38,12 +56,6 @@ def _get_student(payload: dict, db: Session) -> Student:
     return student
 
 
-def _signup_open(season: Season) -> bool:
-    now = datetime.now()
-    window_ok = (season.signup_start and season.signup_end and season.signup_start <= now <= season.signup_end)
-    return bool(window_ok or season.allow_signup)
-
-
 def _find_my_team(db: Session, season_id: int, student_id: int):
     # 查询学生在该赛季是否已有队伍
     return (
@@ -54,100 +66,59 @@ def _find_my_team(db: Session, season_id: int, student_id: int):
     )
 
 
-def _team_response(db: Session, team: Team, include_token: bool = False):
-    # 汇总队伍成员
-    members = (
-        db.query(TeamMember, Student)
-        .join(Student, Student.id == TeamMember.student_id)
-        .filter(TeamMember.team_id == team.id)
-        .all()
-    )
-    member_list = [{
-        "id": s.id,
-        "student_id": s.student_id,
-        "name": s.name,
-        "role": m.role,
-    } for m, s in members]
-
-    # 汇总加入请求记录（作为审计/历史）
-    reqs = db.query(TeamJoinRequest).filter(TeamJoinRequest.team_id == team.id).order_by(TeamJoinRequest.created_at.desc()).all()
-    join_requests = [{
-        "id": r.id,
-        "student_id": r.student_id,
-        "status": r.status,
-        "created_at": r.created_at,
-    } for r in reqs]
-
-    data = {
-        "id": team.id,
-        "season_id": team.season_id,
-        "team_code": team.team_code,
-        "name": team.name,
-        "captain_id": team.captain_id,
-        "status": team.status,
-        "locked": team.locked,
-        "members": member_list,
-        "join_requests": join_requests,
-    }
-
-    if include_token:
-        token_row = (
-            db.query(TeamJoinToken)
-            .filter(TeamJoinToken.team_id == team.id, TeamJoinToken.active == True)
-            .order_by(TeamJoinToken.created_at.desc())
-            .first()
-        )
-        if token_row:
-            data["join_token"] = {"token": token_row.token, "expires_at": token_row.expires_at}
-    return data
-
-
 @router.post("/competitions/{season_id}/teams")
 def create_team_for_season(
     season_id: int,
+    request: Request,
     body: dict = Body(...),
     db: Session = Depends(get_db),
     payload: dict = Depends(require_student),
 ):
-    season = db.query(Season).filter(Season.id == season_id).first()
-    if not season:
-        raise HTTPException(status_code=404, detail={"code": 1005, "message": "指定的竞赛不存在"})
-    if not _signup_open(season):
-        raise HTTPException(status_code=400, detail={"code": 1001, "message": "当前不在报名开放状态"})
-
     student = _get_student(payload, db)
-    # 已有队伍则返回队伍信息
-    existing = _find_my_team(db, season_id, student.id)
-    if existing:
-        return {"code": 0, "message": "ok", "data": _team_response(db, existing, include_token=True)}
-
-    name = (body or {}).get("name")
-    if not name:
-        raise HTTPException(status_code=400, detail={"code": 2002, "message": "缺少队伍名称"})
-
-    # 生成队伍编码
-    rand = secrets.token_hex(3)  # 6 hex chars
-    team_code = f"S{season_id}-{rand}"
-    team = Team(season_id=season_id, name=name, captain_id=student.id, team_code=team_code, status="approved")
-    db.add(team)
-    db.flush()  # 获取 team.id
-
-    # 添加队长成员关系
-    db.add(TeamMember(team_id=team.id, student_id=student.id, role="captain"))
-
-    # 自动报名（按学生维度记录）
-    exists_enroll = db.query(Enrollment).filter(Enrollment.season_id == season_id, Enrollment.student_id == student.id).first()
-    if not exists_enroll:
-        db.add(Enrollment(season_id=season_id, student_id=student.id, status="approved"))
-
-    # 默认生成一个加入令牌，7天有效
-    token = secrets.token_urlsafe(16)
-    expires_at = datetime.now() + timedelta(days=7)
-    db.add(TeamJoinToken(team_id=team.id, token=token, expires_at=expires_at, active=True))
-    db.commit()
-    db.refresh(team)
-
-    return {"code": 0, "message": "ok", "data": _team_response(db, team, include_token=True)}
+    with Idempotency(db, request, f"student:{student.id}", body_fingerprint(body)) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        season = get_season(db, season_id)
+        if not season:
+            raise HTTPException(status_code=404, detail={"code": 1005, "message": "指定的竞赛不存在"})
+        if not signup_open(season):
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "当前不在报名开放状态"})
+
+        # 已有队伍则返回队伍信息
+        existing = _find_my_team(db, season_id, student.id)
+        if existing:
+            return {"code": 0, "message": "ok", "data": team_view(db, existing.id)}
+
+        name = (body or {}).get("name")
+        if not name:
+            raise HTTPException(status_code=400, detail={"code": 2002, "message": "缺少队伍名称"})
+
+        # 生成队伍编码
+        rand = secrets.token_hex(3)  # 6 hex chars
+        team_code = f"S{season_id}-{rand}"
+        team = Team(season_id=season_id, name=name, captain_id=student.id, team_code=team_code, status="approved")
+        db.add(team)
+        db.flush()  # 获取 team.id
+
+        # 添加队长成员关系
+        db.add(TeamMember(team_id=team.id, student_id=student.id, role="captain"))
+
+        # 自动报名（按学生维度记录）
+        exists_enroll = db.query(Enrollment).filter(Enrollment.season_id == season_id, Enrollment.student_id == student.id).first()
+        if not exists_enroll:
+            db.add(Enrollment(season_id=season_id, student_id=student.id, status="approved"))
+
+        # 默认生成一个加入令牌，7天有效
+        token = secrets.token_urlsafe(16)
+        expires_at = datetime.now() + timedelta(days=7)
+        db.add(TeamJoinToken(team_id=team.id, token=token, expires_at=expires_at, active=True))
+        db.flush()
+
+        resp = {"code": 0, "message": "ok", "data": load_team_view(db, team.id)}
+        idem.stage(resp)
+        db.commit()
+        invalidate_team_view(team.id)
+    return resp
 
 
 # ------------------------
@@ -169,11 +140,6 @@ def _ensure_member(db: Session, team_id: int, student_id: int) -> Team:
     return team
 
 
-def _submit_open(season: Season) -> bool:
-    now = datetime.now()
-    return bool(season.start_time and season.submit_deadline and season.start_time <= now <= season.submit_deadline)
-
-
 def _sanitize_filename(name: str) -> str:
     # 仅保留中英文、数字与下划线/短横线，其他替换为下划线
     safe = []
@@ -185,24 +151,51 @@ def _sanitize_filename(name: str) -> str:
     return "".join(safe)
 
 
-@router.post("/teams/{team_id}/submissions")
-def upload_submission(
-    team_id: int,
-    thesis: UploadFile = File(..., description="论文文件（PDF）"),
-    materials: UploadFile = File(..., description="支撑材料（RAR/ZIP/7Z）"),
-    note: str | None = Form(default=None, description="备注（可选）"),
-    db: Session = Depends(get_db),
-    payload: dict = Depends(require_student),
-):
-    # 学生与队伍校验
-    student = _get_student(payload, db)
-    team = _ensure_member(db, team_id, student.id)
+THESIS_EXTS = (".pdf",)
+MATERIALS_EXTS = (".zip", ".rar", ".7z")
+
+# 提交文件的校验规则：扩展名、文件头与单文件大小上限（直传与断点续传共用）
+SUBMISSION_RULES = {
+    "thesis": FileRule(THESIS_EXTS, settings.max_thesis_bytes, "thesis.pdf", 1002, "论文文件类型错误：仅支持 .pdf"),
+    "materials": FileRule(MATERIALS_EXTS, settings.max_materials_bytes, "materials.zip", 1003, "支撑材料类型错误：仅支持 .zip/.rar/.7z"),
+}
+
+
+def _quota_remaining(db: Session, team: Team) -> int:
+    """队伍在本赛季剩余的提交空间（字节）。
+
+    已提交文件按内容去重计量（重复提交相同文件不额外占用），
+    进行中的续传会话按声明大小预占。
+    """
+    stored = (
+        db.query(SubmissionFile.hash, SubmissionFile.size)
+        .join(Submission, Submission.id == SubmissionFile.submission_id)
+        .filter(Submission.team_id == team.id)
+        .distinct()
+        .subquery()
+    )
+    used = db.query(func.coalesce(func.sum(stored.c.size), 0)).scalar()
+    reserved = (
+        db.query(func.coalesce(func.sum(UploadSession.size), 0))
+        .filter(
+            UploadSession.team_id == team.id,
+            UploadSession.status == "uploading",
+            UploadSession.expires_at > datetime.now(),
+        )
+        .scalar()
+    )
+    return settings.team_season_quota_bytes - int(used or 0) - int(reserved or 0)
 
-    # 时间窗口校验（开赛至截止）
-    season = db.query(Season).filter(Season.id == team.season_id).first()
-    if not season or not _submit_open(season):
+
+def _submission_season(db: Session, team: Team) -> SeasonInfo:
+    # 时间窗口校验（开赛至截止），赛季取自缓存的登记表
+    season = get_season(db, team.season_id)
+    if not season or not submit_open(season):
         raise HTTPException(status_code=400, detail={"code": 1001, "message": "当前不在提交时间窗口内"})
+    return season
+
 
+def _auto_filenames(db: Session, team: Team, thesis_name_raw: str, materials_name_raw: str) -> tuple[str, str]:
     # 生成自动文件名：队伍名_成员姓名_原始文件名
     members = (
         db.query(TeamMember, Student)
@@ -213,64 +206,26 @@ def upload_submission(
     member_names = [s.name for _, s in members]
     base_name = _sanitize_filename(team.name or f"team_{team.id}")
     names_part = _sanitize_filename("_".join(member_names)) or "members"
-    # 文件名与类型校验
-    thesis_name_raw = thesis.filename or "thesis.pdf"
-    materials_name_raw = materials.filename or "materials.zip"
-    thesis_lower = thesis_name_raw.lower()
-    materials_lower = materials_name_raw.lower()
-    if not thesis_lower.endswith(".pdf"):
-        raise HTTPException(status_code=400, detail={"code": 1002, "message": "论文文件类型错误：仅支持 .pdf"})
-    if not (materials_lower.endswith(".zip") or materials_lower.endswith(".rar") or materials_lower.endswith(".7z")):
-        raise HTTPException(status_code=400, detail={"code": 1003, "message": "支撑材料类型错误：仅支持 .zip/.rar/.7z"})
-
-    thesis_original = _sanitize_filename(thesis_name_raw)
-    materials_original = _sanitize_filename(materials_name_raw)
-    auto_thesis = f"{base_name}_{names_part}_{thesis_original}"
-    auto_materials = f"{base_name}_{names_part}_{materials_original}"
-
-    # 目标路径：uploads/submissions/season_<sid>/team_<tid>/<auto_filename>
-    target_rel_dir = os.path.join(settings.submissions_dir, f"season_{team.season_id}", f"team_{team.id}")
-    try:
-        os.makedirs(target_rel_dir, exist_ok=True)
-    except Exception:
-        pass
-    thesis_rel = os.path.join(target_rel_dir, auto_thesis)
-    materials_rel = os.path.join(target_rel_dir, auto_materials)
-
-    # 保存并计算哈希与大小（论文）
-    thesis_hasher = hashlib.sha256()
-    thesis_size = 0
-    with open(thesis_rel, "wb") as out:
-        while True:
-            chunk = thesis.file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
-            thesis_hasher.update(chunk)
-            thesis_size += len(chunk)
-    thesis.file.close()
-
-    # 保存并计算哈希与大小（材料）
-    materials_hasher = hashlib.sha256()
-    materials_size = 0
-    with open(materials_rel, "wb") as out:
-        while True:
-            chunk = materials.file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
-            materials_hasher.update(chunk)
-            materials_size += len(chunk)
-    materials.file.close()
-
-    # 版本控制：查找当前最大版本并加一
-    latest = (
-        db.query(Submission)
-        .filter(Submission.team_id == team.id)
-        .order_by(Submission.version.desc())
-        .first()
+    auto_thesis = f"{base_name}_{names_part}_{_sanitize_filename(thesis_name_raw)}"
+    auto_materials = f"{base_name}_{names_part}_{_sanitize_filename(materials_name_raw)}"
+    return auto_thesis, auto_materials
+
+
+def _record_submission(
+    db: Session,
+    team: Team,
+    note: str | None,
+    thesis_blob: Blob,
+    auto_thesis: str,
+    materials_blob: Blob,
+    auto_materials: str,
+) -> dict:
+    """在当前事务中写入 Submission 与两条 SubmissionFile（不提交，由调用方提交），返回接口响应数据。"""
+    # 版本控制：原子自增队伍的提交计数；行锁持有到本事务提交，同队并发上传在此排队，版本号不会重复
+    db.query(Team).filter(Team.id == team.id).update(
+        {Team.submission_seq: Team.submission_seq + 1}, synchronize_session=False
     )
-    next_ver = (latest.version + 1) if latest else 1
+    next_ver = db.query(Team.submission_seq).filter(Team.id == team.id).scalar()
 
     # 总提交记录（将论文作为主文件以兼容旧字段）
     row = Submission(
@@ -278,33 +233,35 @@ def upload_submission(
         version=next_ver,
         filename=auto_thesis,
         note=note,
-        hash=thesis_hasher.hexdigest(),
+        hash=thesis_blob.hash,
     )
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    db.flush()  # 获取 row.id
 
     # 关联文件明细
     f_thesis = SubmissionFile(
         submission_id=row.id,
         type="thesis",
         filename=auto_thesis,
-        size=thesis_size,
-        hash=thesis_hasher.hexdigest(),
-        path=thesis_rel,
+        size=thesis_blob.size,
+        hash=thesis_blob.hash,
+        path=thesis_blob.path,
     )
     f_materials = SubmissionFile(
         submission_id=row.id,
         type="materials",
         filename=auto_materials,
-        size=materials_size,
-        hash=materials_hasher.hexdigest(),
-        path=materials_rel,
+        size=materials_blob.size,
+        hash=materials_blob.hash,
+        path=materials_blob.path,
     )
     db.add_all([f_thesis, f_materials])
-    db.commit()
+    db.flush()
+    db.refresh(row)
+    db.refresh(f_thesis)
+    db.refresh(f_materials)
 
-    return {"code": 0, "message": "ok", "data": {
+    return {
         "submissionId": row.id,
         "version": row.version,
         "filename": row.filename,
@@ -314,45 +271,359 @@ def upload_submission(
             {"type": "thesis", "filename": f_thesis.filename, "size": f_thesis.size, "hash": f_thesis.hash, "uploadedAt": f_thesis.uploaded_at},
             {"type": "materials", "filename": f_materials.filename, "size": f_materials.size, "hash": f_materials.hash, "uploadedAt": f_materials.uploaded_at},
         ],
-    }}
+    }
 
 
-@router.get("/teams/{team_id}/submissions")
-def list_submissions(team_id: int, db: Session = Depends(get_db), payload: dict = Depends(require_student)):
+@router.post("/teams/{team_id}/submissions", openapi_extra=multipart_openapi(
+    {"thesis": "论文文件（PDF）", "materials": "支撑材料（RAR/ZIP/7Z）"},
+    {"note": "备注（可选）"},
+))
+def upload_submission(
+    team_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    payload: dict = Depends(require_student),
+):
+    # 学生与队伍校验（在读取请求体之前完成）
+    student = _get_student(payload, db)
+    student_pk = student.id
+    team = _ensure_member(db, team_id, student_pk)
+    # 携带 Idempotency-Key 的重试直接返回首次的响应，不读取请求体
+    with Idempotency(db, request, f"student:{student_pk}") as idem:
+        if idem.replay is not None:
+            return idem.replay
+        _submission_season(db, team)
+        remaining = _quota_remaining(db, team)
+        if remaining <= 0:
+            raise quota_exceeded()
+        # 接收请求体前结束只读事务、把连接还回连接池：大文件在慢速链路上可能传输数分钟，
+        # 期间不占用数据库连接，截止前的上传高峰不会占满连接池而拖垮登录等轻量接口
+        db.commit()
+
+        # 流式解析请求体：文件直接写入存储目录并同时计算哈希；
+        # 类型、文件头与大小在接收过程中校验，不合法时立即中止并删除已写入的部分
+        form = parse_multipart(request, SUBMISSION_RULES, budget=remaining)
+        try:
+            thesis = form.files.get("thesis")
+            materials = form.files.get("materials")
+            if not thesis or not materials:
+                raise HTTPException(status_code=400, detail={"code": 1001, "message": "参数校验失败：需同时上传论文与支撑材料"})
+
+            # 重新取得连接：接收期间队伍或成员可能已变化，写入前再校验一次
+            team = _ensure_member(db, team_id, student_pk)
+            auto_thesis, auto_materials = _auto_filenames(db, team, thesis.filename, materials.filename)
+
+            # 按内容寻址收入存储：与历史版本相同的文件只增加引用，临时文件随即删除
+            thesis_blob = put_file(db, thesis.path, thesis.sha256, thesis.size)
+            materials_blob = put_file(db, materials.path, materials.sha256, materials.size)
+
+            data = _record_submission(db, team, form.get_str("note"), thesis_blob, auto_thesis, materials_blob, auto_materials)
+            resp = {"code": 0, "message": "ok", "data": data}
+            idem.stage(resp)
+            db.commit()
+            invalidate_submission_history(team.id)
+        finally:
+            form.cleanup()
+    return resp
+
+
+# ------------------------
+# 断点续传：创建会话 -> 按偏移上传分块（可乱序、可重试） -> 完成并生成提交
+# ------------------------
+
+class CreateUploadBody(BaseModel):
+    type: str = Field(description="文件类型：thesis 或 materials")
+    filename: str = Field(description="原始文件名")
+    size: int = Field(description="文件总字节数")
+    sha256: str | None = Field(default=None, description="整文件 SHA-256（可选，完成时校验）")
+
+
+class FinalizeUploadBody(BaseModel):
+    thesisUploadId: str = Field(description="论文上传会话ID")
+    materialsUploadId: str = Field(description="支撑材料上传会话ID")
+    note: str | None = Field(default=None, description="备注（可选）")
+
+
+def _received_ranges(db: Session, session_id: str) -> list[tuple[int, int]]:
+    rows = db.query(UploadChunk.offset, UploadChunk.length).filter(UploadChunk.session_id == session_id).all()
+    return merge_ranges([(o, o + n) for o, n in rows])
+
+
+def _upload_status(db: Session, up: UploadSession) -> dict:
+    received = _received_ranges(db, up.id)
+    return {
+        "uploadId": up.id,
+        "type": up.type,
+        "filename": up.filename,
+        "size": up.size,
+        "status": up.status,
+        "expiresAt": up.expires_at,
+        "chunkMaxBytes": settings.upload_chunk_max_bytes,
+        "receivedBytes": sum(e - s for s, e in received),
+        "receivedRanges": [[s, e] for s, e in received],
+        "missingRanges": [[s, e] for s, e in missing_ranges(received, up.size)],
+    }
+
+
+def _get_upload(db: Session, team_id: int, upload_id: str, lock: bool = False) -> UploadSession:
+    query = db.query(UploadSession).filter(UploadSession.id == upload_id, UploadSession.team_id == team_id)
+    if lock:
+        # 行锁持有到本事务提交：同一会话的分块落盘与登记按会话串行
+        query = query.with_for_update()
+    up = query.first()
+    if not up:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "上传会话不存在"})
+    if up.status != "uploading":
+        raise HTTPException(status_code=409, detail={"code": 1006, "message": "上传会话已完成"})
+    if up.expires_at and up.expires_at < datetime.now():
+        raise HTTPException(status_code=410, detail={"code": 1005, "message": "上传会话已过期"})
+    return up
+
+
+@router.post("/teams/{team_id}/uploads")
+def create_upload_session(
+    team_id: int,
+    body: CreateUploadBody,
+    db: Session = Depends(get_db),
+    payload: dict = Depends(require_student),
+):
     student = _get_student(payload, db)
     team = _ensure_member(db, team_id, student.id)
-    rows = (
-        db.query(Submission)
-        .filter(Submission.team_id == team.id)
-        .order_by(Submission.version.asc())
-        .all()
+    _submission_season(db, team)
+
+    rule = SUBMISSION_RULES.get(body.type)
+    if rule is None:
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": "参数校验失败：type 仅支持 thesis/materials"})
+    rule.check_name(body.filename)
+    if body.size <= 0:
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": "参数校验失败：size 必须大于 0"})
+    # 声明的大小在创建会话时即按单文件上限与赛季配额校验（会话预占配额直至完成或过期）
+    rule.check_size(body.size)
+    if body.size > _quota_remaining(db, team):
+        raise quota_exceeded()
+
+    upload_id = secrets.token_hex(16)
+    temp_path = os.path.join(settings.upload_sessions_dir, f"{upload_id}.part")
+    os.makedirs(settings.upload_sessions_dir, exist_ok=True)
+    # 预先按总大小创建稀疏文件，分块可按任意顺序写入
+    with open(temp_path, "wb") as f:
+        f.truncate(body.size)
+
+    up = UploadSession(
+        id=upload_id,
+        team_id=team.id,
+        student_id=student.id,
+        type=body.type,
+        filename=body.filename,
+        size=body.size,
+        sha256=(body.sha256 or None),
+        temp_path=temp_path,
+        status="uploading",
+        expires_at=datetime.now() + timedelta(hours=settings.upload_session_ttl_hours),
     )
-    # 加载文件明细
-    data = []
-    for r in rows:
-        files = db.query(SubmissionFile).filter(SubmissionFile.submission_id == r.id).order_by(SubmissionFile.id.asc()).all()
-        data.append({
-            "id": r.id,
-            "version": r.version,
-            "filename": r.filename,
-            "note": r.note,
-            "hash": r.hash,
-            "uploadedAt": r.uploaded_at,
-            "files": [
-                {
-                    "type": f.type,
-                    "filename": f.filename,
-                    "size": f.size,
-                    "hash": f.hash,
-                    "uploadedAt": f.uploaded_at,
-                } for f in files
-            ],
-        })
-    return {"code": 0, "message": "ok", "data": data}
+    db.add(up)
+    db.commit()
+    db.refresh(up)
+    return {"code": 0, "message": "ok", "data": _upload_status(db, up)}
+
+
+@router.get("/teams/{team_id}/uploads/{upload_id}")
+def get_upload_session(team_id: int, upload_id: str, db: Session = Depends(get_db), payload: dict = Depends(require_student)):
+    student = _get_student(payload, db)
+    _ensure_member(db, team_id, student.id)
+    up = db.query(UploadSession).filter(UploadSession.id == upload_id, UploadSession.team_id == team_id).first()
+    if not up:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "上传会话不存在"})
+    return {"code": 0, "message": "ok", "data": _upload_status(db, up)}
+
+
+def _stage_copy(src: str) -> str:
+    """在同一目录为 src 建一个硬链接（不支持时复制），交给 put_file 消费。"""
+    dst = f"{src}.{secrets.token_hex(8)}.commit"
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return dst
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _check_chunk(db: Session, up: UploadSession, offset: int, length: int, chunk_hash: str) -> dict | None:
+    """相同分块已接收时返回成功响应；与已接收区间重叠时抛出 409；否则返回 None。"""
+    same = db.query(UploadChunk).filter(UploadChunk.session_id == up.id, UploadChunk.offset == offset).first()
+    if same and same.length == length and same.hash == chunk_hash:
+        return {"code": 0, "message": "ok", "data": _upload_status(db, up)}
+    for start, end in _received_ranges(db, up.id):
+        if offset < end and start < offset + length:
+            raise HTTPException(status_code=409, detail={"code": 1006, "message": "分块与已接收的数据重叠"})
+    return None
+
+
+@router.put("/teams/{team_id}/uploads/{upload_id}")
+def put_upload_chunk(
+    team_id: int,
+    upload_id: str,
+    offset: int,
+    request: Request,
+    chunk_sha256: str | None = Header(default=None, alias="X-Chunk-SHA256"),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(require_student),
+):
+    """写入一个分块：请求体为原始字节，X-Chunk-SHA256 为该块的哈希。"""
+    student = _get_student(payload, db)
+    _ensure_member(db, team_id, student.id)
+    up = _get_upload(db, team_id, upload_id)
+    session_id, temp_path, file_type, filename, total_size = up.id, up.temp_path, up.type, up.filename, up.size
+
+    if not chunk_sha256:
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": "缺少分块哈希：X-Chunk-SHA256"})
+    length_header = request.headers.get("content-length")
+    if not length_header or not length_header.isdigit():
+        raise HTTPException(status_code=411, detail={"code": 1001, "message": "缺少 Content-Length"})
+    length = int(length_header)
+    if length <= 0 or length > settings.upload_chunk_max_bytes:
+        raise HTTPException(status_code=413, detail={"code": 1007, "message": "分块大小不合法"})
+    if offset < 0 or offset + length > total_size:
+        raise HTTPException(status_code=416, detail={"code": 1001, "message": "分块超出文件范围"})
+
+    # 已接收的相同分块直接返回（客户端重试）；与已接收区间重叠的先行拒绝，不必接收请求体
+    checked = _check_chunk(db, up, offset, length, chunk_sha256.lower())
+    if checked is not None:
+        return checked
+    # 接收分块前结束只读事务、把连接还回连接池，慢速链路上的分块不占用数据库连接
+    db.commit()
+
+    # 分块先边接收边写入独立的临时文件并增量计算哈希；首块先核对文件头，类型不符的内容不写入。
+    # 校验通过后在会话行锁内再次检查重叠，才把字节复制进会话文件并登记：
+    # 并发上传的重叠分块不会覆盖已校验的数据，登记的分块哈希与磁盘上的字节始终一致
+    hasher = hashlib.sha256()
+    received = 0
+    rule = SUBMISSION_RULES[file_type] if offset == 0 else None
+    head = b""
+    chunk_path = f"{temp_path}.{secrets.token_hex(8)}.chunk"
+    try:
+        with open(chunk_path, "wb") as out:
+            for piece in iter_body(request):
+                if received + len(piece) > length:
+                    raise HTTPException(status_code=400, detail={"code": 1001, "message": "分块长度与 Content-Length 不符"})
+                if rule is not None:
+                    head += piece[:SNIFF_BYTES - len(head)]
+                    if len(head) >= min(SNIFF_BYTES, length):
+                        rule.check_head(filename, head)
+                        rule = None
+                out.write(piece)
+                hasher.update(piece)
+                received += len(piece)
+        if received != length:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "分块长度与 Content-Length 不符"})
+        if hasher.hexdigest() != chunk_sha256.lower():
+            raise HTTPException(status_code=422, detail={"code": 1007, "message": "分块哈希校验失败，请重传该分块"})
+
+        up = _get_upload(db, team_id, upload_id, lock=True)
+        checked = _check_chunk(db, up, offset, length, hasher.hexdigest())
+        if checked is not None:
+            return checked
+        with open(chunk_path, "rb") as src, open(temp_path, "r+b") as dst:
+            dst.seek(offset)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        db.add(UploadChunk(session_id=session_id, offset=offset, length=length, hash=hasher.hexdigest()))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail={"code": 1006, "message": "该分块正在被并发写入"})
+    finally:
+        db.rollback()
+        _remove_quietly(chunk_path)
+    return {"code": 0, "message": "ok", "data": _upload_status(db, up)}
+
+
+@router.post("/teams/{team_id}/uploads/finalize")
+def finalize_uploads(
+    team_id: int,
+    body: FinalizeUploadBody,
+    request: Request,
+    db: Session = Depends(get_db),
+    payload: dict = Depends(require_student),
+):
+    student = _get_student(payload, db)
+    team = _ensure_member(db, team_id, student.id)
+    with Idempotency(db, request, f"student:{student.id}", body_fingerprint(body)) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        _submission_season(db, team)
+
+        # 两个会话按ID顺序加行锁（并发完成同一对会话时不会互相死锁），锁内校验状态：
+        # 重复点击的后一个请求等前一个提交后看到会话已完成，返回 409，不会重复收入存储
+        locked = {
+            upload_id: _get_upload(db, team_id, upload_id, lock=True)
+            for upload_id in sorted({body.thesisUploadId, body.materialsUploadId})
+        }
+        thesis_up, materials_up = locked[body.thesisUploadId], locked[body.materialsUploadId]
+        if thesis_up.type != "thesis" or materials_up.type != "materials":
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "上传会话类型不匹配"})
+        for up in (thesis_up, materials_up):
+            if missing_ranges(_received_ranges(db, up.id), up.size):
+                raise HTTPException(status_code=409, detail={"code": 1006, "message": f"文件尚未上传完整：{up.filename}"})
+
+        # 两个文件在 I/O 线程池中并行计算整文件哈希，全部通过后再收入存储（临时文件直接 rename，不再复制）
+        pending = [submit_io(hash_path, up.temp_path) for up in (thesis_up, materials_up)]
+        digests = []
+        for up, fut in zip((thesis_up, materials_up), pending):
+            digest, size = fut.result()
+            if up.sha256 and up.sha256.lower() != digest:
+                raise HTTPException(status_code=422, detail={"code": 1007, "message": f"文件哈希校验失败：{up.filename}"})
+            digests.append((digest, size))
+        # 收入存储的是会话文件的硬链接：会话文件保留到事务提交之后再删除。
+        # 收入存储或提交失败时会话仍为 uploading 且文件完整，可直接重试
+        temp_paths = [up.temp_path for up in (thesis_up, materials_up)]
+        staged = []
+        try:
+            blobs = []
+            for up, (digest, size) in zip((thesis_up, materials_up), digests):
+                staged.append(_stage_copy(up.temp_path))
+                blobs.append(put_file(db, staged[-1], digest, size))
+                up.status = "finished"
+
+            auto_thesis, auto_materials = _auto_filenames(db, team, thesis_up.filename, materials_up.filename)
+            data = _record_submission(db, team, body.note, blobs[0], auto_thesis, blobs[1], auto_materials)
+            resp = {"code": 0, "message": "ok", "data": data}
+            idem.stage(resp)
+            db.commit()
+        finally:
+            for path in staged:
+                _remove_quietly(path)
+        for path in temp_paths:
+            _remove_quietly(path)
+        invalidate_submission_history(team.id)
+    return resp
+
+
+@router.get("/teams/{team_id}/submissions")
+def list_submissions(
+    team_id: int,
+    request: Request,
+    page: int = 1,
+    page_size: int = 20,
+    db: Session = Depends(get_db),
+    payload: dict = Depends(require_student),
+):
+    student = _get_student(payload, db)
+    team = _ensure_member(db, team_id, student.id)
+    # 按版本倒序分页，结果按队伍缓存（有新提交时失效）；未变化时按 If-None-Match 返回 304
+    body, etag = history_page(db, team.id, page, page_size)
+    return cached_json_response(request, body, etag, cache_control="private, no-cache")
 
 
 @router.post("/teams/join")
 def join_team_by_token(
+    request: Request,
     body: dict = Body(...),
     db: Session = Depends(get_db),
     payload: dict = Depends(require_student),
@@ -361,43 +632,50 @@ def join_team_by_token(
     if not token:
         raise HTTPException(status_code=400, detail={"code": 2003, "message": "缺少加入令牌"})
 
-    token_row = (
-        db.query(TeamJoinToken)
-        .filter(TeamJoinToken.token == token, TeamJoinToken.active == True)
-        .first()
-    )
-    if not token_row:
-        raise HTTPException(status_code=404, detail={"code": 2004, "message": "令牌无效或已过期"})
-    if token_row.expires_at and token_row.expires_at < datetime.now():
-        raise HTTPException(status_code=400, detail={"code": 2004, "message": "令牌已过期"})
-
-    team = db.query(Team).filter(Team.id == token_row.team_id).first()
-    if not team:
-        raise HTTPException(status_code=404, detail={"code": 1006, "message": "队伍不存在"})
-
-    season = db.query(Season).filter(Season.id == team.season_id).first()
-    if not season or not _signup_open(season):
-        raise HTTPException(status_code=400, detail={"code": 1001, "message": "当前不在报名开放状态"})
-
     student = _get_student(payload, db)
-    # 一人一队（同赛季）限制
-    existing = _find_my_team(db, team.season_id, student.id)
-    if existing:
-        # 已在队伍中，返回现有队伍信息
-        return {"code": 0, "message": "ok", "data": _team_response(db, existing, include_token=True)}
-
-    # 加入队伍
-    db.add(TeamMember(team_id=team.id, student_id=student.id, role="member"))
-    # 自动报名（按学生维度记录）
-    exists_enroll = db.query(Enrollment).filter(Enrollment.season_id == team.season_id, Enrollment.student_id == student.id).first()
-    if not exists_enroll:
-        db.add(Enrollment(season_id=team.season_id, student_id=student.id, status="approved"))
-
-    # 记录加入请求（审核历史），当前逻辑直接通过
-    db.add(TeamJoinRequest(team_id=team.id, student_id=student.id, status="approved"))
-    db.commit()
-
-    return {"code": 0, "message": "ok", "data": _team_response(db, team, include_token=True)}
+    with Idempotency(db, request, f"student:{student.id}", body_fingerprint(body)) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        token_row = (
+            db.query(TeamJoinToken)
+            .filter(TeamJoinToken.token == token, TeamJoinToken.active == True)
+            .first()
+        )
+        if not token_row:
+            raise HTTPException(status_code=404, detail={"code": 2004, "message": "令牌无效或已过期"})
+        if token_row.expires_at and token_row.expires_at < datetime.now():
+            raise HTTPException(status_code=400, detail={"code": 2004, "message": "令牌已过期"})
+
+        team = db.query(Team).filter(Team.id == token_row.team_id).first()
+        if not team:
+            raise HTTPException(status_code=404, detail={"code": 1006, "message": "队伍不存在"})
+
+        season = get_season(db, team.season_id)
+        if not season or not signup_open(season):
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "当前不在报名开放状态"})
+
+        # 一人一队（同赛季）限制
+        existing = _find_my_team(db, team.season_id, student.id)
+        if existing:
+            # 已在队伍中，返回现有队伍信息
+            return {"code": 0, "message": "ok", "data": team_view(db, existing.id)}
+
+        # 加入队伍
+        db.add(TeamMember(team_id=team.id, student_id=student.id, role="member"))
+        # 自动报名（按学生维度记录）
+        exists_enroll = db.query(Enrollment).filter(Enrollment.season_id == team.season_id, Enrollment.student_id == student.id).first()
+        if not exists_enroll:
+            db.add(Enrollment(season_id=team.season_id, student_id=student.id, status="approved"))
+
+        # 记录加入请求（审核历史），当前逻辑直接通过
+        db.add(TeamJoinRequest(team_id=team.id, student_id=student.id, status="approved"))
+        db.flush()
+
+        resp = {"code": 0, "message": "ok", "data": load_team_view(db, team.id)}
+        idem.stage(resp)
+        db.commit()
+        invalidate_team_view(team.id)
+    return resp
 
 
 @router.get("/competitions/{season_id}/my-team")
@@ -406,7 +684,8 @@ def get_my_team(season_id: int, db: Session = Depends(get_db), payload: dict = D
     team = _find_my_team(db, season_id, student.id)
     if not team:
         return {"code": 0, "message": "ok", "data": None}
-    return {"code": 0, "message": "ok", "data": _team_response(db, team, include_token=True)}
+    # 队伍视图按队伍缓存，成员、令牌或队伍状态变化后失效
+    return {"code": 0, "message": "ok", "data": team_view(db, team.id)}
 
 
 @router.post("/teams/{team_id}/join-token")
@@ -427,4 +706,36 @@ def generate_join_token(team_id: int, db: Session = Depends(get_db), payload: di
     db.add(row)
     db.commit()
     db.refresh(row)
-    return {"code": 0, "message": "ok", "data": {"token": row.token, "expires_at": row.expires_at}}
\ No newline at end of file
+    invalidate_team_view(team_id)
+    return {"code": 0, "message": "ok", "data": {"token": row.token, "expires_at": row.expires_at}}
+
+
+@router.get("/competitions/{season_id}/problems/download")
+def download_problems(season_id: int, request: Request, db: Session = Depends(get_db), payload: dict = Depends(require_student)):
+    """下载赛季赛题 ZIP：仅限参赛队伍成员；visible_after_start 为真时开赛前不可下载。"""
+    student = _get_student(payload, db)
+    if not _find_my_team(db, season_id, student.id):
+        raise HTTPException(status_code=403, detail={"code": 1003, "message": "权限不足：未参加该竞赛"})
+    meta = problem_meta(db, season_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "赛题尚未发布"})
+    now = datetime.now()
+    if meta["visible_after_start"] and meta["start_time"] and now < meta["start_time"]:
+        # Retry-After 告知客户端开赛时刻，避免开赛前反复请求
+        wait = math.ceil((meta["start_time"] - now).total_seconds())
+        raise HTTPException(
+            status_code=403,
+            detail={"code": 2010, "message": "比赛尚未开始，赛题将在开赛后开放下载", "startTime": meta["start_time"].isoformat()},
+            headers={"Retry-After": str(wait)},
+        )
+
+    # 赛题按内容寻址，哈希即强 ETag；客户端已有相同文件时直接 304
+    etag = f'"{meta["hash"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    filename = meta["filename"] or "problems.zip"
+    data = problem_cache.get(meta)
+    if data is not None:
+        return memory_response(request, data, filename, "application/zip", headers)
+    return file_response(meta["path"], filename, "application/zip", "attachment", headers)
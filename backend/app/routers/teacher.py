@@ -1,94 +1,121 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from urllib.parse import quote
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List
-import os
+import csv
+import io
+import math
 
 from ..db import get_db
 from ..models import Season, Team, Submission, SubmissionFile, Review, ReviewScore, Teacher
 from ..security import require_teacher, _decode_jwt
+from ..archive import ZipEntry, stream_zip
+from ..idempotency import Idempotency, body_fingerprint
+from ..uploads import FileRule, parse_multipart, multipart_openapi, restore_extension
+from .files import file_response, signed_file_url
+from ..data_versions import version_etag
+from ..http_cache import versioned_json_response
+from ..responses import FastJSONResponse
 
 router = APIRouter(prefix="/api/teacher", tags=["teacher"])
 
 
 @router.get("/competitions")
 def list_review_competitions(db: Session = Depends(get_db), _: dict = Depends(require_teacher)):
-    seasons = db.query(Season).order_by(Season.created_at.desc()).all()
-    return {
+    rows = db.execute(
+        select(
+            Season.id, Season.name, Season.status,
+            Season.start_time, Season.submit_deadline, Season.review_start, Season.review_end,
+        ).order_by(Season.created_at.desc())
+    )
+    return FastJSONResponse({
         "code": 0,
         "message": "ok",
         "data": [
             {
-                "id": s.id,
-                "name": s.name,
-                "status": s.status,
-                "start_time": s.start_time.isoformat() if s.start_time else None,
-                "submit_deadline": s.submit_deadline.isoformat() if s.submit_deadline else None,
-                "review_start": s.review_start.isoformat() if s.review_start else None,
-                "review_end": s.review_end.isoformat() if s.review_end else None,
-            } for s in seasons
+                "id": id_,
+                "name": name,
+                "status": status,
+                "start_time": start_time,
+                "submit_deadline": submit_deadline,
+                "review_start": review_start,
+                "review_end": review_end,
+            } for id_, name, status, start_time, submit_deadline, review_start, review_end in rows
         ]
-    }
+    })
 
 
-@router.get("/competitions/{season_id}/submissions")
-def list_competition_submissions(season_id: int, db: Session = Depends(get_db), auth: dict = Depends(require_teacher)):
+def _get_teacher(db: Session, auth: dict) -> Teacher:
     teacher_account = auth.get("sub")
     teacher = db.query(Teacher).filter(Teacher.account == teacher_account).first()
     if not teacher:
         raise HTTPException(status_code=401, detail={"code": 1002, "message": "令牌无效"})
+    return teacher
 
-    teams = db.query(Team).filter(Team.season_id == season_id).all()
-    team_ids = [t.id for t in teams]
-    subs = db.query(Submission).filter(Submission.team_id.in_(team_ids)).order_by(Submission.uploaded_at.desc()).all()
 
-    # 批量取文件与教师评分状态
-    sub_ids = [s.id for s in subs]
-    file_map: dict[int, list[SubmissionFile]] = {}
-    if sub_ids:
-        files = db.query(SubmissionFile).filter(SubmissionFile.submission_id.in_(sub_ids)).all()
-        for f in files:
-            file_map.setdefault(f.submission_id, []).append(f)
+# 提交列表依赖的表：任一表有写入时 ETag 变化
+SUBMISSION_LIST_TABLES = ("teams", "submissions", "submission_files", "reviews")
 
-    # 教师是否已评审
-    reviewed_map: dict[int, bool] = {}
-    if sub_ids:
-        rs = db.query(Review).filter(Review.submission_id.in_(sub_ids), Review.teacher_id == teacher.id).all()
-        for r in rs:
-            reviewed_map[r.submission_id] = True
-
-    def files_to_dto(submission_id: int):
-        items = []
-        for f in file_map.get(submission_id, []):
-            # 仅提供PDF预览下载链接：不暴露材料下载
-            preview_url = None
-            if f.type == "thesis":
-                preview_url = f"/api/teacher/submissions/{submission_id}/files/{f.id}/pdf"
-            items.append({
-                "id": f.id,
-                "type": f.type,
-                "filename": f.filename,
-                "size": f.size,
-                "hash": f.hash,
-                "previewUrl": preview_url,
+
+@router.get("/competitions/{season_id}/submissions")
+def list_competition_submissions(season_id: int, request: Request, db: Session = Depends(get_db), auth: dict = Depends(require_teacher)):
+    teacher = _get_teacher(db, auth)
+    # 看板轮询：相关表的数据版本未变时直接返回 304，不查询提交列表
+    etag = version_etag(db, request, SUBMISSION_LIST_TABLES, teacher.id)
+
+    def build():
+        # 只取需要的列（行元组，不构造 ORM 对象）；文件与评审按赛季连接取回，不拼接大 IN 列表
+        in_season = select(Submission.id).join(Team, Team.id == Submission.team_id).where(Team.season_id == season_id)
+        subs = db.execute(
+            select(Submission.id, Submission.team_id, Submission.version, Submission.uploaded_at)
+            .join(Team, Team.id == Submission.team_id)
+            .where(Team.season_id == season_id)
+            .order_by(Submission.uploaded_at.desc())
+        ).all()
+
+        file_map: dict[int, list[dict]] = {}
+        files = db.execute(
+            select(
+                SubmissionFile.submission_id, SubmissionFile.id, SubmissionFile.type,
+                SubmissionFile.filename, SubmissionFile.size, SubmissionFile.hash,
+            )
+            .where(SubmissionFile.submission_id.in_(in_season))
+            .order_by(SubmissionFile.id.asc())
+        )
+        for submission_id, file_id, file_type, filename, size, file_hash in files:
+            file_map.setdefault(submission_id, []).append({
+                "id": file_id,
+                "type": file_type,
+                "filename": filename,
+                "size": size,
+                "hash": file_hash,
+                # 仅提供PDF预览下载链接：不暴露材料下载
+                "previewUrl": f"/api/teacher/submissions/{submission_id}/files/{file_id}/pdf" if file_type == "thesis" else None,
             })
-        return items
 
-    return {
-        "code": 0,
-        "message": "ok",
-        "data": [
-            {
-                "id": s.id,
-                "team_id": s.team_id,
-                "version": s.version,
-                "uploaded_at": s.uploaded_at.isoformat() if s.uploaded_at else None,
-                "files": files_to_dto(s.id),
-                "reviewed": bool(reviewed_map.get(s.id, False)),
-            } for s in subs
-        ]
-    }
+        # 教师是否已评审
+        reviewed = set(db.scalars(
+            select(Review.submission_id).where(Review.teacher_id == teacher.id, Review.submission_id.in_(in_season))
+        ))
+
+        return {
+            "code": 0,
+            "message": "ok",
+            "data": [
+                {
+                    "id": sid,
+                    "team_id": team_id,
+                    "version": version,
+                    "uploaded_at": uploaded_at,
+                    "files": file_map.get(sid, []),
+                    "reviewed": sid in reviewed,
+                } for sid, team_id, version, uploaded_at in subs
+            ]
+        }
+
+    return versioned_json_response(request, etag, build)
 
 
 @router.get("/submissions/{submission_id}/files/{file_id}/pdf")
@@ -123,15 +150,24 @@ def preview_submission_pdf(
         raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在"})
     if file.type != "thesis":
         raise HTTPException(status_code=403, detail={"code": 1003, "message": "仅允许预览论文PDF"})
-    if not os.path.exists(file.path):
-        raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在或已删除"})
+    # 本地存储直接输出（支持 Range），对象存储跳转到预签名地址
+    return file_response(file.path, restore_extension(file.filename), "application/pdf", "inline", {"Cache-Control": "no-store"})
 
-    # 使用 RFC 5987 的 filename* 保持 ASCII，避免非 ASCII 文件名导致头部编码错误
-    headers = {
-        "Content-Disposition": f"inline; filename*=UTF-8''{quote(file.filename)}",
-        "Cache-Control": "no-store",
-    }
-    return StreamingResponse(open(file.path, "rb"), media_type="application/pdf", headers=headers)
+
+@router.get("/submissions/{submission_id}/files/{file_id}/signed-url")
+def get_submission_pdf_url(
+    submission_id: int,
+    file_id: int,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_teacher),
+):
+    """签发论文预览的短期签名链接：阅读器的 Range 请求只需校验签名，不再携带 JWT。"""
+    file = db.query(SubmissionFile).filter(SubmissionFile.id == file_id, SubmissionFile.submission_id == submission_id).first()
+    if not file:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "文件不存在"})
+    if file.type != "thesis":
+        raise HTTPException(status_code=403, detail={"code": 1003, "message": "仅允许预览论文PDF"})
+    return {"code": 0, "message": "ok", "data": signed_file_url("submission", file.id, "teacher")}
 
 
 from pydantic import BaseModel, Field
@@ -141,34 +177,222 @@ class SubmitScoreBody(BaseModel):
     comment: str | None = Field(default=None, description="评语")
 
 
+def _upsert_reviews(db: Session, teacher_id: int, items: list[tuple[int, float, str | None]]) -> None:
+    """批量写入评分：items 为 (提交ID, 总分, 评语)，不提交事务。
+
+    每位教师对一个提交仅保留一条最新评审记录；已有记录与分数各用一次查询预取。
+    """
+    submission_ids = [sid for sid, _, _ in items]
+    reviews = {
+        r.submission_id: r
+        for r in db.query(Review).filter(Review.teacher_id == teacher_id, Review.submission_id.in_(submission_ids)).all()
+    }
+    for sid, _, comment in items:
+        review = reviews.get(sid)
+        if review is None:
+            review = Review(submission_id=sid, teacher_id=teacher_id, comment=comment)
+            db.add(review)
+            reviews[sid] = review
+        else:
+            review.comment = comment
+    db.flush()  # 获取新评审记录的 id
+
+    # 简化：仅保存一个汇总分维度 total，便于扩展到多维
+    review_ids = [r.id for r in reviews.values()]
+    score_rows = {
+        sr.review_id: sr
+        for sr in db.query(ReviewScore).filter(ReviewScore.review_id.in_(review_ids), ReviewScore.dimension_key == "total").all()
+    }
+    for sid, score, _ in items:
+        review = reviews[sid]
+        score_row = score_rows.get(review.id)
+        if score_row is None:
+            db.add(ReviewScore(review_id=review.id, dimension_key="total", score=score))
+        else:
+            score_row.score = score
+
+
 @router.post("/submissions/{submission_id}/score")
-def submit_score(submission_id: int, body: SubmitScoreBody, db: Session = Depends(get_db), auth: dict = Depends(require_teacher)):
-    teacher_account = auth.get("sub")
-    teacher = db.query(Teacher).filter(Teacher.account == teacher_account).first()
-    if not teacher:
-        raise HTTPException(status_code=401, detail={"code": 1002, "message": "令牌无效"})
+def submit_score(submission_id: int, body: SubmitScoreBody, request: Request, db: Session = Depends(get_db), auth: dict = Depends(require_teacher)):
+    teacher = _get_teacher(db, auth)
 
-    submission = db.query(Submission).filter(Submission.id == submission_id).first()
-    if not submission:
-        raise HTTPException(status_code=404, detail={"code": 1005, "message": "提交不存在"})
+    with Idempotency(db, request, f"teacher:{teacher.id}", body_fingerprint(body)) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        submission = db.query(Submission).filter(Submission.id == submission_id).first()
+        if not submission:
+            raise HTTPException(status_code=404, detail={"code": 1005, "message": "提交不存在"})
 
-    # 每位教师对一个提交仅保留一条最新评审记录
-    review = db.query(Review).filter(Review.submission_id == submission_id, Review.teacher_id == teacher.id).first()
-    if not review:
-        review = Review(submission_id=submission_id, teacher_id=teacher.id, comment=body.comment)
-        db.add(review)
-        db.flush()
-    else:
-        review.comment = body.comment
+        _upsert_reviews(db, teacher.id, [(submission_id, body.score, body.comment)])
+        resp = {"code": 0, "message": "ok"}
+        idem.stage(resp)
+        db.commit()
 
-    # 简化：仅保存一个汇总分维度 total，便于扩展到多维
-    score_row = db.query(ReviewScore).filter(ReviewScore.review_id == review.id, ReviewScore.dimension_key == "total").first()
-    if not score_row:
-        score_row = ReviewScore(review_id=review.id, dimension_key="total", score=body.score)
-        db.add(score_row)
-    else:
-        score_row.score = body.score
+    return resp
+
+
+# ------------------------
+# 离线评审：打包下载论文与评分表，离线评完后一次导入
+# ------------------------
+
+SCORE_SHEET_HEADER = ["提交ID", "队伍ID", "版本", "论文文件", "分数", "评语"]
+SCORE_SHEET_RULE = FileRule((".csv",), 5 * 1024 * 1024, "scores.csv", 1001, "文件类型错误：仅支持 .csv")
+
+
+def _latest_submissions(db: Session, season_id: int) -> list[Submission]:
+    # 每支队伍的最新版本即为评审对象
+    latest = (
+        db.query(Submission.team_id, func.max(Submission.version).label("version"))
+        .join(Team, Team.id == Submission.team_id)
+        .filter(Team.season_id == season_id)
+        .group_by(Submission.team_id)
+        .subquery()
+    )
+    return (
+        db.query(Submission)
+        .join(latest, (Submission.team_id == latest.c.team_id) & (Submission.version == latest.c.version))
+        .order_by(Submission.id.asc())
+        .all()
+    )
+
+
+@router.get("/competitions/{season_id}/review-pack")
+def download_review_pack(
+    season_id: int,
+    only_unscored: bool = False,
+    db: Session = Depends(get_db),
+    auth: dict = Depends(require_teacher),
+):
+    """
+    下载评审包（ZIP）：各队伍最新提交的论文 PDF（按提交ID命名，不含队伍信息）
+    与评分表 scores.csv（已评过的提交预填当前分数与评语）。
+    评分表填写后通过 /competitions/{season_id}/scores/import 一次导入。
+    """
+    teacher = _get_teacher(db, auth)
+    season = db.query(Season).filter(Season.id == season_id).first()
+    if not season:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "指定的竞赛不存在"})
+
+    subs = _latest_submissions(db, season_id)
+    sub_ids = [s.id for s in subs]
+    thesis_map: dict[int, SubmissionFile] = {}
+    scored: dict[int, tuple[float | None, str | None]] = {}
+    if sub_ids:
+        for f in db.query(SubmissionFile).filter(SubmissionFile.submission_id.in_(sub_ids), SubmissionFile.type == "thesis").all():
+            thesis_map[f.submission_id] = f
+        rows = (
+            db.query(Review, ReviewScore)
+            .outerjoin(ReviewScore, (ReviewScore.review_id == Review.id) & (ReviewScore.dimension_key == "total"))
+            .filter(Review.submission_id.in_(sub_ids), Review.teacher_id == teacher.id)
+            .all()
+        )
+        for r, sr in rows:
+            scored[r.submission_id] = (sr.score if sr else None, r.comment)
+
+    # 论文是否存在在打包时才知道，评分表作为最后一个条目写出，缺失论文的行文件名留空
+    entries: list[ZipEntry] = []
+    listed: list[tuple] = []
+    for s in subs:
+        if only_unscored and s.id in scored:
+            continue
+        f = thesis_map.get(s.id)
+        name = f"submission-{s.id}.pdf" if f and f.path else ""
+        if name:
+            entries.append(ZipEntry(name, key=f.path, mtime=f.uploaded_at))
+        score, comment = scored.get(s.id, (None, None))
+        listed.append((s.id, s.team_id, s.version, name, "" if score is None else score, comment or ""))
+
+    def sheet_entry(missing: set[str]) -> ZipEntry:
+        sheet = io.StringIO()
+        sheet.write("\ufeff")
+        writer = csv.writer(sheet)
+        writer.writerow(SCORE_SHEET_HEADER)
+        for sub_id, team_id, version, name, score, comment in listed:
+            writer.writerow([sub_id, team_id, version, "" if name in missing else name, score, comment])
+        return ZipEntry("scores.csv", data=sheet.getvalue().encode("utf-8"))
+
+    fname = f"review-pack-season-{season_id}-{teacher.account}.zip"
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(fname)}",
+        "Cache-Control": "no-store",
+    }
+    return StreamingResponse(stream_zip(entries, sheet_entry), media_type="application/zip", headers=headers)
+
+
+def _parse_score_sheet(text: str, allowed: set[int]) -> tuple[list[tuple[int, float, str | None]], list[dict]]:
+    # 逐行校验，收集全部错误后统一返回；分数留空的行视为未评，跳过
+    items: list[tuple[int, float, str | None]] = []
+    errors: list[dict] = []
+    seen: set[int] = set()
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [h for h in ("提交ID", "分数") if h not in (reader.fieldnames or [])]
+    if missing:
+        errors.append({"line": 1, "message": f"缺少列：{'、'.join(missing)}"})
+        return items, errors
+    for row in reader:
+        line = reader.line_num
+        raw_id = (row.get("提交ID") or "").strip()
+        raw_score = (row.get("分数") or "").strip()
+        if not raw_score:
+            continue
+        try:
+            sid = int(raw_id)
+        except ValueError:
+            errors.append({"line": line, "message": "提交ID 应为整数"})
+            continue
+        if sid not in allowed:
+            errors.append({"line": line, "message": f"提交 {sid} 不属于该竞赛的待评提交"})
+            continue
+        if sid in seen:
+            errors.append({"line": line, "message": f"提交 {sid} 重复出现"})
+            continue
+        try:
+            score = float(raw_score)
+        except ValueError:
+            errors.append({"line": line, "message": "分数应为数字"})
+            continue
+        if not math.isfinite(score) or score < 0:
+            errors.append({"line": line, "message": "分数不合法"})
+            continue
+        seen.add(sid)
+        comment = (row.get("评语") or "").strip() or None
+        items.append((sid, score, comment))
+    return items, errors
+
+
+@router.post("/competitions/{season_id}/scores/import", openapi_extra=multipart_openapi({"file": "评分表（评审包中的 scores.csv）"}))
+def import_scores(
+    season_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    auth: dict = Depends(require_teacher),
+):
+    """批量导入评分：全部行校验通过后在一个事务中写入，任一行有误则整体不写入并返回错误明细。"""
+    teacher = _get_teacher(db, auth)
+    season = db.query(Season).filter(Season.id == season_id).first()
+    if not season:
+        raise HTTPException(status_code=404, detail={"code": 1005, "message": "指定的竞赛不存在"})
+
+    form = parse_multipart(request, {"file": SCORE_SHEET_RULE})
+    try:
+        file = form.files.get("file")
+        if not file:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "参数校验失败：缺少文件"})
+        with open(file.path, "rb") as fp:
+            raw = fp.read()
+    finally:
+        form.cleanup()
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": "评分表编码错误：需为 UTF-8"})
 
-    db.commit()
+    allowed = {s.id for s in _latest_submissions(db, season_id)}
+    items, errors = _parse_score_sheet(text, allowed)
+    if errors:
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": "评分表校验失败", "errors": errors})
 
-    return {"code": 0, "message": "ok"}
\ No newline at end of file
+    if items:
+        _upsert_reviews(db, teacher.id, items)
+        db.commit()
+    return {"code": 0, "message": "ok", "data": {"imported": len(items)}}
\ No newline at end of file
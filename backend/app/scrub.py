@@ -0,0 +1,388 @@
+from __future__ import annotations
+import hashlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import SessionLocal
+from .models import (
+    ProblemFile, Submission, SubmissionFile, Team, ExcellentWork, ExcellentWorkFile, ScrubRun, ScrubFinding,
+)
+from . import storage_backend
+
+
+# 存储校验（scrub）：按文件记录重新读取存储中的文件并计算 SHA-256，与记录的 hash/size 比对，
+# 缺失或损坏的文件写入 scrub_findings。
+# - 哈希计算在进程池中并行（CPU 密集，线程受 GIL 限制）；
+# - 总读取带宽 scrub_max_bytes_per_second 均分给各进程，工作进程降低优先级，
+#   本地文件读完后通知内核丢弃页缓存，尽量不挤占在线请求的 CPU、磁盘与缓存；
+# - 每批结果与检查点（phase + last_id）在同一事务提交，重启或暂停后从断点继续；
+# - 等待一批结果期间按 scrub_lease_seconds 的三分之一续租，大文件批次超过租约时长也不会被其他进程当作中断接管。
+
+PHASES = ("problem", "submission", "excellent")
+FILE_MODELS = {
+    "problem": ProblemFile,
+    "submission": SubmissionFile,
+    "excellent": ExcellentWorkFile,
+}
+CHUNK_SIZE = 1024 * 1024
+
+
+# ------------------------
+# 工作进程：只读存储、计算哈希，不访问数据库
+# ------------------------
+
+def _init_worker(nice: int) -> None:
+    if nice:
+        try:
+            os.nice(nice)
+        except (AttributeError, OSError):
+            pass
+    storage_backend._storage = None
+
+
+class _Throttle:
+    """把单个进程的读取速度限制在 bytes_per_second 以内。"""
+
+    def __init__(self, bytes_per_second: float):
+        self._rate = bytes_per_second
+        self._start = time.monotonic()
+        self._bytes = 0
+
+    def consume(self, n: int) -> None:
+        if self._rate <= 0:
+            return
+        self._bytes += n
+        ahead = self._start + self._bytes / self._rate - time.monotonic()
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _iter_local(path: str):
+    fadvise = getattr(os, "posix_fadvise", None)
+    with open(path, "rb") as f:
+        if fadvise:
+            fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        buf = bytearray(CHUNK_SIZE)
+        view = memoryview(buf)
+        try:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                yield view[:n]
+        finally:
+            # 校验读过的数据不会再用，避免把在线请求的热点文件挤出页缓存
+            if fadvise:
+                fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def hash_object(key: str, bytes_per_second: float) -> dict:
+    """读取存储对象并计算哈希：返回 {"hash", "size"}；对象不存在返回 {"missing": True}；其他读取错误返回 {"error"}。"""
+    storage = storage_backend.get_storage()
+    throttle = _Throttle(bytes_per_second)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        local = storage.local_path(key)
+        chunks = _iter_local(local) if local is not None else storage.read_range(key)
+        for chunk in chunks:
+            hasher.update(chunk)
+            size += len(chunk)
+            throttle.consume(len(chunk))
+    except Exception as exc:
+        try:
+            missing = storage.stat(key) is None
+        except Exception:
+            missing = False
+        if missing:
+            return {"missing": True}
+        return {"error": f"{type(exc).__name__}: {exc}"[:500]}
+    return {"hash": hasher.hexdigest(), "size": size}
+
+
+# ------------------------
+# 调度：后台线程按批取文件记录，交给进程池计算，结果与检查点一起提交
+# ------------------------
+
+def _phase_query(db: Session, phase: str, season_id: int | None):
+    model = FILE_MODELS[phase]
+    q = db.query(model.id, model.path, model.hash, model.size)
+    if season_id is None:
+        return q
+    if phase == "problem":
+        return q.filter(ProblemFile.season_id == season_id)
+    if phase == "submission":
+        sub_ids = select(Submission.id).join(Team, Team.id == Submission.team_id).where(Team.season_id == season_id)
+        return q.filter(SubmissionFile.submission_id.in_(sub_ids))
+    work_ids = select(ExcellentWork.id).where(ExcellentWork.season_id == season_id)
+    return q.filter(ExcellentWorkFile.work_id.in_(work_ids))
+
+
+def _finding(run_id: int, phase: str, row, result: dict) -> ScrubFinding | None:
+    values = dict(
+        run_id=run_id,
+        kind=phase,
+        file_id=row.id,
+        path=row.path,
+        expected_hash=row.hash,
+        expected_size=row.size,
+    )
+    if result.get("missing"):
+        return ScrubFinding(status="missing", **values)
+    if "error" in result:
+        return ScrubFinding(status="error", detail=result["error"], **values)
+    if result["hash"] != row.hash or result["size"] != row.size:
+        return ScrubFinding(status="corrupted", actual_hash=result["hash"], actual_size=result["size"], **values)
+    return None
+
+
+def serialize_run(run: ScrubRun) -> dict:
+    return {
+        "id": run.id,
+        "seasonId": run.season_id,
+        "status": run.status,
+        "phase": run.phase,
+        "lastId": run.last_id,
+        "filesChecked": run.files_checked,
+        "bytesChecked": run.bytes_checked,
+        "missing": run.missing_count,
+        "corrupted": run.corrupted_count,
+        "errors": run.error_count,
+        "lastError": run.last_error,
+        "worker": run.worker,
+        "heartbeatAt": run.heartbeat_at.isoformat() if run.heartbeat_at else None,
+        "startedAt": run.started_at.isoformat() if run.started_at else None,
+        "finishedAt": run.finished_at.isoformat() if run.finished_at else None,
+    }
+
+
+class Scrubber:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self._run_id: int | None = None
+        # 本进程的任务正在停止时收到的继续请求：租约已取得，待当前线程退出后启动
+        self._next_run_id: int | None = None
+
+    @property
+    def worker_id(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def stopping(self) -> bool:
+        return self.running and self._stop.is_set()
+
+    @property
+    def current_run_id(self) -> int | None:
+        return self._run_id if self.running else None
+
+    def launch(self, db: Session, run_id: int) -> bool:
+        """在本进程中执行（或继续）指定任务；本进程已有任务在跑或租约被其他进程持有时返回 False。
+
+        本进程的任务刚被暂停、线程仍在收尾时，取得租约后排在其后启动（返回 True）。
+        """
+        with self._lock:
+            if (self.running and not self._stop.is_set()) or not self._claim(db, run_id):
+                return False
+            if self.running:
+                self._next_run_id = run_id
+            else:
+                self._start(run_id)
+            return True
+
+    def _start(self, run_id: int) -> None:
+        # 每个线程使用自己的停止事件：收尾中的旧线程不会因新任务启动而继续执行
+        self._stop = threading.Event()
+        self._run_id = run_id
+        self._thread = threading.Thread(target=self._run, args=(run_id, self._stop), name="storage-scrubber", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止本进程的任务（服务关闭时调用），任务保持 running 状态，租约过期后可被继续。"""
+        with self._lock:
+            self._next_run_id = None
+            self._stop.set()
+        pool = self._pool
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def resume_interrupted(self) -> None:
+        """继续因进程退出而中断的任务；租约尚未过期的，到期后再检查一次。"""
+        db = SessionLocal()
+        try:
+            runs = db.query(ScrubRun).filter(ScrubRun.status == "running").order_by(ScrubRun.id.asc()).all()
+            cutoff = datetime.now() - timedelta(seconds=settings.scrub_lease_seconds)
+            held = False
+            for run in runs:
+                if self.launch(db, run.id):
+                    return
+                held = held or (run.heartbeat_at is not None and run.heartbeat_at >= cutoff)
+        finally:
+            db.close()
+        if held:
+            timer = threading.Timer(settings.scrub_lease_seconds, self.resume_interrupted)
+            timer.daemon = True
+            timer.start()
+
+    def _claim(self, db: Session, run_id: int) -> bool:
+        # 条件更新即租约：无人持有、本进程持有或上一持有者心跳已超时
+        cutoff = datetime.now() - timedelta(seconds=settings.scrub_lease_seconds)
+        updated = (
+            db.query(ScrubRun)
+            .filter(
+                ScrubRun.id == run_id,
+                ScrubRun.status.in_(("running", "paused")),
+                ScrubRun.worker.is_(None)
+                | (ScrubRun.worker == self.worker_id)
+                | ScrubRun.heartbeat_at.is_(None)
+                | (ScrubRun.heartbeat_at < cutoff),
+            )
+            .update(
+                {ScrubRun.status: "running", ScrubRun.worker: self.worker_id, ScrubRun.heartbeat_at: datetime.now()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return bool(updated)
+
+    def _checkpoint(self, db: Session, run_id: int, values: dict) -> bool:
+        # 任务被暂停或租约被接管时更新不到行：放弃本批结果并退出
+        values[ScrubRun.heartbeat_at] = datetime.now()
+        updated = (
+            db.query(ScrubRun)
+            .filter(ScrubRun.id == run_id, ScrubRun.status == "running", ScrubRun.worker == self.worker_id)
+            .update(values, synchronize_session=False)
+        )
+        if not updated:
+            db.rollback()
+            return False
+        db.commit()
+        return True
+
+    def _collect(self, db: Session, run_id: int, futures: dict, stop: threading.Event) -> dict | None:
+        """等待一批哈希结果，期间定期续租；本进程停止、任务被暂停或租约被接管时取消剩余文件并返回 None。"""
+        interval = max(1.0, settings.scrub_lease_seconds / 3)
+        renewed = time.monotonic()
+        pending = set(futures)
+        results = {}
+        while pending:
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for fut in done:
+                results[futures[fut]] = fut.result()
+            if not pending:
+                break
+            if not stop.is_set() and time.monotonic() - renewed >= interval:
+                if self._checkpoint(db, run_id, {}):
+                    renewed = time.monotonic()
+                else:
+                    stop.set()
+            if stop.is_set():
+                for fut in pending:
+                    fut.cancel()
+                return None
+        return results
+
+    def _run(self, run_id: int, stop: threading.Event) -> None:
+        try:
+            self._execute(run_id, stop)
+        finally:
+            with self._lock:
+                next_run_id, self._next_run_id = self._next_run_id, None
+                if next_run_id is not None:
+                    self._start(next_run_id)
+
+    def _execute(self, run_id: int, stop: threading.Event) -> None:
+        workers = settings.scrub_workers or min(8, os.cpu_count() or 1)
+        rate = settings.scrub_max_bytes_per_second / workers if settings.scrub_max_bytes_per_second > 0 else 0
+        db = SessionLocal()
+        try:
+            # spawn：API 进程内有多个线程，fork 可能复制到被其他线程持有的锁
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings.scrub_nice,),
+            ) as pool:
+                self._pool = pool
+                while not stop.is_set():
+                    if not self._step(db, run_id, pool, rate, stop):
+                        break
+        except Exception as exc:
+            db.rollback()
+            if not stop.is_set():
+                (
+                    db.query(ScrubRun)
+                    .filter(ScrubRun.id == run_id, ScrubRun.worker == self.worker_id)
+                    .update(
+                        {ScrubRun.status: "failed", ScrubRun.worker: None, ScrubRun.last_error: f"{type(exc).__name__}: {exc}"[:500]},
+                        synchronize_session=False,
+                    )
+                )
+                db.commit()
+        finally:
+            self._pool = None
+            db.close()
+
+    def _step(self, db: Session, run_id: int, pool: ProcessPoolExecutor, rate: float, stop: threading.Event) -> bool:
+        """处理一批文件记录；任务结束或不应继续时返回 False。"""
+        run = db.get(ScrubRun, run_id)
+        if run is None or run.status != "running" or run.worker != self.worker_id:
+            return False
+        phase = run.phase
+        model = FILE_MODELS[phase]
+        rows = (
+            _phase_query(db, phase, run.season_id)
+            .filter(model.id > run.last_id)
+            .order_by(model.id.asc())
+            .limit(settings.scrub_batch_size)
+            .all()
+        )
+        if not rows:
+            index = PHASES.index(phase) + 1
+            if index < len(PHASES):
+                return self._checkpoint(db, run_id, {ScrubRun.phase: PHASES[index], ScrubRun.last_id: 0})
+            self._checkpoint(db, run_id, {ScrubRun.status: "finished", ScrubRun.finished_at: datetime.now(), ScrubRun.worker: None})
+            return False
+
+        # 内容寻址存储中多条记录可能指向同一 blob，每个存储对象只读一次
+        keys = list(dict.fromkeys(row.path for row in rows))
+        results = self._collect(db, run_id, {pool.submit(hash_object, key, rate): key for key in keys}, stop)
+        if results is None:
+            return False
+        db.rollback()  # 结束读取批次所在的事务，下面的存在性复核读取最新数据
+
+        findings = [f for f in (_finding(run_id, phase, row, results[row.path]) for row in rows) if f is not None]
+        if findings:
+            # 校验期间被删除的记录（如删除队伍后文件已回收）不算缺失或损坏
+            alive = {r[0] for r in db.query(model.id).filter(model.id.in_([f.file_id for f in findings])).all()}
+            findings = [f for f in findings if f.file_id in alive]
+            db.add_all(findings)
+
+        counts = {status: sum(1 for f in findings if f.status == status) for status in ("missing", "corrupted", "error")}
+        checked_bytes = sum(results[key].get("size", 0) for key in keys)
+        return self._checkpoint(db, run_id, {
+            ScrubRun.last_id: rows[-1].id,
+            ScrubRun.files_checked: ScrubRun.files_checked + len(rows),
+            ScrubRun.bytes_checked: ScrubRun.bytes_checked + checked_bytes,
+            ScrubRun.missing_count: ScrubRun.missing_count + counts["missing"],
+            ScrubRun.corrupted_count: ScrubRun.corrupted_count + counts["corrupted"],
+            ScrubRun.error_count: ScrubRun.error_count + counts["error"],
+        })
+
+
+scrubber = Scrubber()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import html
+import re
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from .models import Announcement, ExcellentWork
+
+
+# 公告与优秀作品摘要的全文检索。
+# - MySQL 上使用 ngram 分词的 FULLTEXT 索引（中文按相邻两字切分），每个关键词作为必须出现的短语
+#   （BOOLEAN MODE 下的 +"词"），按 MATCH 相关度排序，数据量增长后仍走索引；
+# - 其他数据库（本地开发用的 SQLite 等）退化为 LIKE 匹配（关键词中的 %、_ 按字面匹配），
+#   在 SQL 中按命中次数排序后再取前 limit 条；
+# - 高亮在应用层完成：截取首个命中附近的片段，转义后用 <mark> 标出所有关键词。
+
+MIN_TERM_LENGTH = 2  # 与 MySQL 默认 ngram_token_size 一致，更短的词无法走索引
+MAX_TERMS = 8
+SNIPPET_BEFORE = 30
+SNIPPET_LENGTH = 120
+
+# 分隔符与 BOOLEAN MODE 的运算符一并去掉
+_SPLIT = re.compile(r'[\s+\-<>()~*"@,，。.;；:：!！?？、/\\|]+')
+
+
+def parse_terms(q: str) -> list[str]:
+    terms: list[str] = []
+    for t in _SPLIT.split(q or ""):
+        if len(t) >= MIN_TERM_LENGTH and t.lower() not in (x.lower() for x in terms):
+            terms.append(t)
+    if not terms:
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": f"参数校验失败：关键词至少 {MIN_TERM_LENGTH} 个字符"})
+    return terms[:MAX_TERMS]
+
+
+def _highlight(text: str | None, terms: list[str], snippet: bool) -> str:
+    """转义文本并用 <mark> 标出关键词；snippet 为真时只保留首个命中附近的片段。"""
+    text = text or ""
+    pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+    if snippet and len(text) > SNIPPET_LENGTH:
+        first = pattern.search(text)
+        start = max(0, (first.start() if first else 0) - SNIPPET_BEFORE)
+        end = start + SNIPPET_LENGTH
+        text = ("…" if start > 0 else "") + text[start:end] + ("…" if end < len(text) else "")
+    out, pos = [], 0
+    for m in pattern.finditer(text):
+        out.append(html.escape(text[pos:m.start()]))
+        out.append(f"<mark>{html.escape(m.group(0))}</mark>")
+        pos = m.end()
+    out.append(html.escape(text[pos:]))
+    return "".join(out)
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fulltext(db: Session, columns, terms: list[str]):
+    """返回 (过滤条件, 相关度表达式)；LIKE 退化时相关度为各关键词在各列中的命中次数之和。"""
+    if db.get_bind().dialect.name == "mysql":
+        rank = match(*columns, against=" ".join(f'+"{t}"' for t in terms)).in_boolean_mode()
+        return rank > 0, rank
+    conditions = [or_(*(col.ilike(f"%{_escape_like(t)}%", escape="\\") for col in columns)) for t in terms]
+    hits = []
+    for col in columns:
+        text = func.lower(func.coalesce(col, ""))
+        for t in terms:
+            # 删去关键词后缩短的长度 / 关键词长度 = 出现次数
+            hits.append((func.length(text) - func.length(func.replace(text, t.lower(), ""))) / len(t))
+    return and_(*conditions), sum(hits[1:], hits[0])
+
+
+def search_announcements(db: Session, terms: list[str], limit: int) -> list[dict]:
+    condition, rank = _fulltext(db, (Announcement.title, Announcement.content), terms)
+    rows = (
+        db.query(Announcement, rank.label("relevance"))
+        .filter(condition)
+        .order_by(rank.desc(), Announcement.published_at.desc(), Announcement.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "id": a.id,
+            "title": a.title,
+            "publishedAt": a.published_at.isoformat() if a.published_at else None,
+            "pinned": a.pinned,
+            "relevance": float(s or 0),
+            "highlight": {
+                "title": _highlight(a.title, terms, snippet=False),
+                "content": _highlight(a.content, terms, snippet=True),
+            },
+        }
+        for a, s in rows
+    ]
+
+
+def search_excellent_works(db: Session, terms: list[str], limit: int, season_id: int | None = None) -> list[dict]:
+    condition, rank = _fulltext(db, (ExcellentWork.summary,), terms)
+    q = db.query(ExcellentWork, rank.label("relevance")).filter(condition)
+    if season_id:
+        q = q.filter(ExcellentWork.season_id == season_id)
+    rows = q.order_by(rank.desc(), ExcellentWork.created_at.desc(), ExcellentWork.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": w.id,
+            "season_id": w.season_id,
+            "relevance": float(s or 0),
+            "score": w.score,
+            "created_at": w.created_at.isoformat() if w.created_at else None,
+            "highlight": {"summary": _highlight(w.summary, terms, snippet=True)},
+        }
+        for w, s in rows
+    ]
@@ -0,0 +1,119 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from .cache import get_cache, register_type
+from .config import settings
+from .models import Season
+
+
+# 赛季登记表：赛季很少变化，报名/提交窗口只在已知时刻切换。
+# - 全部赛季以只读快照缓存在进程内，报名、提交等窗口判断与公开的“开放报名”列表都不再查询数据库；
+# - 快照在下一个 signup_start/signup_end/start_time/submit_deadline 边界到来时失效（窗口两端均为闭区间，
+#   结束边界在其后 1 微秒失效），最长不超过 season_cache_ttl_seconds；
+# - 快照放在应用缓存中（共享缓存时各 worker 共用），创建、删除赛季与切换报名开关提交后
+#   调用 invalidate_seasons() 按标签失效。
+
+_FIELDS = (
+    "id", "name", "signup_start", "signup_end", "start_time", "submit_deadline",
+    "review_start", "review_end", "allow_signup", "status",
+)
+_AFTER_END = timedelta(microseconds=1)
+
+
+class SeasonInfo:
+    """赛季的只读快照，字段与 Season 模型同名。"""
+
+    __slots__ = _FIELDS
+
+    def __init__(self, row: Season):
+        for name in _FIELDS:
+            setattr(self, name, getattr(row, name))
+
+    @classmethod
+    def from_values(cls, values: list) -> "SeasonInfo":
+        info = cls.__new__(cls)
+        for name, value in zip(_FIELDS, values):
+            setattr(info, name, value)
+        return info
+
+
+# 共享缓存中按字段顺序编码为列表
+register_type(SeasonInfo, "season", lambda s: [getattr(s, name) for name in _FIELDS], SeasonInfo.from_values)
+
+
+def signup_open(season, now: datetime | None = None) -> bool:
+    now = now or datetime.now()
+    window_ok = (season.signup_start and season.signup_end and season.signup_start <= now <= season.signup_end)
+    return bool(window_ok or season.allow_signup)
+
+
+def submit_open(season, now: datetime | None = None) -> bool:
+    now = now or datetime.now()
+    return bool(season.start_time and season.submit_deadline and season.start_time <= now <= season.submit_deadline)
+
+
+def _next_boundary(seasons, now: datetime) -> datetime | None:
+    points = []
+    for s in seasons:
+        points += [s.signup_start, s.start_time]
+        points += [t + _AFTER_END for t in (s.signup_end, s.submit_deadline) if t]
+    upcoming = [t for t in points if t and t > now]
+    return min(upcoming) if upcoming else None
+
+
+CACHE_KEY = "seasons:registry"
+TAG = "seasons"
+
+
+def _load(db: Session) -> dict:
+    now = datetime.now()
+    seasons = {row.id: SeasonInfo(row) for row in db.query(Season).all()}
+    open_list = sorted(
+        (s for s in seasons.values() if signup_open(s, now)),
+        key=lambda s: s.signup_start or datetime.min,
+    )
+    expires_at = now + timedelta(seconds=settings.season_cache_ttl_seconds)
+    boundary = _next_boundary(seasons.values(), now)
+    if boundary and boundary < expires_at:
+        expires_at = boundary
+    return {"seasons": seasons, "open": open_list, "expires_at": expires_at}
+
+
+def _seconds_left(snapshot: dict) -> float:
+    return max(0.0, (snapshot["expires_at"] - datetime.now()).total_seconds())
+
+
+class SeasonRegistry:
+    def invalidate(self) -> None:
+        get_cache().invalidate_tags(TAG)
+
+    def _snapshot(self, db: Session) -> tuple[dict[int, SeasonInfo], list[SeasonInfo]]:
+        snapshot = get_cache().get_or_load(CACHE_KEY, lambda: _load(db), ttl=_seconds_left, tags=(TAG,))
+        if datetime.now() >= snapshot["expires_at"]:
+            # 本地层与共享层的过期时钟不同步时，可能取到刚过边界的快照：直接重新计算
+            snapshot = _load(db)
+        return snapshot["seasons"], snapshot["open"]
+
+    def get(self, db: Session, season_id: int) -> SeasonInfo | None:
+        return self._snapshot(db)[0].get(season_id)
+
+    def open_for_signup(self, db: Session) -> list[SeasonInfo]:
+        return self._snapshot(db)[1]
+
+
+season_registry = SeasonRegistry()
+
+
+def get_season(db: Session, season_id: int) -> SeasonInfo | None:
+    return season_registry.get(db, season_id)
+
+
+def open_seasons(db: Session) -> list[SeasonInfo]:
+    """当前开放报名的赛季，按报名开始时间升序。"""
+    return season_registry.open_for_signup(db)
+
+
+def invalidate_seasons() -> None:
+    season_registry.invalidate()
@@ -1,4 +1,8 @@
 from datetime import datetime, timedelta, timezone
+import base64
+import hashlib
+import hmac
+import time
 import jwt
 from passlib.context import CryptContext
 from .config import settings
@@ -31,6 +35,32 @@ def create_jwt(subject: str, role: str = "admin") -> str:
     return jwt.encode(payload, settings.jwt_secret, algorithm="HS256")
 
 
+# ------------------------
+# 签名下载链接：HMAC 绑定文件类别、文件ID、角色与过期时间，校验时无需解析 JWT 或查库
+# ------------------------
+
+def _file_signature(kind: str, file_id: int, role: str, expires: int) -> str:
+    key = (settings.download_url_secret or settings.jwt_secret).encode("utf-8")
+    message = f"{kind}\n{file_id}\n{role}\n{expires}".encode("utf-8")
+    digest = hmac.new(key, message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def sign_file(kind: str, file_id: int, role: str, ttl_seconds: int | None = None) -> tuple[int, str]:
+    """返回 (过期时间戳, 签名)。"""
+    expires = int(time.time()) + (ttl_seconds or settings.signed_url_ttl_seconds)
+    return expires, _file_signature(kind, file_id, role, expires)
+
+
+def verify_file_signature(kind: str, file_id: int, role: str, expires: int, signature: str) -> None:
+    if expires < time.time():
+        raise HTTPException(status_code=403, detail={"code": 1003, "message": "下载链接已过期"})
+    expected = _file_signature(kind, file_id, role, expires)
+    # 常量时间比较，避免时序侧信道
+    if not hmac.compare_digest(expected.encode("ascii"), (signature or "").encode("ascii", "replace")):
+        raise HTTPException(status_code=403, detail={"code": 1003, "message": "下载链接签名无效"})
+
+
 # bearer 令牌解析器
 bearer_scheme = HTTPBearer(auto_error=True)
 
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import hashlib
+import os
+from typing import BinaryIO
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Blob
+from .storage_backend import get_storage
+
+
+# 内容寻址存储：上传文件按 SHA-256 保存为 uploads/blobs/ab/cd/<hash>，
+# 相同内容只落盘一次，由 blobs.ref_count 记录被多少条文件记录引用。
+# blob 的 path 为存储键，实际读写经由 storage_backend（本地目录或 S3）。
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(digest: str) -> str:
+    # 存储键统一使用 "/" 分隔，本地与 S3 后端通用
+    return "/".join([settings.blobs_dir.rstrip("/"), digest[:2], digest[2:4], digest])
+
+
+def hash_fileobj(fileobj: BinaryIO) -> tuple[str, int]:
+    """从当前位置读到结尾，返回 (sha256, 字节数)。
+
+    复用一块预分配缓冲区（readinto + memoryview），不为每次读取新建 bytes 对象。
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = fileobj.readinto(buf)
+        if not n:
+            break
+        hasher.update(view[:n])
+        size += n
+    return hasher.hexdigest(), size
+
+
+def _acquire_existing(db: Session, digest: str) -> Blob | None:
+    # 原子自增引用计数；文件若已丢失则视为不存在，由调用方重新写入
+    updated = (
+        db.query(Blob)
+        .filter(Blob.hash == digest)
+        .update({Blob.ref_count: Blob.ref_count + 1, Blob.updated_at: func.now()}, synchronize_session=False)
+    )
+    if not updated:
+        return None
+    blob = db.query(Blob).filter(Blob.hash == digest).first()
+    if blob and get_storage().stat(blob.path) is None:
+        return None
+    return blob
+
+
+def _register(db: Session, digest: str, size: int, path: str) -> Blob:
+    # 文件已落到 blob 路径后登记记录
+    existing = db.query(Blob).filter(Blob.hash == digest).first()
+    if existing:
+        # 记录存在但文件曾丢失：已重新写入，引用计数在 _acquire_existing 中已自增
+        existing.path = path
+        existing.size = size
+        return existing
+
+    blob = Blob(hash=digest, size=size, path=path, ref_count=1)
+    try:
+        with db.begin_nested():
+            db.add(blob)
+    except IntegrityError:
+        # 并发上传了相同内容：对方已插入记录，改为增加引用
+        blob = _acquire_existing(db, digest)
+    return blob
+
+
+def hash_path(path: str) -> tuple[str, int]:
+    with open(path, "rb") as f:
+        return hash_fileobj(f)
+
+
+def put_file(db: Session, src: str, digest: str | None = None, size: int | None = None) -> Blob:
+    """把本地临时文件收入存储并返回 Blob（引用计数已 +1）。
+
+    新内容交给存储后端（本地直接 rename，不再复制）；已存在的内容删除临时文件即可。
+    调用方已算过哈希时可传入 digest/size 以省去一次读取。
+    """
+    if digest is None or size is None:
+        digest, size = hash_path(src)
+
+    blob = _acquire_existing(db, digest)
+    if blob:
+        os.remove(src)
+        return blob
+
+    path = blob_path(digest)
+    get_storage().put_file(path, src)
+    return _register(db, digest, size, path)
+
+
+def release_path(db: Session, path: str | None) -> None:
+    """文件记录不再引用某个 blob 时调用；不再被引用的 blob 由回收任务（reclaim.py）在宽限期后删除。"""
+    if not path:
+        return
+    (
+        db.query(Blob)
+        .filter(Blob.path == path, Blob.ref_count > 0)
+        .update({Blob.ref_count: Blob.ref_count - 1, Blob.updated_at: func.now()}, synchronize_session=False)
+    )
@@ -0,0 +1,202 @@
+from __future__ import annotations
+import os
+import secrets
+import threading
+from typing import BinaryIO, Iterator
+from urllib.parse import quote
+
+from .config import settings
+
+
+# 存储后端：文件记录中的 path 字段即存储键（如 uploads/blobs/ab/cd/<hash>）。
+# 本地后端把键当作相对 backend 目录的文件路径（与历史数据一致）；
+# S3 后端把同一字符串作为对象键，多个 API 节点可共享同一个存储桶。
+
+READ_CHUNK = 1024 * 1024
+
+
+class StorageBackend:
+    """存储后端接口。"""
+
+    def put_file(self, key: str, src: str) -> None:
+        """把本地临时文件收入存储（完成后 src 不再存在）。"""
+        raise NotImplementedError
+
+    def put_stream(self, key: str, fileobj: BinaryIO) -> None:
+        """从文件对象读到结尾写入存储。"""
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int = 0, end: int | None = None) -> Iterator[bytes | memoryview]:
+        """逐块读取 [start, end) 区间；end 为 None 表示读到结尾。
+
+        产出的块可能复用同一缓冲区，调用方需在取下一块之前用完。
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def stat(self, key: str) -> int | None:
+        """返回对象字节数；不存在时返回 None。"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str | None:
+        """文件在本机上的路径；非本地存储返回 None。"""
+        return None
+
+    def presign(self, key: str, filename: str, media_type: str, disposition: str, ttl_seconds: int) -> str | None:
+        """生成可直接下载的预签名地址；不支持时返回 None，由应用自行输出文件。"""
+        return None
+
+
+def content_disposition(disposition: str, filename: str) -> str:
+    return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+
+class LocalStorage(StorageBackend):
+    """本地文件系统（或挂载到各节点的共享目录）。"""
+
+    def put_file(self, key: str, src: str) -> None:
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        # 临时文件与存储目录在同一文件系统，直接 rename，不复制
+        os.replace(src, key)
+
+    def put_stream(self, key: str, fileobj: BinaryIO) -> None:
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        tmp = f"{key}.{secrets.token_hex(4)}.tmp"
+        try:
+            with open(tmp, "wb") as out:
+                buf = bytearray(READ_CHUNK)
+                view = memoryview(buf)
+                while True:
+                    n = fileobj.readinto(buf)
+                    if not n:
+                        break
+                    out.write(view[:n])
+            os.replace(tmp, key)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def read_range(self, key: str, start: int = 0, end: int | None = None) -> Iterator[memoryview]:
+        buf = bytearray(READ_CHUNK)
+        view = memoryview(buf)
+        with open(key, "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                want = READ_CHUNK if remaining is None else min(READ_CHUNK, remaining)
+                n = f.readinto(view[:want])
+                if not n:
+                    break
+                if remaining is not None:
+                    remaining -= n
+                yield view[:n]
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(key)
+        except FileNotFoundError:
+            pass
+
+    def stat(self, key: str) -> int | None:
+        try:
+            return os.path.getsize(key)
+        except OSError:
+            return None
+
+    def local_path(self, key: str) -> str | None:
+        return key
+
+
+class S3Storage(StorageBackend):
+    """S3 API 兼容的对象存储（AWS S3、MinIO 等），需要安装 boto3。"""
+
+    def __init__(self):
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError as exc:
+            raise RuntimeError("使用 S3 存储需要安装 boto3：pip install boto3") from exc
+        self._client_error = ClientError
+        self._bucket = settings.s3_bucket
+        config = Config(signature_version="s3v4", s3={"addressing_style": "path"})
+        kwargs = dict(
+            aws_access_key_id=settings.s3_access_key or None,
+            aws_secret_access_key=settings.s3_secret_key or None,
+            region_name=settings.s3_region,
+            config=config,
+        )
+        self._client = boto3.client("s3", endpoint_url=settings.s3_endpoint_url or None, **kwargs)
+        # 预签名地址需要浏览器可达：服务端内网地址与对外地址不同时单独配置
+        if settings.s3_public_endpoint_url:
+            self._presign_client = boto3.client("s3", endpoint_url=settings.s3_public_endpoint_url, **kwargs)
+        else:
+            self._presign_client = self._client
+
+    def put_file(self, key: str, src: str) -> None:
+        # upload_file 对大文件自动使用分片上传
+        self._client.upload_file(src, self._bucket, key)
+        os.remove(src)
+
+    def put_stream(self, key: str, fileobj: BinaryIO) -> None:
+        self._client.upload_fileobj(fileobj, self._bucket, key)
+
+    def read_range(self, key: str, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        params = {"Bucket": self._bucket, "Key": key}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end - 1}"
+        body = self._client.get_object(**params)["Body"]
+        try:
+            yield from body.iter_chunks(READ_CHUNK)
+        finally:
+            body.close()
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(Bucket=self._bucket, Key=key)
+
+    def stat(self, key: str) -> int | None:
+        try:
+            return int(self._client.head_object(Bucket=self._bucket, Key=key)["ContentLength"])
+        except self._client_error as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def presign(self, key: str, filename: str, media_type: str, disposition: str, ttl_seconds: int) -> str | None:
+        return self._presign_client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self._bucket,
+                "Key": key,
+                "ResponseContentType": media_type,
+                "ResponseContentDisposition": content_disposition(disposition, filename),
+            },
+            ExpiresIn=ttl_seconds,
+        )
+
+
+BACKENDS = {
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+
+_storage: StorageBackend | None = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """按 settings.storage_backend 创建（并复用）存储后端。"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                cls = BACKENDS.get(settings.storage_backend)
+                if cls is None:
+                    raise RuntimeError(f"未知的存储后端：{settings.storage_backend}")
+                _storage = cls()
+    return _storage
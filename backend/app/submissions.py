@@ -0,0 +1,86 @@
+from __future__ import annotations
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .cache import get_cache
+from .config import settings
+from .http_cache import render_json
+from .models import Submission, SubmissionFile
+
+
+# 学生端的队伍提交记录：按版本倒序分页（最新版本在第一页）。
+# - 一页提交与其文件共两条查询（文件按本页提交ID一次取回），不随版本数增加；
+# - 渲染结果（JSON 字节与 ETag）按队伍与分页缓存，队伍有新提交时调用 invalidate_submission_history() 按标签失效。
+
+MAX_PAGE_SIZE = 100
+
+
+def _tag(team_id: int) -> str:
+    return f"submissions:team:{team_id}"
+
+
+def invalidate_submission_history(team_id: int) -> None:
+    get_cache().invalidate_tags(_tag(team_id))
+
+
+def _render(db: Session, team_id: int, page: int, page_size: int) -> tuple[bytes, str]:
+    total = db.scalar(select(func.count(Submission.id)).where(Submission.team_id == team_id)) or 0
+    subs = db.execute(
+        select(Submission.id, Submission.version, Submission.filename, Submission.note, Submission.hash, Submission.uploaded_at)
+        .where(Submission.team_id == team_id)
+        .order_by(Submission.version.desc())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+    ).all()
+
+    files: dict[int, list[dict]] = {row[0]: [] for row in subs}
+    if files:
+        rows = db.execute(
+            select(
+                SubmissionFile.submission_id, SubmissionFile.type, SubmissionFile.filename,
+                SubmissionFile.size, SubmissionFile.hash, SubmissionFile.uploaded_at,
+            )
+            .where(SubmissionFile.submission_id.in_(list(files)))
+            .order_by(SubmissionFile.id.asc())
+        )
+        for submission_id, file_type, filename, size, file_hash, uploaded_at in rows:
+            files[submission_id].append({
+                "type": file_type,
+                "filename": filename,
+                "size": size,
+                "hash": file_hash,
+                "uploadedAt": uploaded_at,
+            })
+
+    content = {
+        "code": 0,
+        "message": "ok",
+        "data": [
+            {
+                "id": sid,
+                "version": version,
+                "filename": filename,
+                "note": note,
+                "hash": file_hash,
+                "uploadedAt": uploaded_at,
+                "files": files[sid],
+            }
+            for sid, version, filename, note, file_hash, uploaded_at in subs
+        ],
+        "page": page,
+        "pageSize": page_size,
+        "total": total,
+    }
+    return render_json(content)
+
+
+def history_page(db: Session, team_id: int, page: int, page_size: int) -> tuple[bytes, str]:
+    """返回队伍提交记录一页的 JSON 字节与 ETag；调用方负责校验访问权限。"""
+    page = max(1, page)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    return get_cache().get_or_load(
+        f"submissions:{team_id}:{page}:{page_size}",
+        lambda: _render(db, team_id, page, page_size),
+        ttl=settings.submission_history_cache_ttl_seconds,
+        tags=(_tag(team_id),),
+    )
@@ -0,0 +1,86 @@
+from __future__ import annotations
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .cache import get_cache
+from .config import settings
+from .models import Student, Team, TeamJoinRequest, TeamJoinToken, TeamMember
+
+
+# 学生端的队伍视图（队伍信息、成员、加入记录、当前有效的加入令牌），学生等待队友时会频繁轮询。
+# - 队伍、成员与最新有效令牌一条连接查询取回，加入记录一条查询，共两条；
+# - 按队伍缓存，队伍信息、成员或令牌变化的写入提交后调用 invalidate_team_view() 按标签失效；
+# - 写接口在事务内用 load_team_view() 直接加载（不读写缓存），避免把未提交的数据放进缓存。
+
+
+def _tag(team_id: int) -> str:
+    return f"team:{team_id}"
+
+
+def invalidate_team_view(team_id: int) -> None:
+    get_cache().invalidate_tags(_tag(team_id))
+
+
+def load_team_view(db: Session, team_id: int) -> dict | None:
+    latest_token = (
+        select(TeamJoinToken.id)
+        .where(TeamJoinToken.team_id == Team.id, TeamJoinToken.active == True)
+        .order_by(TeamJoinToken.created_at.desc(), TeamJoinToken.id.desc())
+        .limit(1)
+        .correlate(Team)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(
+            Team.id, Team.season_id, Team.team_code, Team.name, Team.captain_id, Team.status, Team.locked,
+            TeamJoinToken.token, TeamJoinToken.expires_at,
+            Student.id, Student.student_id, Student.name, TeamMember.role,
+        )
+        .outerjoin(TeamJoinToken, TeamJoinToken.id == latest_token)
+        .outerjoin(TeamMember, TeamMember.team_id == Team.id)
+        .outerjoin(Student, Student.id == TeamMember.student_id)
+        .where(Team.id == team_id)
+        .order_by(TeamMember.id.asc())
+    ).all()
+    if not rows:
+        return None
+    tid, season_id, team_code, name, captain_id, status, locked, token, token_expires_at = rows[0][:9]
+
+    # 加入请求记录（作为审计/历史）
+    join_requests = [
+        {"id": rid, "student_id": student_id, "status": req_status, "created_at": created_at}
+        for rid, student_id, req_status, created_at in db.execute(
+            select(TeamJoinRequest.id, TeamJoinRequest.student_id, TeamJoinRequest.status, TeamJoinRequest.created_at)
+            .where(TeamJoinRequest.team_id == team_id)
+            .order_by(TeamJoinRequest.created_at.desc())
+        )
+    ]
+
+    view = {
+        "id": tid,
+        "season_id": season_id,
+        "team_code": team_code,
+        "name": name,
+        "captain_id": captain_id,
+        "status": status,
+        "locked": locked,
+        "members": [
+            {"id": sid, "student_id": student_no, "name": student_name, "role": role}
+            for *_, sid, student_no, student_name, role in rows
+            if sid is not None
+        ],
+        "join_requests": join_requests,
+    }
+    if token is not None:
+        view["join_token"] = {"token": token, "expires_at": token_expires_at}
+    return view
+
+
+def team_view(db: Session, team_id: int) -> dict | None:
+    """返回缓存的队伍视图；调用方负责校验当前学生是队伍成员。返回值为共享对象，不要修改。"""
+    return get_cache().get_or_load(
+        f"team_view:{team_id}",
+        lambda: load_team_view(db, team_id),
+        ttl=settings.team_view_cache_ttl_seconds,
+        tags=(_tag(team_id),),
+    )
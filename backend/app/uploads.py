@@ -0,0 +1,436 @@
+from __future__ import annotations
+import hashlib
+import os
+import queue
+import secrets
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator
+
+import anyio.from_thread
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from .config import settings
+
+
+# 上传专用 I/O 线程池：文件写入与哈希在这里进行，与请求线程接收数据并行。
+# 每个流式接收的文件在接收期间独占一个线程；线程不足时排队的文件无人写盘，请求线程会卡在有界队列上。
+# 同时接收的文件数受准入通道限制：学生提交每个请求至多 2 个文件（论文与支撑材料），管理员/教师上传每个请求 1 个，
+# 线程数按这个上限计算，不少于 upload_io_workers
+
+
+def io_workers() -> int:
+    streamed = 2 * settings.upload_max_in_flight + settings.bulk_max_in_flight
+    return max(settings.upload_io_workers, streamed)
+
+
+_io_executor = ThreadPoolExecutor(max_workers=io_workers(), thread_name_prefix="upload-io")
+
+
+def submit_io(fn: Callable, *args) -> Future:
+    return _io_executor.submit(fn, *args)
+
+
+def iter_body(request: Request) -> Iterator[bytes]:
+    """在同步路由（运行于线程池）中逐块读取请求体，不把整个请求体读入内存。"""
+    stream = request.stream()
+    while True:
+        try:
+            chunk = anyio.from_thread.run(stream.__anext__)
+        except StopAsyncIteration:
+            break
+        if chunk:
+            yield chunk
+
+
+def merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """合并 [start, end) 区间列表，返回按起点排序、互不相交的区间。"""
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(received: list[tuple[int, int]], size: int) -> list[tuple[int, int]]:
+    """根据已接收区间计算 [0, size) 中尚缺的区间。"""
+    missing: list[tuple[int, int]] = []
+    cursor = 0
+    for start, end in merge_ranges(received):
+        if start > cursor:
+            missing.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < size:
+        missing.append((cursor, size))
+    return missing
+
+
+# ------------------------
+# 上传校验：扩展名、文件头签名与大小上限，在接收过程中尽早拒绝
+# ------------------------
+
+# 文件头签名（magic bytes）：扩展名与内容不符的文件在收到开头几个字节时即被拒绝
+MAGIC_SIGNATURES: dict[str, tuple[bytes, ...]] = {
+    ".pdf": (b"%PDF-",),
+    ".zip": (b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08"),
+    ".rar": (b"Rar!\x1a\x07",),
+    ".7z": (b"7z\xbc\xaf\x27\x1c",),
+}
+SNIFF_BYTES = max(len(sig) for sigs in MAGIC_SIGNATURES.values() for sig in sigs)
+
+# 请求体中除文件内容外的开销（分隔符、部件头、普通字段）的估计上限
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+def sniff_matches(filename: str, head: bytes) -> bool:
+    """按扩展名核对文件头；没有登记签名的扩展名不做内容校验。"""
+    sigs = MAGIC_SIGNATURES.get(os.path.splitext(filename.lower())[1])
+    if not sigs:
+        return True
+    return bytes(head).startswith(sigs)
+
+
+def _format_size(n: int) -> str:
+    if n >= 1024 * 1024:
+        return f"{n / (1024 * 1024):.0f} MB"
+    return f"{n / 1024:.0f} KB"
+
+
+def restore_extension(filename: str) -> str:
+    """提交文件的自动文件名中扩展名的点号被替换成了下划线（如 xxx_a_pdf），展示或下载时还原为 .pdf。"""
+    for ext in MAGIC_SIGNATURES:
+        suffix = "_" + ext[1:]
+        if filename.lower().endswith(suffix):
+            return filename[: -len(suffix)] + ext
+    return filename
+
+
+def quota_exceeded() -> HTTPException:
+    return HTTPException(status_code=413, detail={"code": 1007, "message": "超出本赛季的提交空间配额"})
+
+
+class FileRule:
+    """单个文件字段的校验规则。extensions 为空时不限制类型（也不做内容校验）。"""
+
+    def __init__(
+        self,
+        extensions: tuple[str, ...],
+        max_bytes: int,
+        default_name: str,
+        error_code: int = 1001,
+        error_message: str = "文件类型错误",
+    ):
+        self.extensions = extensions
+        self.max_bytes = max_bytes
+        self.default_name = default_name
+        self.error_code = error_code
+        self.error_message = error_message
+
+    def _type_error(self, message: str | None = None) -> HTTPException:
+        return HTTPException(status_code=400, detail={"code": self.error_code, "message": message or self.error_message})
+
+    def check_name(self, filename: str) -> None:
+        if self.extensions and not filename.lower().endswith(self.extensions):
+            raise self._type_error()
+
+    def check_head(self, filename: str, head: bytes) -> None:
+        if self.extensions and not sniff_matches(filename, head):
+            raise self._type_error(f"{self.error_message}（文件内容与扩展名不符）")
+
+    def check_size(self, size: int) -> None:
+        if size > self.max_bytes:
+            raise HTTPException(status_code=413, detail={
+                "code": 1007,
+                "message": f"文件过大：上限 {_format_size(self.max_bytes)}",
+            })
+
+
+# ------------------------
+# multipart/form-data 流式解析：文件部件边接收边写入存储目录并计算哈希，
+# 不经过 UploadFile 的临时文件，整个上传只落盘一次
+# ------------------------
+
+class StreamedFile:
+    """流式接收的文件部件，数据写在存储目录下的临时文件中，收尾后可直接 rename 为 blob。
+
+    写盘与哈希由 I/O 线程池中的专属任务按顺序完成：请求线程只负责解析与入队，
+    论文写完收尾的同时支撑材料可以继续接收。队列有界，写盘跟不上时会反压请求线程。
+    """
+
+    def __init__(self, field: str, filename: str, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.field = field
+        self.filename = filename
+        self.path = os.path.join(directory, f"{secrets.token_hex(16)}.upload")
+        self.size = 0
+        self.sha256: str | None = None
+        self._hasher = hashlib.sha256()
+        self._file = open(self.path, "wb")
+        self._queue: queue.Queue = queue.Queue(maxsize=settings.upload_io_queue_chunks)
+        self._closed = False
+        self._writer = submit_io(self._drain)
+
+    def _drain(self) -> None:
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    break
+                self._file.write(data)
+                self._hasher.update(data)
+                self.size += len(data)
+            self.sha256 = self._hasher.hexdigest()
+        finally:
+            self._file.close()
+
+    def _put(self, item) -> None:
+        while True:
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                # 写入任务异常退出时不再等待，直接抛出其异常
+                if self._writer.done():
+                    self._writer.result()
+
+    def write(self, data: memoryview) -> None:
+        if self._writer.done():
+            self._writer.result()
+        self._put(data)
+
+    def close(self) -> None:
+        # 只通知写入任务收尾，不等待；wait() 才会阻塞到写盘完成
+        if not self._closed:
+            self._closed = True
+            self._put(None)
+
+    def wait(self) -> None:
+        self.close()
+        self._writer.result()
+
+    def discard(self) -> None:
+        # 已被 put_file 收入存储时文件不存在，忽略即可
+        try:
+            self.wait()
+        except Exception:
+            pass
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class MultipartForm:
+    """解析结果：普通字段为字符串，文件字段为 StreamedFile。"""
+
+    def __init__(self):
+        self.fields: dict[str, str] = {}
+        self.files: dict[str, StreamedFile] = {}
+
+    def cleanup(self) -> None:
+        for f in self.files.values():
+            f.discard()
+
+    def get_str(self, name: str) -> str | None:
+        return self.fields.get(name)
+
+    def get_int(self, name: str) -> int | None:
+        raw = (self.fields.get(name) or "").strip()
+        if not raw:
+            return None
+        try:
+            return int(raw)
+        except ValueError:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": f"参数校验失败：{name} 应为整数"})
+
+    def get_float(self, name: str) -> float | None:
+        raw = (self.fields.get(name) or "").strip()
+        if not raw:
+            return None
+        try:
+            return float(raw)
+        except ValueError:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": f"参数校验失败：{name} 应为数字"})
+
+    def get_bool(self, name: str, default: bool = False) -> bool:
+        raw = (self.fields.get(name) or "").strip().lower()
+        if not raw:
+            return default
+        if raw in ("1", "true", "on", "yes"):
+            return True
+        if raw in ("0", "false", "off", "no"):
+            return False
+        raise HTTPException(status_code=400, detail={"code": 1001, "message": f"参数校验失败：{name} 应为布尔值"})
+
+
+class MultipartStream:
+    """增量解析器：feed() 逐块喂入请求体，finish() 返回 MultipartForm。
+
+    文件字段按 rules 校验：部件头到达时检查扩展名，收到开头几个字节时核对文件头，
+    接收过程中累计大小，超过单文件上限或 budget（所有文件合计）立即抛出异常。
+    """
+
+    def __init__(
+        self,
+        content_type: str,
+        rules: dict[str, FileRule],
+        tmp_dir: str | None = None,
+        max_field_bytes: int = 64 * 1024,
+        budget: int | None = None,
+    ):
+        ctype, params = parse_options_header(content_type or "")
+        if ctype != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "请求格式错误：需要 multipart/form-data"})
+        self.form = MultipartForm()
+        self._rules = rules
+        self._budget = budget
+        self._total = 0
+        self._tmp_dir = tmp_dir or settings.upload_tmp_dir
+        self._max_field_bytes = max_field_bytes
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._field_name = ""
+        self._field_data = bytearray()
+        self._current: StreamedFile | None = None
+        self._rule: FileRule | None = None
+        self._received = 0
+        self._head = b""
+        self._sniffed = False
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def _on_part_begin(self) -> None:
+        self._disposition = b""
+        self._field_name = ""
+        self._field_data = bytearray()
+        self._current = None
+        self._rule = None
+        self._received = 0
+        self._head = b""
+        self._sniffed = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "请求格式错误：缺少字段名"})
+        self._field_name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            rule = self._rules.get(self._field_name)
+            if rule is None or self._field_name in self.form.files:
+                raise HTTPException(status_code=400, detail={"code": 1001, "message": f"不支持的文件字段：{self._field_name}"})
+            # 扩展名不合法时在接收任何文件内容之前拒绝
+            filename = options[b"filename"].decode("utf-8", "replace") or rule.default_name
+            rule.check_name(filename)
+            self._rule = rule
+            self._current = StreamedFile(self._field_name, filename, self._tmp_dir)
+            self.form.files[self._field_name] = self._current
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        # memoryview 切片不复制数据，直接交给文件写入与哈希
+        view = memoryview(data)[start:end]
+        if self._current is not None:
+            self._check_file_data(view)
+            self._current.write(view)
+            return
+        if len(self._field_data) + len(view) > self._max_field_bytes:
+            raise HTTPException(status_code=413, detail={"code": 1007, "message": f"字段过长：{self._field_name}"})
+        self._field_data += view
+
+    def _check_file_data(self, view: memoryview) -> None:
+        # 先核对大小与文件头，再交给写盘任务：不合法的数据不会落盘
+        self._received += len(view)
+        self._total += len(view)
+        self._rule.check_size(self._received)
+        if self._budget is not None and self._total > self._budget:
+            raise quota_exceeded()
+        if not self._sniffed:
+            self._head += bytes(view[:SNIFF_BYTES - len(self._head)])
+            if len(self._head) >= SNIFF_BYTES:
+                self._sniff()
+
+    def _sniff(self) -> None:
+        self._sniffed = True
+        self._rule.check_head(self._current.filename, self._head)
+
+    def _on_part_end(self) -> None:
+        if self._current is not None:
+            if not self._sniffed:
+                self._sniff()
+            self._current.close()
+            self._current = None
+        else:
+            self.form.fields[self._field_name] = self._field_data.decode("utf-8", "replace")
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+
+    def finish(self) -> MultipartForm:
+        self._parser.finalize()
+        if self._current is not None:
+            raise HTTPException(status_code=400, detail={"code": 1001, "message": "请求体不完整"})
+        # 各文件的写盘任务并行收尾，这里等待全部完成
+        for f in self.form.files.values():
+            f.wait()
+        return self.form
+
+    def abort(self) -> None:
+        self.form.cleanup()
+
+
+def parse_multipart(request: Request, rules: dict[str, FileRule], budget: int | None = None) -> MultipartForm:
+    """在同步路由中流式解析 multipart 请求；出错时立即清理已写入的临时文件。
+
+    Content-Length 已声明超限时不读取请求体直接拒绝。
+    调用方在处理完毕后应调用 form.cleanup()（已收入存储的文件会被跳过）。
+    """
+    limit = sum(rule.max_bytes for rule in rules.values())
+    if budget is not None:
+        limit = min(limit, budget)
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit + FORM_OVERHEAD_BYTES:
+        if budget is not None and int(length) > budget + FORM_OVERHEAD_BYTES:
+            raise quota_exceeded()
+        raise HTTPException(status_code=413, detail={"code": 1007, "message": "请求体过大"})
+
+    stream = MultipartStream(request.headers.get("content-type", ""), rules, budget=budget)
+    try:
+        for chunk in iter_body(request):
+            stream.feed(chunk)
+        return stream.finish()
+    except BaseException:
+        stream.abort()
+        raise
+
+
+def multipart_openapi(files: dict[str, str], fields: dict[str, str] | None = None) -> dict:
+    """路由不再声明 File/Form 参数，为 OpenAPI 文档补充请求体说明。"""
+    props = {name: {"type": "string", "format": "binary", "description": desc} for name, desc in files.items()}
+    props.update({name: {"type": "string", "description": desc} for name, desc in (fields or {}).items()})
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": props,
+        "required": list(files),
+    }}}}}
@@ -0,0 +1,97 @@
+"""JSON 序列化基准：对比 FastAPI 默认路径与 FastJSONResponse 直接返回。
+
+用法（在 backend 目录下）：python -m scripts.bench_json --items 5000 --rounds 20
+构造与教师提交列表相同形状的数据（每个提交两份文件），输出每条路径每次序列化的耗时中位数与响应体大小：
+- default：逐个 .isoformat() 转换时间，返回 dict 后经 jsonable_encoder 遍历，再由 JSONResponse（标准库 json）编码；
+- fast：由行元组直接构造 dict（时间保持 datetime），FastJSONResponse 一次编码（安装了 orjson 时使用 orjson）。
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.responses import FastJSONResponse, orjson
+
+
+def make_rows(n: int) -> tuple[list[tuple], list[tuple]]:
+    """返回 (提交行, 文件行)，与 select() 取回的行元组形状一致。"""
+    base = datetime(2025, 5, 1, 8, 0, 0)
+    subs = [(i, i // 3 + 1, i % 3 + 1, base + timedelta(seconds=i * 37, microseconds=i)) for i in range(1, n + 1)]
+    files = []
+    for sid, *_ in subs:
+        files.append((sid, sid * 2 - 1, "thesis", f"2025-S{sid:05d}-论文.pdf", 1_048_576 + sid, f"{sid:064x}"))
+        files.append((sid, sid * 2, "materials", f"2025-S{sid:05d}-材料.zip", 8_388_608 + sid, f"{sid * 7:064x}"))
+    return subs, files
+
+
+def build(subs, files, reviewed: set[int], iso: bool) -> dict:
+    file_map: dict[int, list[dict]] = {}
+    for submission_id, file_id, type_, filename, size, hash_ in files:
+        file_map.setdefault(submission_id, []).append({
+            "id": file_id,
+            "type": type_,
+            "filename": filename,
+            "size": size,
+            "hash": hash_,
+            "previewUrl": f"/api/teacher/submissions/{submission_id}/files/{file_id}/pdf" if type_ == "thesis" else None,
+        })
+    return {
+        "code": 0,
+        "message": "ok",
+        "data": [
+            {
+                "id": sid,
+                "team_id": team_id,
+                "version": version,
+                "uploaded_at": (uploaded_at.isoformat() if uploaded_at else None) if iso else uploaded_at,
+                "files": file_map.get(sid, []),
+                "reviewed": sid in reviewed,
+            }
+            for sid, team_id, version, uploaded_at in subs
+        ],
+    }
+
+
+def default_path(subs, files, reviewed) -> bytes:
+    return JSONResponse(jsonable_encoder(build(subs, files, reviewed, iso=True))).body
+
+
+def fast_path(subs, files, reviewed) -> bytes:
+    return FastJSONResponse(build(subs, files, reviewed, iso=False)).body
+
+
+def measure(fn, rounds: int, *args) -> tuple[float, int]:
+    timings = []
+    size = 0
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        size = len(fn(*args))
+        timings.append(time.perf_counter() - t0)
+    return statistics.median(timings), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    subs, files = make_rows(args.items)
+    reviewed = {sid for sid, *_ in subs if sid % 4 == 0}
+    # 两条路径的响应体逐字节一致
+    assert default_path(subs, files, reviewed) == fast_path(subs, files, reviewed)
+    print(f"items={args.items} rounds={args.rounds} orjson={'yes' if orjson is not None else 'no'}")
+    results = {}
+    for name, fn in (("default", default_path), ("fast", fast_path)):
+        seconds, size = measure(fn, args.rounds, subs, files, reviewed)
+        results[name] = seconds
+        print(f"{name:8s} {seconds * 1000:8.2f} ms  {size / 1024:8.1f} KiB")
+    print(f"speedup  {results['default'] / results['fast']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
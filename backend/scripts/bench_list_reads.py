@@ -0,0 +1,173 @@
+"""列表读取基准：对比加载完整 ORM 对象与 select() 只取需要的列。
+
+用法（在 backend 目录下）：python -m scripts.bench_list_reads --teams 2000 --versions 3 --rounds 5
+在临时 SQLite 库中构造一个赛季的队伍、提交与文件，按教师提交列表与管理员队伍列表的形状各读取一遍，
+输出两种读法每次的耗时中位数与 Python 堆内存峰值（tracemalloc）：
+- orm：db.query(Model) 加载实体（身份映射、属性插桩），再逐字段复制进 dict；队伍成员数逐队 count；
+- core：select() 指定列，直接由行元组构造 dict；成员数用相关子查询随队伍一起取回。
+"""
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.db import Base
+from app.models import Review, Season, Student, Submission, SubmissionFile, Teacher, Team, TeamMember
+
+SEASON_ID = 1
+TEACHER_ID = 1
+
+
+def seed(engine, teams: int, versions: int) -> int:
+    base = datetime(2025, 5, 1, 8, 0, 0)
+    with engine.begin() as conn:
+        conn.execute(insert(Season).values(
+            id=SEASON_ID, name="bench", status="进行中", signup_start=base, signup_end=base, start_time=base,
+            submit_deadline=base, review_start=base, review_end=base,
+        ))
+        conn.execute(insert(Teacher).values(id=TEACHER_ID, account="t", name="t", password_hash="x"))
+        conn.execute(insert(Student), [
+            {"id": i, "student_id": f"s{i}", "name": f"学生{i}", "college": "c", "class_name": "k", "email": "e",
+             "password_hash": "x"}
+            for i in range(1, teams * 3 + 1)
+        ])
+        conn.execute(insert(Team), [
+            {"id": t, "season_id": SEASON_ID, "team_code": f"T{t:05d}", "name": f"队伍{t}", "captain_id": t * 3 - 2,
+             "status": "approved", "locked": False, "created_at": base + timedelta(minutes=t)}
+            for t in range(1, teams + 1)
+        ])
+        conn.execute(insert(TeamMember), [
+            {"team_id": t, "student_id": t * 3 - k, "role": "captain" if k == 2 else "member"}
+            for t in range(1, teams + 1) for k in range(3)
+        ])
+        subs, files, reviews = [], [], []
+        sid = 0
+        for t in range(1, teams + 1):
+            for v in range(1, versions + 1):
+                sid += 1
+                subs.append({"id": sid, "team_id": t, "version": v, "filename": f"v{v}.pdf", "hash": f"{sid:064x}",
+                             "uploaded_at": base + timedelta(seconds=sid * 13)})
+                for kind in ("thesis", "materials"):
+                    files.append({"submission_id": sid, "type": kind, "filename": f"{kind}-{sid}", "size": 1 << 20,
+                                  "hash": f"{sid:064x}", "path": f"blobs/{sid:064x}"})
+                if sid % 4 == 0:
+                    reviews.append({"submission_id": sid, "teacher_id": TEACHER_ID})
+        conn.execute(insert(Submission), subs)
+        conn.execute(insert(SubmissionFile), files)
+        if reviews:
+            conn.execute(insert(Review), reviews)
+    return sid
+
+
+def submissions_orm(db: Session) -> list[dict]:
+    teams = db.query(Team).filter(Team.season_id == SEASON_ID).all()
+    subs = db.query(Submission).filter(Submission.team_id.in_([t.id for t in teams])).order_by(Submission.uploaded_at.desc()).all()
+    sub_ids = [s.id for s in subs]
+    file_map: dict[int, list] = {}
+    for f in db.query(SubmissionFile).filter(SubmissionFile.submission_id.in_(sub_ids)).all():
+        file_map.setdefault(f.submission_id, []).append(f)
+    reviewed = {r.submission_id for r in db.query(Review).filter(Review.submission_id.in_(sub_ids), Review.teacher_id == TEACHER_ID)}
+    return [
+        {
+            "id": s.id, "team_id": s.team_id, "version": s.version, "uploaded_at": s.uploaded_at,
+            "files": [{"id": f.id, "type": f.type, "filename": f.filename, "size": f.size, "hash": f.hash} for f in file_map.get(s.id, [])],
+            "reviewed": s.id in reviewed,
+        }
+        for s in subs
+    ]
+
+
+def submissions_core(db: Session) -> list[dict]:
+    in_season = select(Submission.id).join(Team, Team.id == Submission.team_id).where(Team.season_id == SEASON_ID)
+    subs = db.execute(
+        select(Submission.id, Submission.team_id, Submission.version, Submission.uploaded_at)
+        .join(Team, Team.id == Submission.team_id)
+        .where(Team.season_id == SEASON_ID)
+        .order_by(Submission.uploaded_at.desc())
+    ).all()
+    file_map: dict[int, list] = {}
+    for submission_id, file_id, file_type, filename, size, file_hash in db.execute(
+        select(SubmissionFile.submission_id, SubmissionFile.id, SubmissionFile.type, SubmissionFile.filename,
+               SubmissionFile.size, SubmissionFile.hash).where(SubmissionFile.submission_id.in_(in_season))
+    ):
+        file_map.setdefault(submission_id, []).append(
+            {"id": file_id, "type": file_type, "filename": filename, "size": size, "hash": file_hash}
+        )
+    reviewed = set(db.scalars(select(Review.submission_id).where(Review.teacher_id == TEACHER_ID, Review.submission_id.in_(in_season))))
+    return [
+        {"id": sid, "team_id": team_id, "version": version, "uploaded_at": uploaded_at,
+         "files": file_map.get(sid, []), "reviewed": sid in reviewed}
+        for sid, team_id, version, uploaded_at in subs
+    ]
+
+
+def teams_orm(db: Session) -> list[dict]:
+    return [
+        {"id": t.id, "season_id": t.season_id, "team_code": t.team_code, "name": t.name, "captain_id": t.captain_id,
+         "status": t.status, "locked": t.locked,
+         "member_count": db.query(TeamMember).filter(TeamMember.team_id == t.id).count(), "created_at": t.created_at}
+        for t in db.query(Team).filter(Team.season_id == SEASON_ID).order_by(Team.created_at.desc()).all()
+    ]
+
+
+def teams_core(db: Session) -> list[dict]:
+    member_count = select(func.count(TeamMember.id)).where(TeamMember.team_id == Team.id).correlate(Team).scalar_subquery()
+    keys = ("id", "season_id", "team_code", "name", "captain_id", "status", "locked", "member_count", "created_at")
+    rows = db.execute(
+        select(Team.id, Team.season_id, Team.team_code, Team.name, Team.captain_id, Team.status, Team.locked,
+               member_count, Team.created_at)
+        .where(Team.season_id == SEASON_ID).order_by(Team.created_at.desc())
+    )
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def measure(engine, fn, rounds: int) -> tuple[float, int, list]:
+    timings, peaks, result = [], [], []
+    for _ in range(rounds):
+        with Session(engine) as db:
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            result = fn(db)
+            timings.append(time.perf_counter() - t0)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return statistics.median(timings), max(peaks), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--teams", type=int, default=2000)
+    parser.add_argument("--versions", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        total = seed(engine, args.teams, args.versions)
+        print(f"teams={args.teams} submissions={total} files={total * 2} rounds={args.rounds}")
+        for label, orm_fn, core_fn in (
+            ("submissions", submissions_orm, submissions_core),
+            ("teams", teams_orm, teams_core),
+        ):
+            results = {}
+            for name, fn in (("orm", orm_fn), ("core", core_fn)):
+                seconds, peak, rows = measure(engine, fn, args.rounds)
+                results[name] = (seconds, peak, rows)
+                print(f"{label:12s} {name:5s} {seconds * 1000:9.1f} ms  peak {peak / 1024 / 1024:7.1f} MiB  rows {len(rows)}")
+            # 两种读法结果一致（同一排序键下的相对顺序可能不同，按 id 比较）
+            assert sorted(results["orm"][2], key=lambda r: r["id"]) == sorted(results["core"][2], key=lambda r: r["id"])
+            (t_orm, m_orm, _), (t_core, m_core, _) = results["orm"], results["core"]
+            print(f"{label:12s} time {t_orm / t_core:.2f}x  memory {m_orm / m_core:.2f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""上传路径基准：对比旧的 UploadFile 落临时文件再复制，与流式直写存储目录。
+
+用法（在 backend 目录下）：python -m scripts.bench_upload --size-mb 200
+输出每条路径的耗时、Python 堆内存峰值（tracemalloc）与写入字节数（/proc/self/io 的 wchar，仅 Linux）。
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from starlette.datastructures import Headers
+from starlette.formparsers import MultiPartParser
+
+from app.uploads import FileRule, MultipartStream
+
+BOUNDARY = "----bench-boundary"
+RECEIVE_CHUNK = 64 * 1024  # 与 ASGI 服务器每次交付的数据量同量级
+
+
+def build_body(path: str, size: int) -> None:
+    head = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="materials.zip"\r\n'
+        "Content-Type: application/zip\r\n\r\n"
+    ).encode()
+    with open(path, "wb") as f:
+        f.write(head)
+        block = os.urandom(1024 * 1024)
+        left = size
+        while left > 0:
+            f.write(block[:min(left, len(block))])
+            left -= len(block)
+        f.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+
+
+def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(RECEIVE_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+
+def written_bytes() -> int:
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def legacy(body_path: str, out_dir: str) -> None:
+    # 旧路径：python-multipart 先落到 UploadFile 的临时文件，再按 1 MiB read() 复制到目标
+    async def stream():
+        for chunk in read_chunks(body_path):
+            yield chunk
+
+    async def run():
+        headers = Headers({"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+        form = await MultiPartParser(headers, stream(), max_part_size=1024 * 1024).parse()
+        upload = form["file"]
+        with open(os.path.join(out_dir, "legacy.bin"), "wb") as out:
+            while True:
+                chunk = upload.file.read(1024 * 1024)
+                if not chunk:
+                    break
+                out.write(chunk)
+        upload.file.close()
+
+    asyncio.run(run())
+
+
+def streaming(body_path: str, out_dir: str) -> None:
+    # 新路径：解析时直接写入存储目录并计算哈希，收尾只做 rename
+    parser = MultipartStream(
+        f"multipart/form-data; boundary={BOUNDARY}",
+        {"file": FileRule((), 1 << 40, "bench.bin")},
+        tmp_dir=out_dir,
+    )
+    for chunk in read_chunks(body_path):
+        parser.feed(chunk)
+    form = parser.finish()
+    f = form.files["file"]
+    os.replace(f.path, os.path.join(out_dir, f.sha256))
+
+
+def measure(name: str, fn, body_path: str, size: int) -> None:
+    out_dir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        w0 = written_bytes()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        fn(body_path, out_dir)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        w1 = written_bytes()
+        print(f"{name:<10} {elapsed:8.2f}s  peak={peak / 1024 / 1024:8.2f} MiB  written={(w1 - w0) / size:5.2f}x payload")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=int, default=200)
+    args = ap.parse_args()
+    size = args.size_mb * 1024 * 1024
+    work = tempfile.mkdtemp(prefix="bench-body-")
+    body_path = os.path.join(work, "body.bin")
+    try:
+        build_body(body_path, size)
+        measure("legacy", legacy, body_path, size)
+        measure("streaming", streaming, body_path, size)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""并发提交测试：多个线程同时向同一队伍上传作品，检查版本号唯一、连续且每个版本都有完整的文件记录。
+
+用法（在 backend 目录下，服务已启动，且处于提交时间窗口内）：
+    python -m scripts.concurrent_submit --base-url http://localhost:8080 --team-id 1 \\
+        --token <队员1令牌> --token <队员2令牌> --requests 20
+
+多个 --token 轮流使用，模拟多名队员在截止前同时提交。所有请求在同一时刻放行（threading.Barrier）。
+被准入控制拒绝（503/429）的请求按 Retry-After 重试。
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BOUNDARY = "----concurrent-submit"
+
+
+def build_body(index: int, size: int) -> bytes:
+    # 每个请求内容不同，避免全部命中同一个 blob
+    thesis = b"%PDF-1.4\n" + os.urandom(size)
+    materials = b"PK\x03\x04" + os.urandom(size)
+    parts = []
+    for name, filename, content_type, data in (
+        ("thesis", f"paper-{index}.pdf", "application/pdf", thesis),
+        ("materials", f"materials-{index}.zip", "application/zip", materials),
+    ):
+        parts.append(
+            (
+                f"--{BOUNDARY}\r\n"
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n"
+            ).encode()
+            + data
+            + b"\r\n"
+        )
+    parts.append(
+        (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="note"\r\n\r\nrun {index}\r\n--{BOUNDARY}--\r\n').encode()
+    )
+    return b"".join(parts)
+
+
+def request(method: str, url: str, token: str, body: bytes | None = None, content_type: str | None = None) -> tuple[int, dict, dict]:
+    headers = {"Authorization": f"Bearer {token}"}
+    if content_type:
+        headers["Content-Type"] = content_type
+    req = urllib.request.Request(url, data=body, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=300) as resp:
+            return resp.status, dict(resp.headers), json.loads(resp.read() or b"{}")
+    except urllib.error.HTTPError as exc:
+        return exc.code, dict(exc.headers), json.loads(exc.read() or b"{}")
+
+
+def submit(base_url: str, team_id: int, token: str, body: bytes, barrier: threading.Barrier) -> tuple[int, dict]:
+    barrier.wait()
+    url = f"{base_url}/api/student/teams/{team_id}/submissions"
+    for _ in range(10):
+        status, headers, payload = request("POST", url, token, body, f"multipart/form-data; boundary={BOUNDARY}")
+        if status not in (429, 503):
+            return status, payload
+        time.sleep(int(headers.get("Retry-After") or 1))
+    return status, payload
+
+
+def list_all(list_url: str, token: str) -> tuple[int, list[dict] | dict]:
+    """逐页读取队伍的全部提交记录（接口按版本倒序分页）。"""
+    rows: list[dict] = []
+    page = 1
+    while True:
+        status, _, payload = request("GET", f"{list_url}?page={page}&page_size=100", token)
+        if status != 200:
+            return status, payload
+        rows += payload["data"]
+        if not payload["data"] or len(rows) >= payload.get("total", len(rows)):
+            return status, rows
+        page += 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--team-id", type=int, required=True)
+    parser.add_argument("--token", action="append", required=True, help="学生 JWT，可重复指定")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--size-kb", type=int, default=64, help="每个文件的大小")
+    args = parser.parse_args()
+    base_url = args.base_url.rstrip("/")
+
+    list_url = f"{base_url}/api/student/teams/{args.team_id}/submissions"
+    status, payload = list_all(list_url, args.token[0])
+    if status != 200:
+        print(f"无法读取提交记录：HTTP {status} {payload}")
+        return 1
+    before = {row["version"] for row in payload}
+
+    bodies = [build_body(i, args.size_kb * 1024) for i in range(args.requests)]
+    barrier = threading.Barrier(args.requests)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        futures = [
+            pool.submit(submit, base_url, args.team_id, args.token[i % len(args.token)], bodies[i], barrier)
+            for i in range(args.requests)
+        ]
+        results = [f.result() for f in futures]
+    elapsed = time.monotonic() - started
+
+    ok = [payload["data"]["version"] for status, payload in results if status == 200]
+    failed = [(status, payload) for status, payload in results if status != 200]
+    print(f"{args.requests} 个并发提交，耗时 {elapsed:.2f}s：成功 {len(ok)}，失败 {len(failed)}")
+    for status, payload in failed[:5]:
+        print(f"  HTTP {status} {payload}")
+
+    status, payload = list_all(list_url, args.token[0])
+    rows = [row for row in payload if row["version"] not in before] if status == 200 else []
+    versions = sorted(row["version"] for row in rows)
+    problems = []
+    if len(set(ok)) != len(ok):
+        problems.append(f"响应中的版本号重复：{sorted(ok)}")
+    if versions != sorted(ok):
+        problems.append(f"提交记录与响应不一致：记录 {versions}，响应 {sorted(ok)}")
+    if versions and versions != list(range(versions[0], versions[0] + len(versions))):
+        problems.append(f"版本号不连续：{versions}")
+    incomplete = [row["version"] for row in rows if len(row["files"]) != 2]
+    if incomplete:
+        problems.append(f"文件记录不完整的版本：{incomplete}")
+    if failed:
+        problems.append(f"{len(failed)} 个请求失败")
+
+    for p in problems:
+        print("FAIL", p)
+    if not problems:
+        print(f"OK 新增版本 {versions[0]}..{versions[-1]}，均含论文与支撑材料" if versions else "OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,11 @@ export async function listExcellentWorks(params = {}) {
   const qs = new URLSearchParams()
   if (params.season_id) qs.set('season_id', String(params.season_id))
   if (params.limit) qs.set('limit', String(params.limit))
+  // 排序（created_at/score）、分数下限与游标分页（上一页响应中的 nextCursor）
+  if (params.sort) qs.set('sort', params.sort)
+  if (params.order) qs.set('order', params.order)
+  if (params.min_score != null) qs.set('min_score', String(params.min_score))
+  if (params.cursor) qs.set('cursor', params.cursor)
   const resp = await fetch(`${API_URL}/public/excellent-works?${qs.toString()}`)
   return resp
 }
@@ -21,4 +26,14 @@ export async function listAnnouncements(page = 1, pageSize = 3) {
   qs.set('page_size', String(pageSize))
   const resp = await fetch(`${API_URL}/public/announcements?${qs.toString()}`)
   return resp
-}
\ No newline at end of file
+}
+// 全文检索公告与优秀作品摘要：type 为 all/announcements/works，结果中的 highlight 为已转义的 HTML（<mark> 标出关键词）
+export async function searchPublic(q, params = {}) {
+  const qs = new URLSearchParams()
+  qs.set('q', q)
+  if (params.type) qs.set('type', params.type)
+  if (params.season_id) qs.set('season_id', String(params.season_id))
+  if (params.limit) qs.set('limit', String(params.limit))
+  const resp = await fetch(`${API_URL}/public/search?${qs.toString()}`)
+  return resp
+}
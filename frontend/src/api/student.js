@@ -73,20 +73,30 @@ export async function uploadSubmission(teamId, thesisFile, materialsFile, note)
   fd.append('thesis', thesisFile)
   fd.append('materials', materialsFile)
   if (note) fd.append('note', note)
-  const resp = await fetch(`${API_URL}/student/teams/${teamId}/submissions`, {
-    method: 'POST',
-    headers: { ...authHeader() },
-    body: fd,
-  })
-  return resp
+  // 截止前高峰期服务端可能返回 503（排队已满），按 Retry-After 等待后自动重试；
+  // 各次尝试使用同一个 Idempotency-Key，已成功的提交不会因重试产生新版本
+  const idempotencyKey = crypto.randomUUID()
+  for (let attempt = 0; ; attempt++) {
+    const resp = await fetch(`${API_URL}/student/teams/${teamId}/submissions`, {
+      method: 'POST',
+      headers: { ...authHeader(), 'Idempotency-Key': idempotencyKey },
+      body: fd,
+    })
+    if (resp.status !== 503 || attempt >= 4) return resp
+    const wait = Number(resp.headers.get('Retry-After')) || 2
+    await new Promise((resolve) => setTimeout(resolve, wait * 1000))
+  }
 }
 
 /**
- * 获取队伍提交记录（学生）
+ * 获取队伍提交记录（学生），按版本倒序分页
  * @param {number} teamId
+ * @param {number} page
+ * @param {number} pageSize
  */
-export async function listSubmissions(teamId) {
-  const resp = await fetch(`${API_URL}/student/teams/${teamId}/submissions`, {
+export async function listSubmissions(teamId, page = 1, pageSize = 20) {
+  const qs = new URLSearchParams({ page: String(page), page_size: String(pageSize) })
+  const resp = await fetch(`${API_URL}/student/teams/${teamId}/submissions?${qs.toString()}`, {
     method: 'GET',
     headers: { ...authHeader() },
   })
@@ -26,15 +26,16 @@ export async function listSubmissions(seasonId) {
 }
 
 export async function previewPdf(submissionId, fileId) {
-  // 直接返回URL以供 <iframe> 使用，附带token查询参数
-  let token = ''
-  try {
-    const raw = localStorage.getItem('auth')
-    const auth = raw ? JSON.parse(raw) : null
-    token = auth?.token || ''
-  } catch {}
-  const url = `${API_URL}/teacher/submissions/${submissionId}/files/${fileId}/pdf`
-  return token ? `${url}?token=${encodeURIComponent(token)}` : url
+  // 申请短期签名链接供 <iframe> 直接加载：PDF 阅读器的分段请求无需携带 token
+  const resp = await fetch(`${API_URL}/teacher/submissions/${submissionId}/files/${fileId}/signed-url`, {
+    method: 'GET',
+    headers: { ...authHeader() },
+  })
+  if (!resp.ok) return ''
+  const json = await resp.json()
+  if (json.code !== 0 || !json.data?.url) return ''
+  // 签名链接以 /api 开头，拼接到后端地址
+  return API_URL.replace(/\/api\/?$/, '') + json.data.url
 }
 
 export async function submitScore(submissionId, payload) {